@@ -0,0 +1,273 @@
+"""
+Generate a synthetic mission to benchmark the importers at a configurable scale.
+
+The mission directory holds one sub-directory per importer::
+
+    orimatis/    {project}-{yymmdd}_0906-22-00002_{numero}.ori.xml
+    images/      {section}/{project}_{yymmddHHMM}_{section}_{num}_{camera}.jpg (empty)
+    timestamps/  {yymmddHHMM}-{section}.json, the image dates read by import-image
+    sbet/        LANDINS_{YYYYmmdd}_{HHMMSS}_PP.out, SBET binary trajectories
+    ept/         {project}_{yymmddHHMM}_{section}.ept, echo pulse table directories
+    json/        {yyyy}_{project}_{bundle}.json, import-json bundles
+    ori-export/  {session}_ori-export_{camera}.txt, Micmac pose text files
+
+Sizes grow linearly with ``scale``, see ``SIZES``.
+"""
+import json
+import math
+import pathlib
+import datetime
+import argparse
+
+import numpy as np
+
+
+SIZES = {
+    'orimatis_files': 50,
+    'sections': 2,
+    'cameras': 5,
+    'images_per_section': 50,
+    'sbet_files': 1,
+    'sbet_records': 20000,
+    'ept_sections': 1,
+    'json_bundles': 1,
+    'json_datasources': 100,
+    'ori_export_files': 2,
+    'ori_export_lines': 5000,
+}
+
+PROJECT = 'Synthetic'
+START_TIME = datetime.datetime(2017, 5, 16, 7, 51, 57, tzinfo=datetime.timezone.utc)
+
+# seconds between January 1, 1970 and January 5, 1980 (GPS time reference)
+GPS_EPOCH = 315964800
+
+ORIMATIS_TEMPLATE = '''\
+<?xml version="1.0" encoding="ISO-8859-1"?>
+<orientation>
+<version> 1.0 </version>
+<auxiliarydata>
+<image_name>{image}</image_name>
+<stereopolis>
+<chantier>{chantier}</chantier>
+<date>{time:%y%m%d}</date>
+<session>{session}</session>
+<section>{section}</section>
+<numero>{numero}</numero>
+<position>{position}</position>
+<flatfield_name>FlatField_{serial}.tif</flatfield_name>
+</stereopolis>
+<image_date>
+<year>{time.year}</year>
+<month>{time.month}</month>
+<day>{time.day}</day>
+<time_system> UTC </time_system>
+<hour>{time.hour}</hour>
+<minute>{time.minute}</minute>
+<second>{second:.3f}</second>
+</image_date>
+</auxiliarydata>
+<geometry>
+<extrinseque>
+<systeme>Lambert93</systeme>
+<grid_alti>Raf98</grid_alti>
+<sommet>
+<easting>{position_xyz[0]:.3f}</easting>
+<northing>{position_xyz[1]:.3f}</northing>
+<altitude>{position_xyz[2]:.3f}</altitude>
+</sommet>
+<rotation>
+<Image2Ground> true </Image2Ground>
+<mat3d>
+{mat3d}
+</mat3d>
+</rotation>
+</extrinseque>
+<intrinseque>
+<sensor>
+<name> {sensor} </name>
+<calibration_date> 4-3-2008 </calibration_date>
+<serial_number> {serial} </serial_number>
+<image_size>
+<width> 1920 </width>
+<height> 1080 </height>
+</image_size>
+<ppa>
+<c> 960.860 </c>
+<l> 536.884 </l>
+<focale> 1396.439 </focale>
+</ppa>
+<distortion>
+<pps>
+<c> 954.876 </c>
+<l> 537.357 </l>
+</pps>
+<r3> -5.811586e-008</r3>
+<r5> 5.119552e-014</r5>
+<r7> -1.267293e-020</r7>
+</distortion>
+<pixel_size> 0.00000740</pixel_size>
+</sensor>
+</intrinseque>
+</geometry>
+</orientation>
+'''
+
+
+def sizes(scale):
+    return {key: max(1, int(round(value * scale))) for key, value in SIZES.items()}
+
+
+def trajectory(n, rng, step=1.):
+    """
+    Return ``n`` times, positions and headings (in radians) of a random walk along a
+    smoothly turning path.
+    """
+    times = np.arange(n) * step
+    headings = np.cumsum(rng.normal(scale=0.01, size=n))
+    speeds = 10 + rng.normal(scale=0.1, size=n)
+    positions = np.zeros((n, 3))
+    positions[:, 0] = 651000 + np.cumsum(speeds * np.cos(headings) * step)
+    positions[:, 1] = 6861000 + np.cumsum(speeds * np.sin(headings) * step)
+    positions[:, 2] = 40 + np.cumsum(rng.normal(scale=0.01, size=n))
+    return times, positions, headings
+
+
+def mat3d(heading):
+    c, s = math.cos(heading), math.sin(heading)
+    rows = ((c, -s, 0.), (0., 0., 1.), (-s, -c, 0.))
+    return '\n'.join(
+        '<l{:d}><pt3d><x> {:.9f} </x><y> {:.9f} </y><z> {:.9f} </z></pt3d></l{:d}>'.format(
+            i, x, y, z, i)
+        for i, (x, y, z) in enumerate(rows, 1))
+
+
+def write_orimatis(directory, size, rng):
+    directory.mkdir(parents=True, exist_ok=True)
+    times, positions, headings = trajectory(size['orimatis_files'], rng)
+    for numero, (time, position, heading) in enumerate(zip(times, positions, headings)):
+        time = START_TIME + datetime.timedelta(seconds=time)
+        image = '{}-{:%y%m%d}_0906-22-00002_{:07d}'.format(PROJECT, time, numero)
+        xml = ORIMATIS_TEMPLATE.format(
+            image=image, chantier=PROJECT, time=time, session=906, section=2,
+            numero=numero, position=22, serial=268927037, sensor='Pike_37',
+            second=time.second + time.microsecond / 1e6, position_xyz=position,
+            mat3d=mat3d(heading))
+        (directory / '{}.ori.xml'.format(image)).write_text(xml, encoding='iso-8859-1')
+
+
+def write_images(directory, json_directory, size):
+    session_time = '{:%y%m%d%H%M}'.format(START_TIME)
+    json_directory.mkdir(parents=True, exist_ok=True)
+    gps_start = START_TIME.timestamp() - GPS_EPOCH - 1e9
+    for section in range(size['sections']):
+        section_name = '{:02d}'.format(section)
+        section_dir = directory / section_name
+        section_dir.mkdir(parents=True, exist_ok=True)
+        dates = []
+        for num in range(size['images_per_section']):
+            image_id = '{}_{}_{}_{:06d}'.format(PROJECT, session_time, section_name, num)
+            dates.append({'id': image_id, 'date': gps_start + 3600 * section + num})
+            for camera in range(size['cameras']):
+                (section_dir / '{}_{:d}.jpg'.format(image_id, camera)).touch()
+        json_path = json_directory / '{}-{}.json'.format(session_time, section_name)
+        with json_path.open('w') as f:
+            json.dump(dates, f)
+
+
+def write_sbet(directory, size, rng):
+    """
+    Write SBET trajectories: records of 17 little-endian doubles (time, latitude,
+    longitude, altitude, velocities, roll, pitch, heading, wander, forces and angular
+    rates) sampled at 200 Hz.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    n = size['sbet_records']
+    for i in range(size['sbet_files']):
+        start = START_TIME + datetime.timedelta(hours=i)
+        times, positions, headings = trajectory(n, rng, step=0.005)
+        records = np.zeros((n, 17), dtype='<f8')
+        records[:, 0] = (start.timestamp() % 604800) + times
+        records[:, 1] = np.radians(48.89 + (positions[:, 1] - 6861000) * 1e-5)
+        records[:, 2] = np.radians(2.39 + (positions[:, 0] - 651000) * 1e-5)
+        records[:, 3] = positions[:, 2]
+        records[:, 9] = headings
+        path = directory / 'LANDINS_{:%Y%m%d_%H%M%S}_PP.out'.format(start)
+        records.tofile(str(path))
+
+
+def write_ept(directory, size):
+    """
+    Write empty echo pulse table directories, import-ept only reads their names.
+    """
+    for section in range(size['ept_sections']):
+        path = directory / '{}_{:%y%m%d%H%M}_{:02d}.ept'.format(PROJECT, START_TIME, section)
+        path.mkdir(parents=True, exist_ok=True)
+
+
+def write_json(directory, size, sample):
+    """
+    Write import-json bundles shaped like ``sample``, with their own projects, sessions
+    and datasources.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    with sample.open(encoding='iso-8859-1') as f:
+        content = json.load(f)
+    datasource = content['datasource'][0]
+    sessions = content['session']
+    for bundle in range(size['json_bundles']):
+        name = '{}_{:d}'.format(PROJECT, bundle)
+        bundle_content = dict(content)
+        bundle_content['project'] = [dict(p, name=name) for p in content['project']]
+        bundle_content['transfotree'] = [
+            dict(t, name='{}_{}'.format(name, t['name'])) for t in content['transfotree']]
+        bundle_content['session'] = [
+            dict(s, name='{} - {}'.format(name, s['name'])) for s in sessions]
+        bundle_content['datasource'] = [
+            dict(datasource, id=i, session=sessions[i % len(sessions)]['id'],
+                 uri='{}x{:05d}'.format(name, i))
+            for i in range(size['json_datasources'])]
+        path = directory / '{:%Y}_{}.json'.format(START_TIME, name)
+        with path.open('w', encoding='iso-8859-1') as f:
+            json.dump(bundle_content, f)
+
+
+def write_ori_export(directory, size, rng):
+    directory.mkdir(parents=True, exist_ok=True)
+    n = size['ori_export_lines']
+    for i in range(size['ori_export_files']):
+        times, positions, headings = trajectory(n, rng)
+        opk = np.column_stack((
+            rng.normal(scale=0.1, size=n), rng.normal(scale=0.1, size=n),
+            np.degrees(headings)))
+        path = directory / '{}_ori-export_{:03d}.txt'.format(PROJECT, i)
+        with path.open('w') as f:
+            for j, (angles, position) in enumerate(zip(opk, positions)):
+                f.write('{}_{:03d}_{:06d}.tif {:.6f} {:.6f} {:.6f} {:.6f} {:.6f} {:.6f}\n'
+                        .format(PROJECT, i, j, *angles, *position))
+
+
+def generate(directory, scale=1., seed=0):
+    """
+    Generate a synthetic mission in ``directory`` and return the sizes used.
+    """
+    directory = pathlib.Path(directory)
+    size = sizes(scale)
+    rng = np.random.RandomState(seed)
+    sample = pathlib.Path(__file__).parent.parent / 'data' / '2017_17FA7506_C_6.json'
+    write_orimatis(directory / 'orimatis', size, rng)
+    write_images(directory / 'images', directory / 'timestamps', size)
+    write_sbet(directory / 'sbet', size, rng)
+    write_ept(directory / 'ept', size)
+    write_json(directory / 'json', size, sample)
+    write_ori_export(directory / 'ori-export', size, rng)
+    return size
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic li3ds mission.')
+    parser.add_argument('directory', type=pathlib.Path)
+    parser.add_argument('--scale', type=float, default=1.)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(generate(args.directory, args.scale, args.seed), indent=2))
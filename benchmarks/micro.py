@@ -0,0 +1,230 @@
+"""
+Micro-benchmarks of the per-object hot paths of ``cli_li3ds.api``.
+
+Each case is a function building its fixtures at a given size ``n`` and returning the
+function timed, the best and median times of ``--repeat`` runs are saved as JSON. Pass a
+previous result file with ``--compare`` to print the speedups against it.
+
+    python -m benchmarks.micro --size 1000 --size 10000 --output micro.json
+"""
+import sys
+import json
+import time
+import timeit
+import logging
+import argparse
+import datetime
+import platform
+import statistics
+
+from cli_li3ds import api
+from cli_li3ds import __version__
+
+
+START_TIME = datetime.datetime(2017, 5, 16, 7, 51, 57, tzinfo=datetime.timezone.utc)
+
+
+def staging_server():
+    args = argparse.Namespace(api_url=None, api_key=None, no_proxy=False, indent=None)
+    log = logging.getLogger(__name__)
+    log.disabled = True
+    return api.ApiServer(args, log)
+
+
+def session_graph():
+    sensor = api.Sensor(name='camera', type='camera')
+    referential = api.Referential(sensor, name='image')
+    project = api.Project(name='project')
+    platform = api.Platform(name='platform')
+    session = api.Session(project, platform, name='session')
+    return session, referential
+
+
+def datasource(session, referential, i):
+    return api.Datasource(
+        session, referential,
+        {'uri': ' file:image_{:d}.jpg '.format(i), 'type': 'image', 'extent': None},
+        bounds=[0, 1920, 0, 0, 1080, 0], specifications={'camera': i, 'flatfield': None},
+        capture_start='2017-05-16T07:51:57+00:00', capture_end='2017-05-16T07:51:57+00:00')
+
+
+def transfotree(n):
+    sensor = api.Sensor(name='camera')
+    referentials = [api.Referential(sensor, name='r{:d}'.format(i)) for i in range(n + 1)]
+    transfos = [
+        api.Transfo(referentials[i], referentials[i + 1], name='t{:d}'.format(i),
+                    type_name='affine_mat4x3', func_signature=['mat4x3'])
+        for i in range(n)]
+    return api.Transfotree(transfos, name='tree')
+
+
+def parameters(n):
+    times = [START_TIME + datetime.timedelta(seconds=(i * 7919) % n) for i in range(n)]
+    return [{'quat': [1, 0, 0, 0], 'vec3': [i, 0, 0], '_time': time}
+            for i, time in enumerate(times)]
+
+
+# the cases by name: functions building their fixtures for a size n, and returning the
+# function timed
+CASES = {}
+
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+@case('ApiObj.__init__')
+def apiobj_init(n):
+    session, referential = session_graph()
+
+    def run():
+        for i in range(n):
+            datasource(session, referential, i)
+    return run
+
+
+@case('ApiObj.update')
+def apiobj_update(n):
+    session, referential = session_graph()
+    datasources = [datasource(session, referential, i) for i in range(n)]
+
+    def run():
+        for i, obj in enumerate(datasources):
+            obj.update(uri='file:other_{:d}.jpg'.format(i), specifications={'num': i})
+    return run
+
+
+@case('ApiObj.normalize_obj')
+def normalize_obj(n):
+    obj = {'k{:d}'.format(i): {'a': i, 'b': None, 'c': {'d': [i, i], 'e': None}}
+           for i in range(n)}
+    return lambda: api.ApiObj.normalize_obj(obj)
+
+
+@case('ApiObj.__eq__ (transfotree)')
+def apiobj_eq(n):
+    trees = transfotree(n), transfotree(n)
+
+    def run():
+        assert trees[0] == trees[1]
+    return run
+
+
+@case('ApiObjs.lookup')
+def apiobjs_lookup(n):
+    objs = api.ApiObjs(None)
+    session, referential = session_graph()
+    for i in range(n):
+        objs.add(datasource(session, referential, i))
+    obj = datasource(session, referential, n - 1)
+
+    def run():
+        assert objs.lookup(obj)
+    return run
+
+
+@case('update_obj')
+def update_obj(n):
+    args = {'session': {'name': None}, 'datasource': {'type': 'image'}}
+    metadata = {
+        'basename': 'image.jpg',
+        'session_time': START_TIME,
+        'section_name': '00',
+        'image_time_iso': START_TIME.isoformat(),
+        'missing': None,
+    }
+
+    def run():
+        for _ in range(n):
+            session = {'name': '{session_time:%y%m%d%H%M}/{section_name}'}
+            datasource = {
+                'capture_start': '{image_time_iso}',
+                'capture_end': '{image_time_iso}',
+                'uri': 'file:{missing}',
+            }
+            api.update_obj(args, metadata, session, 'session')
+            api.update_obj(args, metadata, datasource, 'datasource')
+    return run
+
+
+@case('Transfo.get_or_create (parameters)')
+def transfo_get_or_create(n):
+    sensor = api.Sensor(name='camera')
+    transfo = api.Transfo(
+        api.Referential(sensor, name='camera'), api.Referential(sensor, name='world'),
+        name='poses', type_name='affine_quat', func_signature=['quat', 'vec3'],
+        parameters=parameters(n))
+    server = staging_server()
+    return lambda: transfo.get_or_create(None, server)
+
+
+def measure(name, n, repeat):
+    times = []
+    for _ in range(repeat):
+        run = CASES[name](n)
+        times.append(timeit.Timer(run).timeit(number=1))
+    return {
+        'name': name,
+        'n': n,
+        'repeat': repeat,
+        'best': min(times),
+        'median': statistics.median(times),
+        'best_per_item': min(times) / n,
+    }
+
+
+def compare(results, previous):
+    best = {(r['name'], r['n']): r['best'] for r in previous['results']}
+    for result in results:
+        old = best.get((result['name'], result['n']))
+        if old:
+            print('{name} (n={n:d}): {speedup:.2f}x'.format(
+                speedup=old / result['best'], **result), file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Micro-benchmark the li3ds API objects.')
+    parser.add_argument('--size', '-n', type=int, action='append',
+                        help='fixture size, may be repeated (default is 100 and 10000)')
+    parser.add_argument('--repeat', '-r', type=int, default=5,
+                        help='number of timed runs per case and size (default is 5)')
+    parser.add_argument('--case', action='append', choices=list(CASES),
+                        help='case to run, may be repeated (default is all)')
+    parser.add_argument('--output', '-o',
+                        help='JSON result file (default is the standard output)')
+    parser.add_argument('--compare',
+                        help='JSON result file of a previous run to compare against')
+    args = parser.parse_args(argv)
+
+    results = []
+    for name in CASES:
+        if args.case and name not in args.case:
+            continue
+        for n in args.size or (100, 10000):
+            result = measure(name, n, args.repeat)
+            print('{name} (n={n:d}): {best:.6f} s'.format(**result), file=sys.stderr)
+            results.append(result)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+    report = {
+        'version': __version__,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
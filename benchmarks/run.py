@@ -0,0 +1,140 @@
+"""
+Run the importers on a synthetic mission, in staging mode and against a local stub API
+server, and record their wall time, requests issued, requests per second and peak RSS as
+JSON.
+
+    python -m benchmarks.run --scale 2 --output results.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import pathlib
+import platform
+import argparse
+import tempfile
+import subprocess
+
+from .generate import generate, PROJECT, START_TIME
+from .stubserver import StubServer
+
+
+# import commands and their arguments, relative to the mission directory
+COMMANDS = {
+    'import-orimatis': ['-f', '{mission}/orimatis', '*.ori.xml'],
+    'import-image': ['-f', '{mission}/images', '-j', '{mission}/timestamps', '*.jpg'],
+    'import-sbet': ['-c', PROJECT, '-f', '{mission}/sbet', '*.out'],
+    'import-ept': ['-c', PROJECT, '-f', '{mission}/ept',
+                   '{}_{:%y%m%d%H%M}_00.ept'.format(PROJECT, START_TIME)],
+    'import-json': ['-f', '{mission}/json', '*.json', '--uri', 'file://{{uri}}.jp2'],
+    'import-ori-export': ['-c', PROJECT, '--start-time', START_TIME.isoformat(),
+                          '-f', '{mission}/ori-export', '*_ori-export_*.txt'],
+}
+
+MODES = ('staging', 'stub')
+
+# the "code (id) type [key] uri" line logged for each object, see ApiServer.get_or_create
+OBJECT_LINE = re.compile(r'^[+?=>~] \(')
+
+
+def run_command(argv):
+    """
+    Run the li3ds command line in a subprocess. Return its exit status, wall time in
+    seconds, peak RSS in KiB and log lines.
+    """
+    with tempfile.TemporaryFile() as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'cli_li3ds.main'] + argv,
+            stdout=subprocess.DEVNULL, stderr=log)
+        _, status, rusage = os.wait4(process.pid, 0)
+        wall_time = time.perf_counter() - start
+        if os.WIFSIGNALED(status):
+            process.returncode = -os.WTERMSIG(status)
+        else:
+            process.returncode = os.WEXITSTATUS(status)
+        log.seek(0)
+        lines = log.read().decode(errors='replace').splitlines()
+    return process.returncode, wall_time, rusage.ru_maxrss, lines
+
+
+def benchmark(command, mode, mission, stub):
+    argv = [command] + [arg.format(mission=mission) for arg in COMMANDS[command]]
+    if mode == 'stub':
+        stub.reset()
+        argv += ['--api-url', stub.url, '--api-key', 'benchmark']
+    returncode, wall_time, peak_rss, lines = run_command(argv)
+    requests = stub.requests if mode == 'stub' else 0
+    result = {
+        'command': command,
+        'mode': mode,
+        'returncode': returncode,
+        'wall_time': wall_time,
+        'objects': sum(1 for line in lines if OBJECT_LINE.match(line)),
+        'requests': requests,
+        'requests_per_second': requests / wall_time,
+        'peak_rss_kib': peak_rss,
+    }
+    if mode == 'stub':
+        result['requests_by_method'] = dict(stub.counts)
+        result['not_modified'] = stub.not_modified
+        result['bytes_sent'] = stub.bytes_sent
+    if returncode:
+        result['error'] = '\n'.join(lines[-5:])
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the li3ds importers.')
+    parser.add_argument('--scale', type=float, default=1.,
+                        help='mission size factor (default is 1)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--mission', type=pathlib.Path,
+                        help='mission directory, generated if missing (default is a '
+                             'temporary directory)')
+    parser.add_argument('--command', action='append', choices=sorted(COMMANDS),
+                        help='command to benchmark, may be repeated (default is all)')
+    parser.add_argument('--mode', action='append', choices=MODES,
+                        help='staging or stub, may be repeated (default is both)')
+    parser.add_argument('--output', '-o', type=pathlib.Path,
+                        help='JSON result file (default is the standard output)')
+    args = parser.parse_args(argv)
+
+    mission = args.mission or pathlib.Path(tempfile.mkdtemp(prefix='li3ds-mission-'))
+    size = None
+    if not mission.exists() or not any(mission.iterdir()):
+        size = generate(mission, args.scale, args.seed)
+
+    results = []
+    try:
+        with StubServer() as stub:
+            for command in args.command or COMMANDS:
+                for mode in args.mode or MODES:
+                    result = benchmark(command, mode, mission.resolve(), stub)
+                    print('{command} ({mode}): {wall_time:.2f} s, {requests:d} requests, '
+                          '{peak_rss_kib:d} KiB'.format(**result), file=sys.stderr)
+                    results.append(result)
+    finally:
+        if not args.mission:
+            shutil.rmtree(str(mission))
+
+    report = {
+        'scale': args.scale,
+        'seed': args.seed,
+        'sizes': size,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    if args.output:
+        with args.output.open('w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return 1 if any(r['returncode'] for r in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
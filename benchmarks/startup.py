@@ -0,0 +1,114 @@
+"""
+Time the startup of the li3ds command line, and fail when a command takes longer than
+its budget. The modules that take the most time to import are listed from the
+``python -X importtime`` output of each command.
+
+    python -m benchmarks.startup --budget-scale 2
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATA = os.path.join(os.path.dirname(HERE), 'data')
+
+# commands and their time budget in seconds, median of the runs
+BUDGETS = {
+    '--version': (['--version'], 0.3),
+    '--help': (['--help'], 0.5),
+    'import-autocal': (['import-autocal', os.path.join(DATA, 'Calib-1.xml')], 0.5),
+}
+
+# "import time: self [us] | cumulative | imported package" lines of -X importtime
+IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)$')
+
+
+def run(argv, importtime=False):
+    """
+    Run the li3ds command line in a subprocess, return its wall time in seconds and its
+    standard error.
+    """
+    options = ['-X', 'importtime'] if importtime else []
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable] + options + ['-m', 'cli_li3ds.main'] + argv,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    wall_time = time.perf_counter() - start
+    if process.returncode:
+        raise RuntimeError('Error: li3ds {} exited with status {:d}'.format(
+            ' '.join(argv), process.returncode))
+    return wall_time, process.stderr.decode(errors='replace')
+
+
+def top_imports(stderr, top):
+    """
+    Return the ``top`` top-level imports with the largest cumulative time, in seconds.
+    """
+    imports = []
+    for line in stderr.splitlines():
+        match = IMPORT_TIME.match(line)
+        # top-level imports are indented by one space
+        if match and len(match.group(3)) == 1:
+            imports.append((int(match.group(2)) / 1e6, match.group(4)))
+    imports.sort(reverse=True)
+    return [{'module': module, 'cumulative': seconds} for seconds, module in imports[:top]]
+
+
+def benchmark(name, repeat, budget_scale, top):
+    argv, budget = BUDGETS[name]
+    budget *= budget_scale
+    # a first run warms the bytecode and file system caches
+    run(argv)
+    times = [run(argv)[0] for _ in range(repeat)]
+    _, stderr = run(argv, importtime=True)
+    return {
+        'command': name,
+        'median': statistics.median(times),
+        'min': min(times),
+        'budget': budget,
+        'over_budget': statistics.median(times) > budget,
+        'imports': top_imports(stderr, top),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check the li3ds startup time budgets.')
+    parser.add_argument('--command', action='append', choices=sorted(BUDGETS),
+                        help='command to time, may be repeated (default is all)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of timed runs of each command (default is 5)')
+    parser.add_argument('--budget-scale', type=float, default=1.,
+                        help='factor applied to the budgets, for slower machines '
+                             '(default is 1)')
+    parser.add_argument('--top', type=int, default=10,
+                        help='number of slowest imports listed (default is 10)')
+    parser.add_argument('--output', '-o',
+                        help='JSON result file (default is the standard output)')
+    args = parser.parse_args(argv)
+
+    results = []
+    for name in args.command or BUDGETS:
+        result = benchmark(name, args.repeat, args.budget_scale, args.top)
+        print('{command}: {median:.3f} s (budget {budget:.3f} s){}'.format(
+            ' OVER BUDGET' if result['over_budget'] else '', **result), file=sys.stderr)
+        for item in result['imports']:
+            print('  {cumulative:.3f} s {module}'.format(**item), file=sys.stderr)
+        results.append(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    return 1 if any(result['over_budget'] for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""
+A local, in-memory stub of the li3ds REST API, good enough to run the importers against.
+
+Collections are created on first use: ``POST /sensors/`` creates a sensor, ``GET /sensors/``
+lists them (query parameters filter the list on equal values), ``GET /sensors/1/`` returns
+one and ``PATCH /sensors/1/`` updates it (transfo parameters are appended). Every request is
+counted, per method, in ``StubServer.counts``.
+
+GET responses have an ETag, and requests whose ``If-None-Match`` header matches it are
+answered ``304 Not Modified`` without a body. Those are counted in
+``StubServer.not_modified``, and the bytes of the response bodies in
+``StubServer.bytes_sent``.
+
+With ``StubServer.page_size`` set, collections are paginated: the ``offset`` query
+parameter selects a page, and the ``Link`` header of a page gives the next one.
+
+Run ``python -m benchmarks.stubserver --port 5000`` to serve it on its own.
+"""
+import json
+import hashlib
+import threading
+import collections
+import socketserver
+import http.server
+import urllib.parse
+
+
+class StubServer:
+
+    def __init__(self, host='127.0.0.1', port=0, page_size=None):
+        self.page_size = page_size
+        self.collections = collections.defaultdict(list)
+        self.counts = collections.Counter()
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+        self.httpd = _HTTPServer((host, port), _Handler)
+        self.httpd.stub = self
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return 'http://{}:{:d}'.format(host, port)
+
+    @property
+    def requests(self):
+        return sum(self.counts.values())
+
+    def start(self):
+        # a short poll interval makes stop quick
+        self.thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,),
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+    def reset(self):
+        with self.lock:
+            self.collections.clear()
+            self.counts.clear()
+            self.not_modified = 0
+            self.bytes_sent = 0
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def handle(self, method, path, query, body):
+        """
+        Return the status code and the JSON-serializable body of a response.
+        """
+        parts = [p for p in path.split('/') if p]
+        obj_id = None
+        if parts and parts[-1].isdigit() and method in ('GET', 'PATCH'):
+            obj_id = int(parts.pop())
+        name = '/'.join(parts)
+
+        with self.lock:
+            self.counts[method] += 1
+            objs = self.collections[name]
+
+            if method == 'POST' and obj_id is None:
+                obj = dict(body, id=len(objs) + 1)
+                objs.append(obj)
+                return 201, [obj]
+
+            if method == 'GET' and obj_id is None:
+                return 200, [o for o in objs if matches(o, query)]
+
+            if obj_id is None or not 0 < obj_id <= len(objs):
+                return 404, {'message': 'not found'}
+            obj = objs[obj_id - 1]
+
+            if method == 'GET':
+                return 200, [obj]
+
+            for key, value in body.items():
+                if key == 'parameters':
+                    obj.setdefault(key, []).extend(value)
+                else:
+                    obj[key] = value
+            return 200, [obj]
+
+
+def matches(obj, query):
+    # only scalar values are filtered, clients check the other ones
+    for key, values in query.items():
+        value = obj.get(key)
+        if isinstance(value, (list, dict)) or key not in obj:
+            continue
+        if all(str(value) != v for v in values):
+            return False
+    return True
+
+
+class _HTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, avoid delayed ACK stalls on keep-alive
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.respond('GET')
+
+    def do_POST(self):
+        self.respond('POST')
+
+    def do_PATCH(self):
+        self.respond('PATCH')
+
+    def respond(self, method):
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length).decode()) if length else {}
+        stub = self.server.stub
+        offset = int(query.pop('offset', ['0'])[0])
+        status, content = stub.handle(method, url.path, query, body)
+        headers = {}
+        if stub.page_size and method == 'GET' and isinstance(content, list):
+            if offset + stub.page_size < len(content):
+                query['offset'] = [str(offset + stub.page_size)]
+                headers['Link'] = '<{}{}?{}>; rel="next"'.format(
+                    stub.url, url.path, urllib.parse.urlencode(query, doseq=True))
+            content = content[offset:offset + stub.page_size]
+        data = json.dumps(content).encode()
+        if method == 'GET' and status == 200:
+            headers['ETag'] = '"{}"'.format(hashlib.sha1(data).hexdigest())
+            if_none_match = self.headers.get('If-None-Match') or ''
+            if headers['ETag'] in (etag.strip() for etag in if_none_match.split(',')):
+                with stub.lock:
+                    stub.not_modified += 1
+                self.send_response(304)
+                self.send_header('ETag', headers['ETag'])
+                self.end_headers()
+                return
+        with stub.lock:
+            stub.bytes_sent += len(data)
+        self.send_data(status, data, headers)
+
+    def send_json(self, status, content, headers=None):
+        self.send_data(status, json.dumps(content).encode(), headers)
+
+    def send_data(self, status, data, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Run a stub li3ds API server.')
+    parser.add_argument('--port', type=int, default=5000)
+    port = parser.parse_args().port
+    stub = StubServer(port=port)
+    print('Serving a stub li3ds API on {}'.format(stub.url))
+    stub.httpd.serve_forever()
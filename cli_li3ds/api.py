@@ -1,12 +1,20 @@
-import requests
-import dateutil.parser
+import re
+import copy
 import json
+import string
 import getpass
 import time
-from functools import wraps
+import threading
+import contextlib
+import collections
+from functools import partial, wraps
 
-
-MAX_REQUEST_ATTEMPTS = 10
+from . import catalog
+from . import jsonstream
+from . import phases
+from . import quarantine
+from . import retry
+from . import stats
 
 
 def add_arguments(parser):
@@ -22,6 +30,65 @@ def add_arguments(parser):
     group.add_argument(
         '--no-proxy', action='store_true',
         help='disable all proxy settings')
+    group.add_argument(
+        '--stats', metavar='FILE',
+        help='write request and object statistics to a JSON file (optional)')
+    group.add_argument(
+        '--stats-prometheus', metavar='FILE',
+        help='write request and object statistics to a Prometheus textfile (optional)')
+    group.add_argument(
+        '--plan', metavar='FILE',
+        help='write the objects that exist, are new or mismatch to FILE, to be applied '
+             'with li3ds apply, instead of creating them (optional)')
+    group.add_argument(
+        '--journal', metavar='FILE',
+        help='record the published objects to FILE, to resume the import with --resume '
+             'if it is interrupted (optional)')
+    group.add_argument(
+        '--resume', metavar='JOURNAL',
+        help='do not look up again the objects recorded in JOURNAL, and keep recording '
+             'to it unless --journal is given (optional)')
+    group.add_argument(
+        '--keep-going', action='store_true',
+        help='quarantine the input files and objects that fail, and import the others')
+    group.add_argument(
+        '--quarantine', metavar='FILE',
+        help='write the quarantined input files and objects, and the errors, to FILE '
+             '(optional)')
+    group.add_argument(
+        '--retry-quarantine', metavar='FILE',
+        help='only import the input files quarantined in FILE (optional)')
+    group.add_argument(
+        '--no-http-cache', action='store_true',
+        help='do not send conditional requests for the collections already fetched')
+    group.add_argument(
+        '--retries', type=int, default=10,
+        help='number of attempts of a request (optional, default is 10)')
+    group.add_argument(
+        '--backoff', type=float, default=0.1,
+        help='base of the exponential backoff between attempts, in seconds '
+             '(optional, default is 0.1)')
+    group.add_argument(
+        '--max-backoff', type=float, default=30.,
+        help='maximum backoff between attempts, in seconds (optional, default is 30)')
+    group.add_argument(
+        '--connect-timeout', type=float, default=10.,
+        help='connection timeout in seconds, 0 for none (optional, default is 10)')
+    group.add_argument(
+        '--read-timeout', type=float, default=60.,
+        help='response timeout in seconds, 0 for none (optional, default is 60)')
+    group.add_argument(
+        '--retry-status', type=int, nargs='+', metavar='STATUS',
+        help='HTTP statuses to retry requests on (optional, default is {})'.format(
+            ' '.join(str(status) for status in retry.RETRY_STATUSES)))
+    group.add_argument(
+        '--breaker-threshold', type=float, default=0.5,
+        help='rate of failed requests, among the last 20, pausing all requests '
+             '(optional, default is 0.5)')
+    group.add_argument(
+        '--breaker-pause', type=float, default=5.,
+        help='pause in seconds when the failed requests reach the breaker threshold, '
+             '0 to disable the circuit breaker (optional, default is 5)')
     parser.add_argument(
        '--indent', type=int,
        help='number of spaces for pretty print indenting')
@@ -30,26 +97,71 @@ def add_arguments(parser):
        help='the data owner (optional, default is unix username)')
 
 
-def handle_connection_errors(f):
+# responses larger than this are decoded incrementally by lookups, and not cached
+STREAM_SIZE = 1 << 20
+
+# at most this many GET responses are cached, the least recently used ones are dropped
+HTTP_CACHE_SIZE = 256
+STREAM_CHUNK_SIZE = 1 << 16
+
+
+def iter_objects(resp):
+    try:
+        yield from jsonstream.iter_array(resp.iter_content(STREAM_CHUNK_SIZE))
+    finally:
+        resp.close()
+
+
+def handle_connection_errors(f=None, verb='GET'):
+    """
+    Retry the ``verb`` request of ``f`` according to the retry policy of the server.
+    """
+    if f is None:
+        return partial(handle_connection_errors, verb=verb)
+
     @wraps(f)
     def wrapper(api, session, *args):
-        for attempt in range(1, MAX_REQUEST_ATTEMPTS + 1):
+        if api.staging:
+            return f(api, session, *args)
+        policy = api.retry_policy
+        for attempt in range(1, policy.attempts + 1):
+            api.local.attempt = attempt
+            policy.breaker.wait()
             try:
                 rv = f(api, session, *args)
-            except requests.exceptions.ConnectionError as e:
-                warn = 'Connection error, try again... (attempt #{})'.format(attempt)
+            except Exception as e:
+                reason = policy.reason(e, verb)
+                if not reason:
+                    raise
+                policy.breaker.record(False, api.log)
+                api.stats.retry(reason)
+                if attempt == policy.attempts:
+                    break
+                delay = policy.delay(attempt, e)
+                warn = '{}, try again in {:.2f} s... (attempt #{})'.format(
+                    reason.capitalize(), delay, attempt)
                 api.log.warning(warn)
-                time.sleep(0.1 * attempt)
+                time.sleep(delay)
                 continue
-            except:
-                raise
-            break
-        else:
-            raise RuntimeError('Too many connection errors')
-        return rv
+            policy.breaker.record(True, api.log)
+            return rv
+        raise RuntimeError('Too many connection errors')
     return wrapper
 
 
+def api_server(args, log):
+    '''
+    Return the server given to the command by ``li3ds run``, or a new one.
+    '''
+    return getattr(args, 'api_server', None) or ApiServer(args, log)
+
+
+@contextlib.contextmanager
+def shared_session(session):
+    # a session context manager that does not close the session on exit
+    yield session
+
+
 class ApiServer(object):
 
     def __init__(self, args, log):
@@ -59,6 +171,30 @@ class ApiServer(object):
         self.staging = None
         self.log = log
         self.indent = args.indent
+        self.stats = stats.Stats()
+        self.stats_path = getattr(args, 'stats', None)
+        self.stats_prometheus_path = getattr(args, 'stats_prometheus', None)
+        self.plan_path = getattr(args, 'plan', None)
+        self.planner = None
+        self.journal = None
+        self.quarantine = quarantine.Quarantine.from_args(args)
+        # the server of a view, see view
+        self.parent = None
+        # shared by the views
+        self.transfo_types = catalog.TransfoTypeCatalog()
+        # the open journals by path, see open_journal
+        self.journals = {}
+        # the attempt of the request of each thread, the views share it
+        self.local = threading.local()
+        self.retry_policy = retry.RetryPolicy.from_args(args)
+        # validators and bodies of the GET responses, by URL, see get
+        self.http_cache = (None if getattr(args, 'no_http_cache', False) else
+                           collections.OrderedDict())
+        # set by share, see view
+        self.shared_session = None
+        self.cache = None
+        self.key_locks = None
+        self.lock = threading.Lock()
 
         if args.api_url:
             if not args.api_key:
@@ -70,6 +206,7 @@ class ApiServer(object):
                 'X-API-KEY': args.api_key
             }
             self.proxies = {'http': None} if args.no_proxy else None
+            self.journal = self.open_journal(args)
         else:
             self.log.info('! Staging mode (use -u/-k options '
                           'to provide an api url and key)')
@@ -89,16 +226,220 @@ class ApiServer(object):
                 'foreignpc/view': [],
             }
 
-    @handle_connection_errors
+    def request(self, session, verb, typ, url, headers=None, **kwargs):
+        '''
+        Send an API request and record its latency and status in the statistics.
+        '''
+        import requests
+        if headers:
+            headers = dict(self.headers, **headers)
+        with phases.phase('request', 'http', verb=verb, type=typ, url=url) as span:
+            start = time.perf_counter()
+            try:
+                resp = session.request(
+                    verb, url, headers=headers or self.headers, proxies=self.proxies,
+                    timeout=self.retry_policy.timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self.stats.request(verb, typ, None, time.perf_counter() - start,
+                                   self.retried())
+                raise
+            self.stats.request(verb, typ, resp.status_code, time.perf_counter() - start,
+                               self.retried())
+            span.args['status'] = resp.status_code
+        if self.retry_policy.retryable(verb, resp.status_code):
+            resp.close()
+            raise retry.RetryableStatus(resp)
+        return resp
+
+    def retried(self):
+        return getattr(self.local, 'attempt', 1) > 1
+
+    def get(self, session, typ, url, params=None, stream=False):
+        '''
+        Send a GET request, conditional if the response to the same request was cached.
+        Return the status code, the decoded body (a copy of the cached one if the server
+        answers 304 Not Modified) and the URL of the next page of the collection, if any.
+        Only the responses to requests without query parameters are cached, lookups are
+        rarely sent twice.
+
+        With ``stream``, a body larger than STREAM_SIZE is not cached but returned as an
+        iterator over the objects of the collection, decoded as they are downloaded. It
+        should be closed if it is not exhausted.
+        '''
+        cache = self.http_cache if not params else None
+        cached = None
+        if cache is not None:
+            with self.lock:
+                cached = cache.get(url)
+                if cached:
+                    cache.move_to_end(url)
+        resp = self.request(session, 'GET', typ, url, params=params,
+                            headers=cached[0] if cached else None, stream=stream)
+        if resp.status_code == 304 and cached:
+            resp.close()
+            # the body is decoded again, the caller may change it
+            return 200, json.loads(cached[1]), cached[2]
+        if resp.status_code != 200:
+            resp.close()
+            return resp.status_code, None, None
+        next_url = resp.links.get('next', {}).get('url')
+        size = resp.headers.get('Content-Length')
+        if stream and (size is None or int(size) > STREAM_SIZE):
+            return 200, iter_objects(resp), next_url
+        content = resp.json()
+        validators = {}
+        if resp.headers.get('ETag'):
+            validators['If-None-Match'] = resp.headers['ETag']
+        if resp.headers.get('Last-Modified'):
+            validators['If-Modified-Since'] = resp.headers['Last-Modified']
+        if validators and cache is not None:
+            with self.lock:
+                cache[url] = (validators, resp.content, next_url)
+                cache.move_to_end(url)
+                if len(cache) > HTTP_CACHE_SIZE:
+                    cache.popitem(last=False)
+        return 200, content, next_url
+
+    def find(self, session, typ, url, params, match):
+        '''
+        Return the first object of the collection at url for which match is true, or None.
+        The query parameters let the server filter the collection. Pages are followed,
+        and large ones are only downloaded up to the first match.
+        '''
+        while url:
+            status, objs, url = self.get(session, typ, url, params, stream=True)
+            if status != 200:
+                err = 'Getting object failed (status code: {})'.format(status)
+                raise RuntimeError(err)
+            try:
+                for obj in objs:
+                    if match(obj):
+                        return obj
+            finally:
+                if hasattr(objs, 'close'):
+                    objs.close()
+            # the URL of the next page has the query parameters
+            params = None
+        return None
+
+    def session(self):
+        '''
+        Return the HTTP session context manager, or a null one in staging mode.
+        '''
+        if self.staging:
+            return contextlib.ExitStack()
+        if self.shared_session:
+            return shared_session(self.shared_session)
+        import requests
+        return requests.Session()
+
+    def share(self, pool_size):
+        '''
+        Share one HTTP connection pool of ``pool_size`` connections and a lookup cache
+        between the views of this server.
+        '''
+        if not self.staging:
+            import requests
+            self.shared_session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=pool_size, pool_maxsize=pool_size)
+            self.shared_session.mount('http://', adapter)
+            self.shared_session.mount('https://', adapter)
+        self.cache = {}
+        # the locks of the cache keys being looked up, see key_lock
+        self.key_locks = {}
+
+    def key_lock(self, cache_key):
+        with self.lock:
+            return self.key_locks.setdefault(cache_key, threading.Lock())
+
+    def close(self):
+        if self.shared_session:
+            self.shared_session.close()
+            self.shared_session = None
+        for journal in self.journals.values():
+            journal.close()
+        self.journals.clear()
+
+    def view(self, args, log):
+        '''
+        Return a server sharing the connection settings, HTTP session, staging objects
+        and lookup cache of this one, with its own log and statistics. Views may be used
+        concurrently. The views whose args have no plan, journal or quarantine options
+        share the ones of this server.
+        '''
+        view = copy.copy(self)
+        view.parent = self
+        view.log = log
+        view.stats = stats.Stats()
+        view.stats_path = getattr(args, 'stats', None)
+        view.stats_prometheus_path = getattr(args, 'stats_prometheus', None)
+        if getattr(args, 'plan', None):
+            view.plan_path = args.plan
+            view.planner = None
+        elif self.plan_path:
+            with self.lock:
+                if not self.planner:
+                    from . import plan
+                    self.planner = plan.Planner(self)
+            view.planner = self.planner
+        if getattr(args, 'journal', None) or getattr(args, 'resume', None):
+            view.journal = self.open_journal(args)
+        if any(getattr(args, name, None) for name in quarantine.ARGS):
+            view.quarantine = quarantine.Quarantine.from_args(args)
+        return view
+
+    def open_journal(self, args):
+        '''
+        Return the journal of args, opened once by path for this server and its views.
+        '''
+        path = getattr(args, 'journal', None) or getattr(args, 'resume', None)
+        if not path:
+            return None
+        from .journal import Journal
+        with self.lock:
+            journal = self.journals.get(path)
+            if journal is None:
+                journal = self.journals[path] = Journal.from_args(args, self.api_url)
+            elif getattr(args, 'resume', None):
+                journal.read(args.resume)
+        return journal
+
+    def log_retries(self):
+        reasons = self.stats.retry_reasons
+        if reasons:
+            self.log.info('Retried requests: {}, circuit breaker tripped {:d} times'.format(
+                ', '.join('{:d} {}'.format(count, reason)
+                          for reason, count in reasons.most_common()),
+                self.retry_policy.breaker.trips))
+
+    def write_stats(self):
+        if self.stats_path:
+            self.stats.write_json(self.stats_path)
+        if self.stats_prometheus_path:
+            self.stats.write_prometheus(self.stats_prometheus_path)
+
+    def finish(self):
+        '''
+        Log the retries, and write the statistics and the quarantine once the command is
+        done. The quarantine of a run shared by its steps is written by the run.
+        '''
+        self.log_retries()
+        self.write_stats()
+        if not self.parent or self.quarantine is not self.parent.quarantine:
+            self.quarantine.write(self.log)
+
+    @handle_connection_errors(verb='POST')
     def create_object(self, session, typ, obj, parent):
         if self.staging:
-            obj['id'] = len(self.staging[typ])
-            self.staging[typ].append(obj)
+            with self.lock:
+                obj['id'] = len(self.staging[typ])
+                self.staging[typ].append(obj)
             return obj
 
         url = self.api_url + '/{}s/'.format(typ.format(**parent))
-        resp = session.post(
-            url, json=obj, headers=self.headers, proxies=self.proxies)
+        resp = self.request(
+            session, 'POST', typ, url, json=obj)
         if resp.status_code == 201:
             objs = resp.json()
             return objs[0]
@@ -108,6 +449,31 @@ class ApiServer(object):
               resp.status_code)
         raise RuntimeError(err)
 
+    @handle_connection_errors(verb='PATCH')
+    def update_object(self, session, typ, obj_id, obj, parent):
+        '''
+        Send a partial update of an object. Transfo parameters sent this way are
+        appended to the existing ones.
+        '''
+        if self.staging:
+            got = self.staging[typ][obj_id]
+            for key, value in obj.items():
+                if key == 'parameters':
+                    got.setdefault(key, []).extend(value)
+                else:
+                    got[key] = value
+            return got
+
+        url = self.api_url + '/{}s/{:d}/'.format(typ.format(**parent), obj_id)
+        resp = self.request(
+            session, 'PATCH', typ, url, json=obj)
+        if resp.status_code == 200:
+            objs = resp.json()
+            return objs[0]
+        err = 'Updating object failed (status code: {})'.format(
+              resp.status_code)
+        raise RuntimeError(err)
+
     @handle_connection_errors
     def get_object_by_id(self, session, typ, obj_id, parent):
         if self.staging:
@@ -115,16 +481,12 @@ class ApiServer(object):
             return objs[obj_id] if obj_id < len(objs) else None
 
         url = self.api_url + '/{}s/{:d}/'.format(typ.format(**parent), obj_id)
-        resp = session.get(url, headers=self.headers, proxies=self.proxies)
-        if resp.status_code == 200:
-            objs = resp.json()
+        status, objs, _ = self.get(session, typ, url)
+        if status == 200:
             return objs[0]
-        if resp.status_code == 404:
+        if status == 404:
             return None
-        if resp.status_code == 400:
-            raise requests.exceptions.ConnectionError('Bad Request, retrying')
-        err = 'Getting object failed (status code: {})'.format(
-              resp.status_code)
+        err = 'Getting object failed (status code: {})'.format(status)
         raise RuntimeError(err)
 
     @handle_connection_errors
@@ -135,19 +497,8 @@ class ApiServer(object):
             return obj[0] if obj else None
 
         url = self.api_url + '/{}s/'.format(typ.format(**parent))
-        resp = session.get(url, headers=self.headers, proxies=self.proxies)
-        if resp.status_code == 200:
-            objs = resp.json()
-            try:
-                obj = next(o for o in objs if o['name'] == obj_name)
-            except StopIteration:
-                return None
-            return obj
-        if resp.status_code == 400:
-            raise requests.exceptions.ConnectionError('Bad Request, retrying')
-        err = 'Getting object failed (status code: {})'.format(
-              resp.status_code)
-        raise RuntimeError(err)
+        return self.find(session, typ, url, {'name': obj_name},
+                         lambda o: o['name'] == obj_name)
 
     @handle_connection_errors
     def get_object_by_dict(self, session, typ, dict_, parent):
@@ -158,20 +509,8 @@ class ApiServer(object):
             return obj[0] if obj else None
 
         url = self.api_url + '/{}s/'.format(typ.format(**parent))
-        resp = session.get(url, headers=self.headers, proxies=self.proxies, params=dict_)
-        if resp.status_code == 200:
-            objs = resp.json()
-            try:
-                obj = next(o for o in objs if all(
-                    o[k] == v for k, v in dict_.items() if k in o))
-            except StopIteration:
-                return None
-            return obj
-        if resp.status_code == 400:
-            raise requests.exceptions.ConnectionError('Bad Request, retrying')
-        err = 'Getting object failed (status code: {})'.format(
-              resp.status_code)
-        raise RuntimeError(err)
+        return self.find(session, typ, url, dict_, lambda o: all(
+            o[k] == v for k, v in dict_.items() if k in o))
 
     @handle_connection_errors
     def get_objects(self, session, typ, parent):
@@ -179,17 +518,84 @@ class ApiServer(object):
             return self.staging[typ]
 
         url = self.api_url + '/{}s/'.format(typ.format(**parent))
-        resp = session.get(url, headers=self.headers, proxies=self.proxies)
-        if resp.status_code == 200:
-            objs = resp.json()
-            return objs
-        if resp.status_code == 400:
-            raise requests.exceptions.ConnectionError('Bad Request, retrying')
-        err = 'Getting object failed (status code: {})'.format(
-              resp.status_code)
-        raise RuntimeError(err)
+        objs = None
+        while url:
+            status, page, url = self.get(session, typ, url)
+            if status != 200:
+                err = 'Getting object failed (status code: {})'.format(status)
+                raise RuntimeError(err)
+            objs = page if objs is None else objs + page
+        return objs
+
+    @handle_connection_errors
+    def get_page(self, session, typ, url):
+        '''
+        Return the objects of the collection page at url, and the URL of the next page.
+        '''
+        status, page, url = self.get(session, typ, url)
+        if status != 200:
+            err = 'Getting object failed (status code: {})'.format(status)
+            raise RuntimeError(err)
+        return page, url
+
+    def iter_pages(self, session, typ, parent):
+        '''
+        Yield the pages of the objects of a collection as they are downloaded, each one
+        retried on its own.
+        '''
+        if self.staging:
+            yield self.staging[typ]
+            return
+
+        url = self.api_url + '/{}s/'.format(typ.format(**parent))
+        while url:
+            page, url = self.get_page(session, typ, url)
+            yield page
+
+    @staticmethod
+    def append_update(typ, obj, got):
+        '''
+        Return the update appending to got the parameters of obj whose _time it does not
+        have yet, and extending its validity range accordingly, or None if got has them
+        all. Raise an error upon value mismatch for the other keys.
+        '''
+        all_keys = set(obj.keys()).intersection(got.keys())
+        all_keys -= {'description', 'parameters', 'validity_start', 'validity_end'}
+        for key in all_keys:
+            if obj[key] != got[key]:
+                display_name = obj.get('name', got.get('id'))
+                err = 'Error: "{}" mismatch in {} "{}" ' \
+                      '("{}" vs "{}")' \
+                      .format(key, typ, display_name, obj[key], got[key])
+                raise RuntimeError(err)
 
-    def get_or_create_object(self, session, typ, obj, key, parent):
+        times = {isoformat(p.get('_time')) for p in got.get('parameters') or []}
+        parameters = [p for p in obj.get('parameters', [])
+                      if isoformat(p.get('_time')) not in times]
+        if not parameters:
+            return None
+
+        update = {'parameters': parameters}
+        for key, extend in (('validity_start', min), ('validity_end', max)):
+            # a missing validity bound means unbounded, keep it that way
+            if got.get(key) and obj.get(key):
+                import dateutil.parser
+                dates = (dateutil.parser.parse(got[key]), dateutil.parser.parse(obj[key]))
+                update[key] = isoformat(extend(dates))
+        return update
+
+    def append_object(self, session, typ, obj, got, parent):
+        '''
+        Append to got the parameters of obj whose _time it does not have yet, see
+        append_update. Only the new parameters are sent.
+        '''
+        update = self.append_update(typ, obj, got)
+        if not update:
+            return got, '?'
+        got = self.update_object(session, typ, got['id'], update, parent)
+        return got, '>'
+
+    def get_or_create_object(self, session, typ, obj, key, parent, append=False):
         if 'id' in obj:
             # look up by id, raise an error upon lookup failure
             # or value mismatch for specified keys
@@ -215,51 +621,98 @@ class ApiServer(object):
                   .format(typ, ','.join(key), obj)
             raise RuntimeError(err)
 
+        if typ == catalog.TRANSFO_TYPE and not self.staging:
+            got, code = self.transfo_types.get_or_create(self, session, obj)
+            if got:
+                return got, code
+
         # look up by dict, and raise an error upon mismatch
         dict_ = {k: obj[k] for k in key}
-        got = self.get_object_by_dict(session, typ, dict_, parent)
-        if got:
-            # raise an error upon value mismatch for specified keys
-            all_keys = set(obj.keys()).intersection(got.keys())
-            all_keys.discard('description')
-            for key in all_keys:
-                if obj[key] != got[key]:
-                    display_name = obj.get('name', got.get('id'))
-                    err = 'Error: "{}" mismatch in {} "{}" ' \
-                          '("{}" vs "{}")' \
-                          .format(key, typ, display_name, obj[key], got[key])
-                    raise RuntimeError(err)
+        cache_key = None
+        got = None
+        with contextlib.ExitStack() as stack:
+            if self.cache is not None and not append:
+                # appended objects may change, only cache the others
+                cache_key = (typ.format(**parent),
+                             json.dumps(dict_, sort_keys=True, default=str))
+                # the views sharing the cache look up or create an object once, the others
+                # wait for it
+                stack.enter_context(self.key_lock(cache_key))
+                got = self.cache.get(cache_key)
+                if got:
+                    self.stats.cache_hit(typ)
+            if not got:
+                got = self.get_object_by_dict(session, typ, dict_, parent)
+            if got and append and not obj.get('parameters_column'):
+                # append new parameters instead of raising an error upon mismatch
+                return self.append_object(session, typ, obj, got, parent)
+            if got:
+                # raise an error upon value mismatch for specified keys
+                all_keys = set(obj.keys()).intersection(got.keys())
+                all_keys.discard('description')
+                for key in all_keys:
+                    if obj[key] != got[key]:
+                        display_name = obj.get('name', got.get('id'))
+                        err = 'Error: "{}" mismatch in {} "{}" ' \
+                              '("{}" vs "{}")' \
+                              .format(key, typ, display_name, obj[key], got[key])
+                        raise RuntimeError(err)
 
-            return got, '?'
+                if cache_key:
+                    self.cache[cache_key] = got
+                return got, '?'
 
-        # no successfull lookup by id or by name, create a new object
-        got = self.create_object(session, typ, obj, parent)
-        return got, '+'
+            # no successfull lookup by id or by name, create a new object
+            got = self.create_object(session, typ, obj, parent)
+            if got and cache_key:
+                self.cache[cache_key] = got
+            return got, '+'
 
     def get_or_create(self, session, apiobj):
+        # appended objects may get new parameters, they are not resumed
+        journal_key = None
+        if self.journal and not apiobj.append:
+            journal_key = self.journal.key(apiobj)
+            obj_id = self.journal.published.get(journal_key)
+            if obj_id is not None:
+                apiobj.obj['id'] = obj_id
+                self.stats.code(apiobj.type_, '~')
+                self.log.info('~ ({}) {} [{}]'.format(obj_id, journal_key[0], ', '.join(
+                    str(apiobj.obj[k]) for k in apiobj.key if k in apiobj.obj)))
+                return apiobj.obj
+        with phases.phase('get_or_create', 'api', type=apiobj.type_) as span:
+            obj, code = self._get_or_create(session, apiobj)
+            span.args['code'] = code
+        if journal_key and 'id' in obj:
+            self.journal.record(journal_key, obj['id'])
+        return obj
+
+    def _get_or_create(self, session, apiobj):
         self.log.debug('')
         if not self.staging:
             self.log.debug('-->' + json.dumps(apiobj.obj, indent=self.indent))
         obj, code = self.get_or_create_object(
-            session, apiobj.type_, apiobj.obj, apiobj.key, apiobj.parent.obj)
+            session, apiobj.type_, apiobj.obj, apiobj.key, apiobj.parent.obj, apiobj.append)
         if not obj:
             # If obj is None it means that creating the object into the database failed because of
             # a database integrity error ("duplicate key violation"). This may happen if a
             # concurrent transaction sneaked in and inserted the object. So we just give
             # get_or_create_object another chance.
             obj, code = self.get_or_create_object(
-                session, apiobj.type_, apiobj.obj, apiobj.key, apiobj.parent.obj)
+                session, apiobj.type_, apiobj.obj, apiobj.key, apiobj.parent.obj,
+                apiobj.append)
         if not obj:
             self.log.info('request failed twice, aborting')
-            return apiobj.obj
+            return apiobj.obj, code
         apiobj.obj = obj
+        self.stats.code(apiobj.type_, code)
         self.log.debug('<--' + json.dumps(apiobj.obj, indent=self.indent))
         info = '{} ({}) {} [{}] {}'.format(
             code, apiobj.obj.get('id', '?'), apiobj.type_.format(**apiobj.parent.obj),
             ', '.join(str(apiobj.obj[k]) for k in apiobj.key if k in apiobj.obj),
             obj.get('uri', '') if obj else '')
         self.log.info(info)
-        return obj
+        return obj, code
 
 
 class ApiObjs:
@@ -267,16 +720,115 @@ class ApiObjs:
     def __init__(self, api):
         self.api = api
         self.objs = []
+        # input files of the objects added within input, by id
+        self.sources = {}
+        # interned objects, by primary key, in the order they were interned
+        self.interned = collections.OrderedDict()
+        # the lists extended within input and their lengths before, to undo the extensions
+        self.extended = []
 
     def add(self, *objs):
         for obj in objs:
             assert(isinstance(obj, ApiObj))
             self.objs.append(obj)
 
+    def intern(self, obj):
+        '''
+        Return the object equal to obj interned before, raising an error if their values
+        mismatch, or intern obj. The objects shared by the input files are then built
+        once, and looked up or created once.
+        '''
+        interned = self.interned.setdefault(obj.primary_key(), obj)
+        if interned is not obj:
+            for key in set(obj.obj).intersection(interned.obj).difference(('description',)):
+                if obj.obj[key] != interned.obj[key]:
+                    err = 'Error: "{}" mismatch in {} "{}" ("{}" vs "{}")'.format(
+                        key, obj.type_, obj.obj.get('name'), obj.obj[key], interned.obj[key])
+                    raise RuntimeError(err)
+        return interned
+
+    def extend(self, obj, key, values):
+        '''
+        Extend the ``key`` list of an object added before, e.g. with the poses of a series.
+        Within input, the values are removed again if the input file fails.
+        '''
+        array = obj.obj[key]
+        self.extended.append((array, len(array)))
+        array.extend(values)
+
+    def inputs(self, paths):
+        '''
+        Yield the paths to import, only the quarantined ones with --retry-quarantine.
+        '''
+        for path in paths:
+            if self.api.quarantine.retried(path):
+                yield path
+
+    @contextlib.contextmanager
+    def input(self, path):
+        '''
+        Context of the objects added for an input file. With --keep-going, an error
+        quarantines the file and removes its objects and extensions instead of aborting the
+        import.
+        '''
+        count = len(self.objs)
+        interned = len(self.interned)
+        del self.extended[:]
+        try:
+            yield
+        except Exception as e:
+            if not self.api.quarantine.keep_going:
+                raise
+            del self.objs[count:]
+            for key in list(self.interned)[interned:]:
+                del self.interned[key]
+            for array, length in reversed(self.extended):
+                del array[length:]
+            self.api.quarantine.add(self.api.log, e, input=str(path), phase=phases.GRAPH)
+            return
+        finally:
+            del self.extended[:]
+        for obj in self.objs[count:]:
+            self.sources[id(obj)] = str(path)
+
     def get_or_create(self):
-        with requests.Session() as session:
-            for obj in self.objs:
-                obj.get_or_create(session, self.api)
+        if self.api.plan_path:
+            return self.plan()
+        quarantine = self.api.quarantine
+        try:
+            with phases.phase(phases.PUBLISH), self.api.session() as session:
+                for obj in self.objs:
+                    if not quarantine.keep_going:
+                        obj.get_or_create(session, self.api)
+                        continue
+                    try:
+                        obj.get_or_create(session, self.api)
+                    except Exception as e:
+                        # the objects obj depends on may have been published
+                        quarantine.add(
+                            self.api.log, e, input=self.sources.get(id(obj)),
+                            phase=phases.PUBLISH, type=obj.type_,
+                            key={k: obj.obj.get(k) for k in obj.key})
+        finally:
+            if self.api.journal:
+                self.api.journal.flush()
+
+    def plan(self):
+        '''
+        Add the objects to the plan of the server, and write it. The plan is written again
+        by each call, with the objects of the previous ones.
+        '''
+        from . import plan
+        if not self.api.planner:
+            self.api.planner = plan.Planner(self.api)
+        planner = self.api.planner
+        # the steps of a run may share the plan
+        with planner.lock:
+            with phases.phase(phases.PUBLISH), self.api.session() as session:
+                for obj in self.objs:
+                    planner.add(session, obj)
+            planner.write(self.api.plan_path)
+            planner.log_summary(self.api.log)
 
     def lookup(self, obj):
         '''
@@ -294,6 +846,7 @@ class ApiObjs:
 class ApiObj:
     key = ()
     type_ = None
+    append = False
 
     def __init__(self, keys, obj=None, **kwarg):
         self.published = False
@@ -306,10 +859,18 @@ class ApiObj:
             self.update(**obj)
         self.update(**kwarg)
 
+    def prepare(self):
+        '''
+        Complete the object before it is published, or planned.
+        '''
+        pass
+
     def get_or_create(self, session, api):
         if self.published:
+            api.stats.cache_hit(self.type_)
             return self
 
+        self.prepare()
         for key in self.objs:
             if self.objs[key]:
                 self.obj[key] = self.objs[key].get_or_create(session, api).obj['id']
@@ -394,6 +955,27 @@ class ApiObj:
     def __bool__(self):
         return True
 
+    def primary_key(self):
+        '''
+        Return a hashable key, the same for the objects of a parent that are equal.
+        '''
+        values = []
+        for id_ in self.key:
+            if id_ in self.obj:
+                value = self.obj[id_]
+                try:
+                    hash(value)
+                except TypeError:
+                    value = json.dumps(value, sort_keys=True, default=str)
+            elif id_ in self.objs:
+                value = self.objs[id_].primary_key()
+            elif id_ in self.arrays:
+                value = tuple(obj.primary_key() for obj in self.arrays[id_])
+            else:
+                value = None
+            values.append(value)
+        return self.type_, self.parent.primary_key(), tuple(values)
+
 
 class _NoObj(ApiObj):
     type_ = 'noobj'
@@ -405,6 +987,9 @@ class _NoObj(ApiObj):
     def get_or_create(self, session, api):
         return self
 
+    def primary_key(self):
+        return None
+
     def __bool__(self):
         return False
 
@@ -475,32 +1060,29 @@ class Transfo(ApiObj):
             'transfo_type': transfo_type
         }
 
-    def get_or_create(self, session, api):
-        if not self.published:
-            parameters = self.obj.get('parameters')
-            parameters_column = self.obj.get('parameters_column')
-            if parameters and not parameters_column:
+    def prepare(self):
+        parameters = self.obj.get('parameters')
+        parameters_column = self.obj.get('parameters_column')
+        if parameters and not parameters_column:
 
-                if len(parameters) > 1:
-                    try:
-                        parameters.sort(key=lambda elt: elt['_time'])
-                    except KeyError as e:
-                        err = 'Error: _time missing in transfo parameters'
-                        raise RuntimeError(err)
-
-                for parameter in parameters:
-                    if '_time' in parameter:
-                        parameter['_time'] = isoformat(parameter['_time'])
+            if len(parameters) > 1:
+                try:
+                    parameters.sort(key=lambda elt: elt['_time'])
+                except KeyError as e:
+                    err = 'Error: _time missing in transfo parameters'
+                    raise RuntimeError(err)
 
-                validity_start = self.obj.get('validity_start')
-                if not validity_start and '_time' in parameters[0]:
-                    self.obj['validity_start'] = parameters[0]['_time']
+            for parameter in parameters:
+                if '_time' in parameter:
+                    parameter['_time'] = isoformat(parameter['_time'])
 
-                validity_end = self.obj.get('validity_end')
-                if not validity_end and '_time' in parameters[-1]:
-                    self.obj['validity_end'] = parameters[-1]['_time']
+            validity_start = self.obj.get('validity_start')
+            if not validity_start and '_time' in parameters[0]:
+                self.obj['validity_start'] = parameters[0]['_time']
 
-        return super().get_or_create(session, api)
+            validity_end = self.obj.get('validity_end')
+            if not validity_end and '_time' in parameters[-1]:
+                self.obj['validity_end'] = parameters[-1]['_time']
 
 
 class Transfotree(ApiObj):
@@ -565,7 +1147,7 @@ class Config(ApiObj):
     key = ('name',)
 
     def __init__(self, platform, transfotrees, obj=None, **kwarg):
-        keys = ('id', 'name', 'description', 'root', 'srid')
+        keys = ('id', 'name', 'description', 'root', 'srid', 'owner')
         super().__init__(keys, obj, **kwarg)
         self.objs = {'platform': platform}
         self.arrays = {'transfo_trees': transfotrees}
@@ -602,34 +1184,102 @@ class ForeignpcView(ApiObj):
         self.objs = {'table': table}
 
 
+# at most this many compiled update_obj templates are kept
+TEMPLATE_CACHE_SIZE = 1024
+
+# compiled templates, by type, args and template values
+_templates = {}
+
+
+class Template:
+    """
+    An update_obj template compiled once: its constant values, and its format strings with
+    the metadata fields they refer to. ``args`` should not change once compiled.
+    """
+
+    def __init__(self, args, obj, type_):
+        self.type_ = type_
+        obj = dict(obj)
+        noname = ('datasource', 'foreignpc/table', 'foreignpc/view')
+        nodesc = ('datasource', 'transfotree', 'project', 'session',
+                  'foreignpc/server', 'foreignpc/table', 'foreignpc/view')
+        if all(not type_.startswith(s) for s in noname):
+            obj.setdefault('name', '{basename}')
+        if all(not type_.startswith(s) for s in nodesc):
+            obj.setdefault('description', 'Imported from "{basename}"')
+        if args and type_ in args:
+            obj.update({k: v for k, v in args[type_].items() if v is not None})
+        # (key, value, None) for constant values, (key, format string, field names) for the
+        # others, in the order of the keys
+        self.items = []
+        for key, value in obj.items():
+            if not value or not isinstance(value, str):
+                self.items.append((key, value, None))
+                continue
+            fields = [field for _, field, _, _ in string.Formatter().parse(value)
+                      if field is not None]
+            if not fields:
+                self.items.append((key, value.format(), None))
+                continue
+            # the metadata key of "{key.attr}" or "{key[index]}", positional fields are
+            # left to str.format
+            names = [re.split(r'[.[]', field, 1)[0] for field in fields]
+            self.items.append((key, value, [name for name in names if not name.isdigit()]))
+
+    def apply(self, metadata):
+        '''
+        Return the object of the metadata. A value referring to a metadata field that is
+        None is left out, one referring to a missing field raises a KeyError.
+        '''
+        with phases.phase('update_obj', 'template', type=self.type_):
+            obj = {}
+            for key, value, names in self.items:
+                if names is None:
+                    obj[key] = value
+                    continue
+                missing = next((name for name in names if metadata.get(name) is None), None)
+                try:
+                    if missing is not None:
+                        raise KeyError(missing)
+                    obj[key] = value.format_map(metadata)
+                except KeyError as e:
+                    # value contains replacement fields that have no corresponding
+                    # keys in metadata, or whose values are None: raise an error if the
+                    # key is not in metadata, otherwise just leave the key out
+                    if e.args[0] not in metadata:
+                        err = 'metadata {} not available for {}/{}="{}"'
+                        raise KeyError(err.format(e.args[0], self.type_, key, value))
+            return obj
+
+
+def compile_template(args, obj, type_):
+    '''
+    Return the compiled template of obj, cached for the next objects of the same type, args
+    and template values.
+    '''
+    try:
+        key = (type_, id(args), tuple(obj.items()))
+        cached = _templates.get(key)
+    except TypeError:
+        # unhashable template values may be mutated, do not share them
+        return Template(args, obj, type_)
+    if cached and cached[0] is args:
+        return cached[1]
+    if len(_templates) >= TEMPLATE_CACHE_SIZE:
+        _templates.clear()
+    template = Template(args, obj, type_)
+    _templates[key] = args, template
+    return template
+
+
 def update_obj(args, metadata, obj, type_):
-    noname = ('datasource', 'foreignpc/table', 'foreignpc/view')
-    nodesc = ('datasource', 'transfotree', 'project', 'session',
-              'foreignpc/server', 'foreignpc/table', 'foreignpc/view')
-    if all(not type_.startswith(s) for s in noname):
-        obj.setdefault('name', '{basename}')
-    if all(not type_.startswith(s) for s in nodesc):
-        obj.setdefault('description', 'Imported from "{basename}"')
-    if args and type_ in args:
-        obj.update({k: v for k, v in args[type_].items() if v is not None})
-    metadata_no_none = {k: v for k, v in metadata.items() if v is not None}
-    for key in list(obj.keys()):
-        if obj[key] and isinstance(obj[key], str):
-            try:
-                obj[key] = obj[key].format(**metadata_no_none)
-            except KeyError as e:
-                # obj[key] contain replacements fields that have no
-                # corresponding keys in metadata_no_none, raise an
-                # error if key is not in the original metadata,
-                # otherwise just delete the key from the object
-                # and continue
-                if e.args[0] not in metadata:
-                    err = 'metadata {} not available for {}/{}="{}"'
-                    raise KeyError(err.format(e.args[0], type_, key, obj[key]))
-                del obj[key]
+    values = compile_template(args, obj, type_).apply(metadata)
+    obj.clear()
+    obj.update(values)
 
 
 def isoformat(date):
     if isinstance(date, str):
+        import dateutil.parser
         date = dateutil.parser.parse(date)
     return date.isoformat() if date else None
@@ -0,0 +1,92 @@
+import logging
+import concurrent.futures
+
+from cliff.command import Command
+
+from . import api
+from . import plan
+from . import phases
+
+
+class Apply(Command):
+    """ create the new objects of a plan written by --plan
+    """
+
+    log = logging.getLogger(__name__)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    def get_parser(self, prog_name):
+        self.log.debug(prog_name)
+        parser = super().get_parser(prog_name)
+        api.add_arguments(parser)
+        parser.add_argument(
+            '--jobs', '-j', type=int, default=4,
+            help='number of objects created concurrently (optional, default is 4)')
+        parser.add_argument(
+            'filename', nargs=1,
+            help='the plan file')
+        return parser
+
+    def take_action(self, parsed_args):
+        """
+        Create the new objects of the plan, level by level of the dependency graph, and
+        append the new parameters of the existing ones.
+        """
+        with phases.phase(phases.PARSING):
+            entries = plan.read(parsed_args.filename[0])['objects']
+
+        mismatches = [entry for entry in entries if entry['action'] == 'mismatch']
+        if mismatches:
+            err = 'Error: {:d} objects of the plan mismatch existing ones ({})'.format(
+                len(mismatches), ', '.join('{} {:d}'.format(entry['type'], entry['id'])
+                                           for entry in mismatches[:10]))
+            raise RuntimeError(err)
+
+        server = api.api_server(parsed_args, self.log)
+        server.share(parsed_args.jobs)
+        # ids of the existing and created objects, by entry number
+        ids = {entry['ref']: entry['id'] for entry in entries if 'id' in entry}
+        try:
+            with phases.phase(phases.PUBLISH), server.session() as session, \
+                    concurrent.futures.ThreadPoolExecutor(parsed_args.jobs) as executor:
+                for level in plan.levels(entries):
+                    created = executor.map(
+                        lambda entry: self.create(session, server, entry, ids), level)
+                    for entry, obj in zip(level, created):
+                        ids[entry['ref']] = obj['id']
+                for entry in entries:
+                    if entry['action'] == 'append':
+                        parent = plan.resolve(entry['parent'], ids)
+                        server.update_object(
+                            session, entry['type'], entry['id'], entry['update'], parent)
+                        server.stats.code(entry['type'], '>')
+                        self.log.info('> ({}) {}'.format(
+                            entry['id'], entry['type'].format(**parent)))
+        finally:
+            server.close()
+        server.finish()
+        self.log.info('Success!\n')
+
+    def create(self, session, server, entry, ids):
+        typ = entry['type']
+        obj = plan.resolve(entry['obj'], ids)
+        for key in entry['arrays']:
+            obj[key] = sorted(obj[key])
+        parent = plan.resolve(entry['parent'], ids)
+        code = '+'
+        got = server.create_object(session, typ, obj, parent)
+        if not got:
+            # created concurrently since the plan was written, see ApiServer.get_or_create
+            code = '?'
+            got = server.get_object_by_dict(
+                session, typ, {k: obj[k] for k in entry['key']}, parent)
+        if not got:
+            err = 'Error: creating {} {} failed'.format(typ, obj)
+            raise RuntimeError(err)
+        server.stats.code(typ, code)
+        self.log.info('{} ({}) {} [{}]'.format(
+            code, got['id'], typ.format(**parent),
+            ', '.join(str(obj[k]) for k in entry['key'] if k in obj)))
+        return got
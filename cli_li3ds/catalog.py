@@ -0,0 +1,43 @@
+"""
+Catalog of the transfo types of the server, fetched once per run. The transfo types of
+the imported transfos are checked against it, instead of being looked up one by one.
+"""
+import threading
+
+
+TRANSFO_TYPE = 'transfos/type'
+
+
+class TransfoTypeCatalog:
+
+    def __init__(self):
+        # transfo types by name, None until fetched
+        self.types = None
+        self.lock = threading.Lock()
+
+    def get_or_create(self, api, session, obj):
+        '''
+        Return the transfo type of the catalog named like obj and '?', raising an error if
+        their values mismatch, or create it and return it and '+'. Return None if the
+        creation failed.
+        '''
+        with self.lock:
+            if self.types is None:
+                self.types = {o['name']: o for o in
+                              api.get_objects(session, TRANSFO_TYPE, {}) or []}
+            got = self.types.get(obj['name'])
+            if got:
+                all_keys = set(obj.keys()).intersection(got.keys())
+                all_keys.discard('description')
+                for key in all_keys:
+                    if obj[key] != got[key]:
+                        err = 'Error: "{}" mismatch in {} "{}" ("{}" vs "{}")'.format(
+                            key, TRANSFO_TYPE, obj['name'], obj[key], got[key])
+                        raise RuntimeError(err)
+                api.stats.cache_hit(TRANSFO_TYPE)
+                return got, '?'
+            # created under the lock, so that a transfo type is only created once
+            got = api.create_object(session, TRANSFO_TYPE, obj, {})
+            if got:
+                self.types[got['name']] = got
+            return got, '+'
@@ -0,0 +1,243 @@
+import os
+import json
+import logging
+import tempfile
+import concurrent.futures
+
+from cliff.command import Command
+
+from . import api
+from . import phases
+
+
+# the collections of a snapshot, in the order import-json reads them
+COLLECTIONS = ('sensor', 'referential', 'transfos/type', 'transfo', 'transfotree',
+               'platform', 'platforms/{id}/config', 'project', 'session', 'datasource')
+
+CONFIG = 'platforms/{id}/config'
+
+# suffix of the names of the transfos and transfo types import-json creates as inverses
+INVERSE = '_inverse'
+
+# the keys of the objects that select and skip_inverses read, by collection
+INDEX_KEYS = {
+    'sensor': ('id',),
+    'referential': ('id', 'sensor'),
+    'transfos/type': ('id', 'name'),
+    'transfo': ('id', 'name', 'source', 'target', 'transfo_type'),
+    'transfotree': ('id', 'transfos'),
+    'platform': ('id',),
+    CONFIG: ('id', 'platform', 'transfo_trees'),
+    'project': ('id', 'name'),
+    'session': ('id', 'name', 'project', 'platform'),
+    'datasource': ('id', 'session', 'referential'),
+}
+
+# the collections indexed without selection: the platforms, whose configs are fetched,
+# and the ones of skip_inverses
+INDEXED = ('transfos/type', 'transfo', 'transfotree', 'platform')
+
+
+class ExportJson(Command):
+    """ export the server objects to a JSON file that import-json reads
+    """
+
+    log = logging.getLogger(__name__)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    def get_parser(self, prog_name):
+        self.log.debug(prog_name)
+        parser = super().get_parser(prog_name)
+        api.add_arguments(parser)
+        parser.add_argument(
+            '--jobs', '-j', type=int, default=4,
+            help='number of collections fetched concurrently (optional, default is 4)')
+        parser.add_argument(
+            '--project', '-p', action='append', metavar='NAME',
+            help='only export the sessions of this project and what they depend on, '
+                 'may be repeated (optional)')
+        parser.add_argument(
+            '--session', '-s', action='append', metavar='NAME',
+            help='only export this session and what it depends on, may be repeated '
+                 '(optional)')
+        parser.add_argument(
+            'filename', nargs=1,
+            help='the JSON file to write')
+        return parser
+
+    def take_action(self, parsed_args):
+        """
+        Fetch the collections concurrently, writing their objects to temporary files as
+        they arrive, select the objects of the projects and sessions from their index, and
+        write the selected ones collection by collection.
+        """
+        server = api.api_server(parsed_args, self.log)
+        if server.staging:
+            err = 'Error: export-json needs an api url'
+            raise RuntimeError(err)
+
+        selection = parsed_args.project or parsed_args.session
+        server.share(parsed_args.jobs)
+        with tempfile.TemporaryDirectory(prefix='li3ds-export-') as directory:
+            try:
+                with phases.phase(phases.DISCOVERY), server.session() as session, \
+                        concurrent.futures.ThreadPoolExecutor(parsed_args.jobs) as executor:
+                    index = fetch(server, session, executor, directory,
+                                  COLLECTIONS if selection else INDEXED)
+            finally:
+                server.close()
+
+            selected = index
+            if selection:
+                selected = select(index, parsed_args.project, parsed_args.session)
+            selected = skip_inverses(selected)
+            counts = write(parsed_args.filename[0], directory, index, selected,
+                           parsed_args.indent)
+
+        for typ in COLLECTIONS:
+            self.log.info('{}: {:d}'.format(typ, counts[typ]))
+        server.finish()
+        self.log.info('Success!\n')
+
+
+def part_path(directory, typ):
+    return os.path.join(directory, typ.replace('/', '_') + '.jsonl')
+
+
+def fetch(server, session, executor, directory, indexed=COLLECTIONS):
+    '''
+    Write the objects of each collection to a JSON lines file of ``directory`` as its
+    pages arrive. Return the index of the ``indexed`` collections: their objects with the
+    keys of INDEX_KEYS only, in the order of the files.
+    '''
+    def fetch_collection(typ, parents):
+        index = [] if typ in indexed else None
+        with open(part_path(directory, typ), 'w') as f:
+            for parent in parents:
+                for page in server.iter_pages(session, typ, parent):
+                    for obj in page or []:
+                        if typ == CONFIG:
+                            obj.setdefault('platform', parent['id'])
+                        f.write(json.dumps(obj, sort_keys=True, default=str) + '\n')
+                        if index is not None:
+                            index.append({k: obj[k] for k in INDEX_KEYS[typ] if k in obj})
+        return index
+
+    futures = {typ: executor.submit(fetch_collection, typ, [{}])
+               for typ in COLLECTIONS if typ != CONFIG}
+    index = {typ: future.result() for typ, future in futures.items()}
+    # the configs are fetched by platform, once the platforms are
+    index[CONFIG] = fetch_collection(CONFIG, index['platform'])
+    return {typ: index[typ] for typ in COLLECTIONS if index[typ] is not None}
+
+
+def select(snapshot, projects=None, sessions=None):
+    '''
+    Return the snapshot of the sessions of ``projects`` named ``sessions``, with the
+    objects they depend on: their projects, platforms, configs and transfotrees, and their
+    datasources with their referentials and sensors.
+    '''
+    project_ids = {o['id'] for o in snapshot['project'] if not projects or o['name'] in projects}
+    kept = {'session': {o['id'] for o in snapshot['session']
+                        if o['project'] in project_ids and
+                        (not sessions or o['name'] in sessions)}}
+
+    def ids(typ, key, values=None):
+        objs = snapshot[typ] if values is None else [
+            o for o in snapshot[typ] if o['id'] in values]
+        found = set()
+        for o in objs:
+            value = o.get(key)
+            found.update(value if isinstance(value, list) else [value])
+        return found
+
+    kept['project'] = ids('session', 'project', kept['session'])
+    if not sessions:
+        kept['project'] |= project_ids
+    kept['platform'] = ids('session', 'platform', kept['session'])
+    kept['datasource'] = {o['id'] for o in snapshot['datasource']
+                          if o['session'] in kept['session']}
+    kept[CONFIG] = {o['id'] for o in snapshot[CONFIG] if o['platform'] in kept['platform']}
+    kept['transfotree'] = ids(CONFIG, 'transfo_trees', kept[CONFIG])
+    kept['transfo'] = ids('transfotree', 'transfos', kept['transfotree'])
+    kept['transfos/type'] = ids('transfo', 'transfo_type', kept['transfo'])
+    kept['referential'] = (ids('datasource', 'referential', kept['datasource']) |
+                           ids('transfo', 'source', kept['transfo']) |
+                           ids('transfo', 'target', kept['transfo']))
+    kept['sensor'] = ids('referential', 'sensor', kept['referential'])
+    return {typ: [o for o in snapshot[typ] if o['id'] in kept[typ]] for typ in COLLECTIONS}
+
+
+def skip_inverses(snapshot):
+    '''
+    Return the snapshot without the transfos and transfo types that import-json creates
+    again as the inverses of others, and with transfotrees referring to the transfos
+    instead of their inverses.
+    '''
+    transfos = snapshot['transfo']
+    forward = {(o['name'], o['source'], o['target']): o['id'] for o in transfos}
+    # id of the inverted transfo, by inverse id
+    inverses = {}
+    for o in transfos:
+        key = (o['name'][:-len(INVERSE)], o['target'], o['source'])
+        if o['name'].endswith(INVERSE) and key in forward:
+            inverses[o['id']] = forward[key]
+    transfos = [o for o in transfos if o['id'] not in inverses]
+
+    # inverse types are only skipped if no exported transfo uses them
+    used = {o['transfo_type'] for o in transfos}
+    names = {o['name'] for o in snapshot['transfos/type']}
+    types = [o for o in snapshot['transfos/type']
+             if not o['name'].endswith(INVERSE) or o['id'] in used or
+             o['name'][:-len(INVERSE)] not in names]
+
+    transfotrees = []
+    for o in snapshot['transfotree']:
+        ids = [inverses.get(id_, id_) for id_ in o['transfos']]
+        transfotrees.append(dict(o, transfos=list(dict.fromkeys(ids))))
+
+    return dict(snapshot, **{'transfo': transfos, 'transfos/type': types,
+                             'transfotree': transfotrees})
+
+
+def write(path, directory, index, selected, indent=None):
+    '''
+    Write the objects of the files of ``directory`` one at a time, to a temporary file
+    renamed once complete. The objects of the indexed collections are only written if
+    they are in ``selected``, with its values. Return the number of objects written by
+    collection.
+    '''
+    counts = {}
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write('{\n')
+        for i, typ in enumerate(COLLECTIONS):
+            f.write('{}: [\n'.format(json.dumps(typ)))
+            entries = None
+            if typ in selected:
+                entries = {o['id']: o for o in selected[typ]}
+            count = 0
+            with open(part_path(directory, typ)) as part:
+                for j, line in enumerate(part):
+                    line = line.rstrip('\n')
+                    if entries is not None:
+                        entry = entries.get(index[typ][j]['id'])
+                        if entry is None:
+                            continue
+                        if entry is not index[typ][j]:
+                            # changed by skip_inverses
+                            line = json.dumps(dict(json.loads(line), **entry),
+                                              sort_keys=True, default=str)
+                    if indent is not None:
+                        line = json.dumps(json.loads(line), indent=indent, sort_keys=True)
+                    if count:
+                        f.write(',\n')
+                    f.write(line)
+                    count += 1
+            counts[typ] = count
+            f.write('\n]{}\n'.format(',' if i < len(COLLECTIONS) - 1 else ''))
+        f.write('}\n')
+    os.replace(tmp_path, path)
+    return counts
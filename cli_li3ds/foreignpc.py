@@ -1,6 +1,45 @@
 from . import api
 
 
+# the fdwli3ds driver of the CSV pose series of import-orimatis --parameters-dir, it must
+# be installed in the database of the API
+CSV_DRIVER = 'fdwli3ds.Csv'
+
+DRIVER = 'foreignpc/driver'
+
+
+@api.handle_connection_errors
+def get_drivers(server, session):
+    '''
+    Return the names of the foreign data wrapper drivers of the database, or None if the
+    API does not list them.
+    '''
+    url = server.api_url + '/{}s/'.format(DRIVER)
+    status, drivers, _ = server.get(session, DRIVER, url)
+    if status != 200:
+        return None
+    return {driver if isinstance(driver, str) else driver.get('name') for driver in drivers}
+
+
+def check_driver(server, driver, log):
+    '''
+    Raise an error if the database of the API does not provide the driver, before creating
+    foreign tables that would only fail when queried. Log a warning if the API does not
+    list the drivers.
+    '''
+    if server.staging:
+        return
+    with server.session() as session:
+        drivers = get_drivers(server, session)
+    if drivers is None:
+        log.warning('The API does not list its foreign data wrapper drivers, the {} driver '
+                    'of fdwli3ds must be installed in its database'.format(driver))
+    elif driver not in drivers:
+        err = 'Error: the database of the API does not provide the {} driver of fdwli3ds ' \
+              '(drivers: {})'.format(driver, ', '.join(sorted(map(str, drivers))) or 'none')
+        raise RuntimeError(err)
+
+
 def create_foreignpc_table(foreignpc_table, foreignpc_server, driver):
     table = '{schema}.{table}'.format(**foreignpc_table)
     del foreignpc_table['schema']
@@ -15,6 +54,8 @@ def create_foreignpc_table(foreignpc_table, foreignpc_server, driver):
         options['sources'] = foreignpc_table['filepath']
     elif driver == 'fdwli3ds.EchoPulse':
         options['directory'] = foreignpc_table['filepath']
+    elif driver == CSV_DRIVER:
+        options['sources'] = foreignpc_table['filepath']
 
     del foreignpc_table['filepath']
 
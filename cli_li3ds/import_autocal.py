@@ -5,6 +5,7 @@ import logging
 from cliff.command import Command
 
 from . import api
+from . import phases
 from . import xmlutil
 from . import distortion
 
@@ -67,7 +68,7 @@ class ImportAutocal(Command):
         """
         Create or update a camera sensor.
         """
-        server = api.ApiServer(parsed_args, self.log)
+        server = api.api_server(parsed_args, self.log)
         objs = api.ApiObjs(server)
 
         filename_pattern = parsed_args.filename_pattern
@@ -93,7 +94,7 @@ class ImportAutocal(Command):
             },
         }
 
-        for filename in parsed_args.filename:
+        for filename in objs.inputs(parsed_args.filename):
             self.log.info('Importing {}'.format(filename))
             sensor_name = None
             if filename_pattern:
@@ -103,9 +104,11 @@ class ImportAutocal(Command):
                     continue
                 if 'sensor_name' in match.groupdict():
                     sensor_name = match.group('sensor_name')
-            self.handle_autocal(objs, args, filename, sensor_name)
+            with objs.input(filename), phases.phase(phases.GRAPH):
+                self.handle_autocal(objs, args, filename, sensor_name)
             objs.get_or_create()
             self.log.info('Success!\n')
+        server.finish()
 
     @staticmethod
     def handle_autocal(objs, args, filename, sensor_name, node=None):
@@ -6,6 +6,7 @@ import pytz
 from cliff.command import Command
 
 from . import api
+from . import phases
 from .foreignpc import create_foreignpc_table, create_foreignpc_view, create_datasource
 
 
@@ -53,7 +54,7 @@ class ImportEpt(Command):
         return parser
 
     def take_action(self, parsed_args):
-        server = api.ApiServer(parsed_args, self.log)
+        server = api.api_server(parsed_args, self.log)
         objs = api.ApiObjs(server)
 
         args = {
@@ -78,9 +79,11 @@ class ImportEpt(Command):
         fullpath = parsed_args.chdir / parsed_args.directory
         name, session_time, section_name = self.parse_path(parsed_args.directory)
         self.log.info('Importing {}'.format(parsed_args.directory.stem))
-        self.handle_ept(objs, args, fullpath, name, session_time, section_name)
+        with phases.phase(phases.GRAPH):
+            self.handle_ept(objs, args, fullpath, name, session_time, section_name)
 
         objs.get_or_create()
+        server.finish()
         self.log.info('Success!\n')
 
     @classmethod
@@ -144,17 +147,17 @@ class ImportEpt(Command):
         api.update_obj(args, metadata, transfo, 'transfo')
         api.update_obj(args, metadata, transfotree, 'transfotree')
 
-        foreignpc_server = api.ForeignpcServer(foreignpc_server)
+        foreignpc_server = objs.intern(api.ForeignpcServer(foreignpc_server))
         foreignpc_table = create_foreignpc_table(foreignpc_table, foreignpc_server, cls.driver)
         foreignpc_view = create_foreignpc_view(foreignpc_view, foreignpc_table)
         objs.add(foreignpc_view)
 
-        sensor = api.Sensor(sensor)
-        project = api.Project(project)
-        platform = api.Platform(platform)
-        session = api.Session(project, platform, session)
-        referential_spherical = api.Referential(sensor, referential_spherical)
-        referential_cartesian = api.Referential(sensor, referential_cartesian)
+        sensor = objs.intern(api.Sensor(sensor))
+        project = objs.intern(api.Project(project))
+        platform = objs.intern(api.Platform(platform))
+        session = objs.intern(api.Session(project, platform, session))
+        referential_spherical = objs.intern(api.Referential(sensor, referential_spherical))
+        referential_cartesian = objs.intern(api.Referential(sensor, referential_cartesian))
 
         datasource = create_datasource(datasource, session, referential_spherical, name,
                                        'pointcloud')
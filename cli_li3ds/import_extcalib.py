@@ -5,6 +5,8 @@ import json
 from cliff.command import Command
 
 from . import api
+from . import phases
+from . import rotation
 from . import xmlutil
 
 
@@ -63,7 +65,7 @@ class ImportExtCalib(Command):
         """
         Create or update sensor groups.
         """
-        server = api.ApiServer(parsed_args, self.log)
+        server = api.api_server(parsed_args, self.log)
         objs = api.ApiObjs(server)
 
         args = {
@@ -88,20 +90,23 @@ class ImportExtCalib(Command):
                     'owner': parsed_args.owner,
             },
         }
-        for filename in parsed_args.filename:
+        for filename in objs.inputs(parsed_args.filename):
             self.log.info('Importing {}'.format(filename))
-            try:
-                self.handle_json_file(objs, args, filename)
-            except json.decoder.JSONDecodeError:
-                self.handle_xml_file(objs, args, filename)
+            with objs.input(filename), phases.phase(phases.GRAPH):
+                try:
+                    self.handle_json_file(objs, args, filename)
+                except json.decoder.JSONDecodeError:
+                    self.handle_xml_file(objs, args, filename)
             objs.get_or_create()
             self.log.info('Success!\n')
+        server.finish()
 
     @staticmethod
     def handle_json_file(objs, args, filename):
         with open(filename) as f:
             # raise a json.decoder.JSONDecodeError if the file content is not JSON
-            cameras = json.load(f)
+            with phases.phase(phases.PARSING):
+                cameras = json.load(f)
 
         metadata = {
             'basename': os.path.basename(filename),
@@ -121,9 +126,12 @@ class ImportExtCalib(Command):
         del referential_base['prefix']
         referential_base = api.Referential(sensor_group, referential_base)
 
+        matrices = [matrix_json(camera) for camera in cameras]
+        inverses = invert_matrices(matrices)
+
         transfos1 = []
         transfos2 = []
-        for camera in cameras:
+        for camera, matrix, inverse in zip(cameras, matrices, inverses):
             metadata['IdGrp'] = camera['id']
 
             sensor = {'name': '{IdGrp}', 'type': 'camera'}
@@ -142,8 +150,8 @@ class ImportExtCalib(Command):
 
             sensor = sensor_camera(sensor, camera['size'])
             referential_cam = referential_camera(sensor, referential)
-            basetocam = transfo_grp_json(referential_base, referential_cam, transfo, camera, False)
-            camtobase = transfo_grp_json(referential_base, referential_cam, transfo, camera, True)
+            basetocam = transfo_grp(referential_base, referential_cam, transfo, matrix, False)
+            camtobase = transfo_grp(referential_base, referential_cam, transfo, inverse, True)
 
             referential_img = referential_image(sensor, referential)
             camtoimg = transfo_proj_json(referential_cam, referential_img, transfo, camera)
@@ -181,9 +189,12 @@ class ImportExtCalib(Command):
         del referential_base['prefix']
         referential_base = api.Referential(sensor_group, referential_base)
 
+        matrices = [matrix_xml(node) for node in nodes]
+        inverses = invert_matrices(matrices)
+
         transfos1 = []
         transfos2 = []
-        for node in nodes:
+        for node, matrix, inverse in zip(nodes, matrices, inverses):
             metadata['IdGrp'] = xmlutil.findtext(node, 'IdGrp')
 
             sensor = {'name': '{IdGrp}', 'type': 'camera'}
@@ -203,8 +214,8 @@ class ImportExtCalib(Command):
             sensor = sensor_camera(sensor)
 
             referential = referential_camera(sensor, referential)
-            transfo1 = transfo_grp_xml(referential_base, referential, transfo, node, False)
-            transfo2 = transfo_grp_xml(referential_base, referential, transfo, node, True)
+            transfo1 = transfo_grp(referential_base, referential, transfo, matrix, False)
+            transfo2 = transfo_grp(referential_base, referential, transfo, inverse, True)
 
             transfos1.append(transfo1)
             transfos2.append(transfo2)
@@ -239,17 +250,17 @@ def referential_image(sensor, referential):
     return api.Referential(sensor, referential, name=name, description=description)
 
 
+def invert_matrices(matrices):
+    # invert all the rig matrices at once: transpose the rotation parts and
+    # multiply the translation parts by -transposed rotations
+    if not matrices:
+        return []
+    inverses = rotation.invert_affine(rotation.mat4x3(matrices))
+    return inverses.reshape(len(matrices), 12).tolist()
+
+
 def transfo_grp(source, target, transfo, matrix, inverse):
     if inverse:
-        # transpose the rotation part
-        matrix[1], matrix[4] = matrix[4], matrix[1]
-        matrix[2], matrix[8] = matrix[8], matrix[2]
-        matrix[6], matrix[9] = matrix[9], matrix[6]
-        # multiply the translation part by -transposed rotation
-        x, y, z = -matrix[3], -matrix[7], -matrix[11]
-        matrix[3] = x * matrix[0] + y * matrix[1] + z * matrix[2]
-        matrix[7] = x * matrix[4] + y * matrix[5] + z * matrix[6]
-        matrix[11] = x * matrix[8] + y * matrix[9] + z * matrix[10]
         source, target = target, source
     return api.Transfo(
         source, target, transfo,
@@ -259,14 +270,14 @@ def transfo_grp(source, target, transfo, matrix, inverse):
     )
 
 
-def transfo_grp_json(source, target, transfo, node, inverse):
+def matrix_json(node):
     matrix = []
     p = node['position']
     r = node['rotation']
     for i in range(0, 3):
         matrix.extend(r[i*3:(i+1)*3])
         matrix.append(p[i])
-    return transfo_grp(source, target, transfo, matrix, inverse)
+    return matrix
 
 
 def transfo_proj_json(source, target, transfo, node):
@@ -286,10 +297,10 @@ def transfo_proj_json(source, target, transfo, node):
     )
 
 
-def transfo_grp_xml(source, target, transfo, node, inverse):
+def matrix_xml(node):
     matrix = []
     p = xmlutil.child_floats_split(node, 'Vecteur')
     for i, l in enumerate(('Rot/L1', 'Rot/L2', 'Rot/L3')):
         matrix.extend(xmlutil.child_floats_split(node, l))
         matrix.append(p[i])
-    return transfo_grp(source, target, transfo, matrix, inverse)
+    return matrix
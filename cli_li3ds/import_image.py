@@ -8,6 +8,33 @@ import re
 from cliff.command import Command
 
 from . import api
+from . import phases
+
+
+# the update_obj templates of the objects of an image
+TEMPLATES = {
+    'sensor': {
+        'type': 'camera',
+        'name': '{camera_num}',
+        'description': 'Created while importing {basename}',
+    },
+    'referential': {
+        'name': '{camera_num}',
+    },
+    'platform': {
+        'name': 'Stereopolis II',
+    },
+    'project': {
+        'name': '{project_name}',
+    },
+    'session': {
+        'name': '{session_time:%y%m%d%H%M}/{section_name}',
+    },
+    'datasource': {
+        'capture_start': '{image_time_iso}',
+        'capture_end': '{image_time_iso}',
+    },
+}
 
 
 class ImportImage(Command):
@@ -54,7 +81,7 @@ class ImportImage(Command):
         return parser
 
     def take_action(self, parsed_args):
-        server = api.ApiServer(parsed_args, self.log)
+        server = api.api_server(parsed_args, self.log)
         objs = api.ApiObjs(server)
 
         if parsed_args.base_uri:
@@ -76,21 +103,29 @@ class ImportImage(Command):
             },
         }
 
+        # the templates are the same for every image, they are compiled once
+        templates = {type_: api.compile_template(args, obj, type_)
+                     for type_, obj in TEMPLATES.items()}
+
         for filename in parsed_args.filename:
-            for image_path in image_dir.rglob(filename):
+            image_paths = phases.iterate(phases.DISCOVERY, image_dir.rglob(filename))
+            for image_path in objs.inputs(image_paths):
                 if parsed_args.filename_pattern:
                     match = re.match(parsed_args.filename_pattern, image_path.name)
                     if not match:
                         continue
                 self.log.info('Importing {}'.format(image_path.relative_to(image_dir)))
-                self.handle_image(objs, args, image_dir, image_path, base_uri,
-                                  parsed_args.image_size, parsed_args.json_dir)
+                with objs.input(image_path), phases.phase(phases.GRAPH):
+                    self.handle_image(objs, templates, image_dir, image_path, base_uri,
+                                      parsed_args.image_size, parsed_args.json_dir)
 
         objs.get_or_create()
+        server.finish()
         self.log.info('Success!\n')
 
     @classmethod
-    def handle_image(cls, objs, args, image_dir, image_path, base_uri, image_size, json_dir):
+    def handle_image(cls, objs, templates, image_dir, image_path, base_uri, image_size,
+                     json_dir):
 
         project_name, session_time, section_name, image_num, camera_num = \
             parse_image_path(image_path)
@@ -107,39 +142,18 @@ class ImportImage(Command):
             'image_time_iso': api.isoformat(image_time),
         }
 
-        sensor = {
-            'type': 'camera',
-            'name': '{camera_num}',
-            'description': 'Created while importing {basename}',
-        }
-        referential = {
-            'name': '{camera_num}',
-        }
-        platform = {
-            'name': 'Stereopolis II',
-        }
-        project = {
-            'name': '{project_name}',
-        }
-        session = {
-            'name': '{session_time:%y%m%d%H%M}/{section_name}',
-        }
-        datasource = {
-            'capture_start': '{image_time_iso}',
-            'capture_end': '{image_time_iso}',
-        }
-        api.update_obj(args, metadata, sensor, 'sensor')
-        api.update_obj(args, metadata, referential, 'referential')
-        api.update_obj(args, metadata, platform, 'platform')
-        api.update_obj(args, metadata, project, 'project')
-        api.update_obj(args, metadata, session, 'session')
-        api.update_obj(args, metadata, datasource, 'datasource')
-
-        sensor = sensor_camera(sensor, image_size)
-        project = api.Project(project)
-        platform = api.Platform(platform)
-        session = api.Session(project, platform, session)
-        referential = referential_image(referential, sensor)
+        sensor = templates['sensor'].apply(metadata)
+        referential = templates['referential'].apply(metadata)
+        platform = templates['platform'].apply(metadata)
+        project = templates['project'].apply(metadata)
+        session = templates['session'].apply(metadata)
+        datasource = templates['datasource'].apply(metadata)
+
+        sensor = objs.intern(sensor_camera(sensor, image_size))
+        project = objs.intern(api.Project(project))
+        platform = objs.intern(api.Platform(platform))
+        session = objs.intern(api.Session(project, platform, session))
+        referential = objs.intern(referential_image(referential, sensor))
         datasource = datasource_image(
                 datasource, session, referential,
                 image_dir, image_path, base_uri, image_size)
@@ -159,7 +173,7 @@ class ImportImage(Command):
             raise RuntimeError(err)
         cls.image_date_cache.clear()
         cls.log.debug('Reading {}'.format(str(json_file)))
-        with json_file.open() as f:
+        with json_file.open() as f, phases.phase(phases.PARSING):
             image_objs = json.load(f)
         for image_obj in image_objs:
             # image_obj['date'] is the number of seconds since January 5, 1980 (GPS time
@@ -1,10 +1,33 @@
 import logging
-import json
 import pathlib
+import concurrent.futures
 
 from cliff.command import Command
 
 from . import api
+from . import phases
+from . import jsonstream
+
+
+# the sections of a bundle in dependency order, with the sections their objects refer to
+SECTIONS = (
+    (api.Sensor, ()),
+    (api.Referential, ('sensor',)),
+    (api.TransfoType, ()),
+    (api.Transfo, ('referential', 'transfos/type')),
+    (api.Transfotree, ('transfo',)),
+    (api.Platform, ()),
+    (api.Config, ('platform', 'transfotree')),
+    (api.Project, ()),
+    (api.Session, ('project', 'platform')),
+    (api.Datasource, ('session', 'referential')),
+)
+
+# index of the sections, by type
+SECTION_INDEX = {class_.type_: i for i, (class_, _) in enumerate(SECTIONS)}
+
+# bundles are read in chunks of this many bytes
+CHUNK_SIZE = 1 << 16
 
 
 class ImportJson(Command):
@@ -23,6 +46,10 @@ class ImportJson(Command):
         parser.add_argument(
             '--json-dir', '-f', default='.',
             help='base directory to search for json files (optional, default is ".")')
+        parser.add_argument(
+            '--jobs', '-j', type=int, default=4,
+            help='number of processes decoding bundles concurrently (optional, '
+                 'default is 4)')
         parser.add_argument(
             '--uri', default='{uri}',
             help='uri pattern for datasources (optional, default is pass through "{uri}")')
@@ -32,35 +59,111 @@ class ImportJson(Command):
         return parser
 
     def take_action(self, parsed_args):
-        server = api.ApiServer(parsed_args, self.log)
+        """
+        Decode the bundles concurrently in worker processes, and merge their objects into
+        one graph where the objects defined by several bundles are only defined once.
+        """
+        server = api.api_server(parsed_args, self.log)
         json_dir = pathlib.Path(parsed_args.json_dir)
         uri = parsed_args.uri
 
         objs = api.ApiObjs(server)
 
+        json_paths = []
         for filename in parsed_args.filename:
-            for json_path in json_dir.rglob(filename):
+            json_paths.extend(objs.inputs(
+                phases.iterate(phases.DISCOVERY, json_dir.rglob(filename))))
+
+        # the merged objects, and the bundle defining them, by primary key
+        registry = {}
+        with concurrent.futures.ProcessPoolExecutor(parsed_args.jobs) as executor:
+            bundles = [executor.submit(read_sections, json_path) for json_path in json_paths]
+            for json_path, sections in zip(json_paths, bundles):
                 self.log.info('Importing {}'.format(json_path.relative_to(json_dir)))
-                sensors = self.handle_json(objs, json_path, uri, api.Sensor)
-                referentials = self.handle_json(objs, json_path, uri, api.Referential, sensors)
-                ttypes = self.handle_json(objs, json_path, uri, api.TransfoType, referentials)
-                transfos = self.handle_json(objs, json_path, uri, api.Transfo, referentials, ttypes)
-                transfotrees = self.handle_json(objs, json_path, uri, api.Transfotree, transfos)
-                platforms = self.handle_json(objs, json_path, uri, api.Platform)
-                self.handle_json(objs, json_path, uri, api.Config, platforms, transfotrees)
-                projects = self.handle_json(objs, json_path, uri, api.Project)
-                sessions = self.handle_json(objs, json_path, uri, api.Session, projects, platforms)
-                self.handle_json(objs, json_path, uri, api.Datasource, sessions, referentials)
+                with objs.input(json_path):
+                    with phases.phase(phases.PARSING):
+                        sections = sections.result()
+                    bundle = api.ApiObjs(server)
+                    self.handle_bundle(bundle, sections, uri)
+                    self.merge_bundle(objs, registry, bundle.objs, json_path)
 
         objs.get_or_create()
+        server.finish()
         self.log.info('Success!\n')
 
+    def merge_bundle(self, objs, registry, bundle, json_path):
+        '''
+        Add the objects of the bundle that are not in the registry yet, and make the others
+        refer to the registered ones. Registered objects with other values are reported,
+        and the first definition is kept.
+        '''
+        # registered objects, by id of the objects of the bundle equal to them
+        merged = {}
+
+        def registered(obj):
+            return merged.get(id(obj), obj)
+
+        # the objects of a bundle are added after the ones they refer to
+        for obj in bundle:
+            obj.objs = {key: registered(dep) for key, dep in obj.objs.items()}
+            obj.arrays = {key: [registered(o) for o in array]
+                          for key, array in obj.arrays.items()}
+            obj.parent = registered(obj.parent)
+            primary_key = obj.primary_key()
+            if primary_key not in registry:
+                registry[primary_key] = obj, json_path
+                objs.add(obj)
+                continue
+            other, other_path = registry[primary_key]
+            merged[id(obj)] = other
+            conflicts = sorted(key for key in set(obj.obj).union(other.obj)
+                               if obj.obj.get(key) != other.obj.get(key))
+            if conflicts:
+                self.log.warning('Conflicting {} [{}] in {}, keeping the one of {} ({})'.format(
+                    obj.type_, ', '.join(str(obj.obj[k]) for k in obj.key if k in obj.obj),
+                    json_path, other_path, ', '.join(conflicts)))
+
+    @classmethod
+    def handle_bundle(cls, objs, sections, uri):
+        '''
+        Map the sections of a bundle, ``(name, items)`` pairs, and map the objects of each
+        one once the sections it refers to are mapped. The objects of a section in
+        dependency order are mapped as they are decoded, the sections out of order are kept
+        until then.
+        '''
+        obj_maps = {}
+        pending = {}
+        for name, items in sections:
+            if name not in SECTION_INDEX:
+                continue
+            if all(class_.type_ in obj_maps for class_, _ in SECTIONS[:SECTION_INDEX[name]]):
+                pending[name] = items
+            else:
+                with phases.phase(phases.PARSING):
+                    pending[name] = list(items)
+            cls.map_sections(objs, obj_maps, pending, uri)
+        cls.map_sections(objs, obj_maps, pending, uri, final=True)
+
+    @classmethod
+    def map_sections(cls, objs, obj_maps, pending, uri, final=False):
+        '''
+        Map the pending sections in dependency order, up to the first one not read yet,
+        or missing from the bundle if ``final``.
+        '''
+        for class_, deps in SECTIONS:
+            if class_.type_ in obj_maps:
+                continue
+            if class_.type_ not in pending and not final:
+                return
+            content = pending.pop(class_.type_, [])
+            with phases.phase(phases.GRAPH):
+                obj_maps[class_.type_] = cls.handle_json(
+                    objs, content, uri, class_, *[obj_maps[dep] for dep in deps])
+
     @classmethod
-    def handle_json(cls, objs, json_path, uri, class_, deps1=None, deps2=None):
-        with json_path.open(encoding="iso-8859-1") as f:
-            content = json.load(f)
+    def handle_json(cls, objs, content, uri, class_, deps1=None, deps2=None):
         obj_map = {}
-        for elem in content[class_.type_]:
+        for elem in content:
             if elem:  # skip empty objects
                 obj_id = elem.pop('id', None)
                 if class_.type_ == "referential":
@@ -100,3 +203,23 @@ class ImportJson(Command):
                 obj_map[obj_id] = obj
                 objs.add(obj)
         return obj_map
+
+
+def iter_sections(json_path):
+    '''
+    Yield the sections of a bundle one at a time, as they are read: their names, and
+    iterators of their objects decoded as they are read.
+    '''
+    with json_path.open('rb') as f:
+        chunks = iter(lambda: f.read(CHUNK_SIZE), b'')
+        yield from jsonstream.iter_object(chunks, 'iso-8859-1')
+
+
+def read_sections(json_path):
+    '''
+    Decode the sections of a bundle, in a worker process: JSON decoding holds the GIL, so
+    the bundles are only decoded in parallel by processes. The objects are then mapped
+    by the importing process.
+    '''
+    return [(name, list(items)) for name, items in iter_sections(json_path)
+            if name in SECTION_INDEX]
@@ -4,6 +4,7 @@ import logging
 from cliff.command import Command
 
 from . import api
+from . import phases
 from . import xmlutil
 from .import_autocal import ImportAutocal
 
@@ -59,7 +60,7 @@ class ImportOri(Command):
         """
         Create or update a sensor group.
         """
-        server = api.ApiServer(parsed_args, self.log)
+        server = api.api_server(parsed_args, self.log)
         objs = api.ApiObjs(server)
 
         args = {
@@ -82,11 +83,13 @@ class ImportOri(Command):
                 'owner': parsed_args.owner,
             },
         }
-        for filename in parsed_args.filename:
+        for filename in objs.inputs(parsed_args.filename):
             self.log.info('Importing {}'.format(filename))
-            self.handle_ori(objs, args, filename)
+            with objs.input(filename), phases.phase(phases.GRAPH):
+                self.handle_ori(objs, args, filename)
             objs.get_or_create()
             self.log.info('Success!\n')
+        server.finish()
 
     @staticmethod
     def handle_ori(objs, args, filename):
@@ -0,0 +1,324 @@
+import re
+import math
+import mmap
+import logging
+import pathlib
+import datetime
+import dateutil.parser
+import pytz
+
+import numpy as np
+
+from cliff.command import Command
+
+from . import api
+from . import phases
+from . import poses
+from . import rotation
+
+
+ANGLE_UNITS = {
+    'degree': math.pi / 180,
+    'grade': math.pi / 200,
+    'radian': 1.,
+}
+
+
+class ImportOriExport(Command):
+    """ import Micmac ori-export pose files
+
+        Each line of an ori-export file holds an image name, its omega, phi and kappa
+        angles and its position. Each file creates one transfo parameter series from the
+        camera referential to the world referential, and one image datasource per line.
+        The datasources are published as the file is parsed, by chunks of --chunk-size.
+    """
+
+    log = logging.getLogger(__name__)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    def get_parser(self, prog_name):
+        self.log.debug(prog_name)
+        parser = super().get_parser(prog_name)
+        api.add_arguments(parser)
+        parser.add_argument(
+            '--project', '-c',
+            help='project name (required)', required=True)
+        parser.add_argument(
+            '--chdir', '-f',
+            type=pathlib.Path, default='.',
+            help='base directory to search for ori-export files (optional, default is ".")')
+        parser.add_argument(
+            '--filename-pattern', '-p',
+            default=r'(?P<session>.+)_ori-export_(?P<sensor>.+)\.txt',
+            help='file name pattern, with "session" and "sensor" named groups '
+                 '(optional, default is "{session}_ori-export_{sensor}.txt")')
+        parser.add_argument(
+            '--transfotree',
+            help='the transfotree name (optional)')
+        parser.add_argument(
+            '--srid', '-r',
+            type=int, default=0,
+            help='SRID of the world referential (optional, default is 0)')
+        parser.add_argument(
+            '--angle-unit',
+            choices=sorted(ANGLE_UNITS), default='degree',
+            help='unit of the omega, phi and kappa angles (optional, default is "degree")')
+        parser.add_argument(
+            '--timestamps',
+            type=pathlib.Path,
+            help='text file with an image name and a POSIX time per line')
+        parser.add_argument(
+            '--start-time',
+            help='time of the first pose of each file, used if no --timestamps file is '
+                 'provided')
+        parser.add_argument(
+            '--time-step',
+            type=float, default=1.,
+            help='seconds between consecutive poses, used with --start-time '
+                 '(optional, default is 1)')
+        parser.add_argument(
+            '--base-uri', '-b',
+            help='base directory in image URIs (optional, default is None)')
+        parser.add_argument(
+            '--chunk-size',
+            type=int, default=1 << 24,
+            help='number of bytes parsed at once (optional, default is 16 MiB)')
+        parser.add_argument(
+            '--simplify-poses',
+            type=float, metavar='TOL',
+            help='drop the poses that can be interpolated from their neighbours '
+                 'within TOL position units (optional, default is to keep all poses)')
+        parser.add_argument(
+            '--simplify-angle',
+            type=float, default=0.01, metavar='DEG',
+            help='rotation tolerance in degrees used with --simplify-poses '
+                 '(optional, default is 0.01)')
+        parser.add_argument(
+            '--append', action='store_true',
+            help='append the new poses to existing transfos and extend their validity '
+                 'instead of failing on a parameters mismatch (optional)')
+        parser.add_argument(
+            'filename', nargs='+',
+            help='ori-export file names, may be Unix-style patterns (e.g. *_ori-export_*.txt)')
+        return parser
+
+    def take_action(self, parsed_args):
+        server = api.api_server(parsed_args, self.log)
+        objs = api.ApiObjs(server)
+
+        if not parsed_args.timestamps and not parsed_args.start_time:
+            err = 'Error: either --timestamps or --start-time should be provided'
+            raise RuntimeError(err)
+
+        args = {
+            'project': {
+                'name': parsed_args.project,
+            },
+            'referential_world': {
+                'srid': parsed_args.srid,
+            },
+            'transfotree': {
+                'name': parsed_args.transfotree,
+                'owner': parsed_args.owner,
+            },
+        }
+
+        times = None
+        if parsed_args.timestamps:
+            times = read_timestamps(parsed_args.timestamps)
+
+        start_time = None
+        if parsed_args.start_time:
+            start_time = dateutil.parser.parse(parsed_args.start_time)
+            if not start_time.tzinfo:
+                start_time = pytz.UTC.localize(start_time)
+
+        base_uri = pathlib.Path(parsed_args.base_uri) if parsed_args.base_uri else None
+        angle_unit = ANGLE_UNITS[parsed_args.angle_unit]
+
+        for filename in parsed_args.filename:
+            data_paths = phases.iterate(phases.DISCOVERY, parsed_args.chdir.rglob(filename))
+            for data_path in objs.inputs(data_paths):
+                match = re.match(parsed_args.filename_pattern, data_path.name)
+                if not match:
+                    continue
+                self.log.info('Importing {}'.format(data_path.relative_to(parsed_args.chdir)))
+                with objs.input(data_path):
+                    with phases.phase(phases.GRAPH):
+                        transfo = self.handle_ori_export(
+                            objs, args, data_path, match.groupdict(), times, start_time,
+                            parsed_args.time_step, angle_unit, base_uri,
+                            parsed_args.chunk_size)
+                    if parsed_args.simplify_poses is not None:
+                        poses.simplify_transfos([transfo], parsed_args.simplify_poses,
+                                                parsed_args.simplify_angle, self.log)
+                    transfo.append = parsed_args.append
+
+        objs.get_or_create()
+        server.finish()
+        self.log.info('Success!\n')
+
+    @classmethod
+    def handle_ori_export(cls, objs, args, data_path, groups, times, start_time, time_step,
+                          angle_unit, base_uri, chunk_size):
+
+        metadata = {
+            'basename': data_path.name,
+            'session': groups.get('session'),
+            'sensor': groups.get('sensor'),
+        }
+
+        sensor = {
+            'type': 'camera',
+            'name': '{sensor}',
+        }
+        referential_camera = {
+            'name': '{sensor}',
+        }
+        referential_image = {
+            'name': '{sensor} image',
+        }
+        referential_world = {
+            'name': 'world',
+        }
+        platform = {
+            'name': 'Stereopolis II',
+        }
+        project = {}
+        session = {
+            'name': '{session}',
+        }
+        transfo = {
+            'name': '{sensor}#ori-export',
+        }
+        transfotree = {}
+
+        api.update_obj(args, metadata, sensor, 'sensor')
+        api.update_obj(args, metadata, referential_camera, 'referential_camera')
+        api.update_obj(args, metadata, referential_image, 'referential_image')
+        api.update_obj(args, metadata, referential_world, 'referential_world')
+        api.update_obj(args, metadata, platform, 'platform')
+        api.update_obj(args, metadata, project, 'project')
+        api.update_obj(args, metadata, session, 'session')
+        api.update_obj(args, metadata, transfo, 'transfo')
+        api.update_obj(args, metadata, transfotree, 'transfotree')
+
+        sensor = objs.intern(api.Sensor(sensor))
+        project = objs.intern(api.Project(project))
+        platform = objs.intern(api.Platform(platform))
+        session = objs.intern(api.Session(project, platform, session))
+        referential_camera = objs.intern(api.Referential(sensor, referential_camera))
+        referential_image = objs.intern(api.Referential(sensor, referential_image))
+        referential_world = objs.intern(api.Referential(sensor, referential_world))
+
+        parameters = []
+        for names, values in phases.iterate(phases.PARSING,
+                                            read_chunks(data_path, chunk_size)):
+            chunk_times = pose_times(names, times, start_time, time_step, len(parameters))
+            matrices = rotation.matrix_from_opk(*(values[:, :3] * angle_unit).T)
+            quats = rotation.quat_from_matrix(matrices).tolist()
+            vec3s = values[:, 3:].tolist()
+            datasources = api.ApiObjs(objs.api)
+            for name, time, quat, vec3 in zip(names, chunk_times, quats, vec3s):
+                parameters.append({'quat': quat, 'vec3': vec3, '_time': time})
+                datasources.add(
+                    datasource_image(session, referential_image, name, time, base_uri))
+            if objs.api.plan_path:
+                objs.add(*datasources.objs)
+            else:
+                # the datasources are published by chunk, instead of being all kept
+                # until the end of the import
+                datasources.get_or_create()
+
+        if not parameters:
+            err = 'Error: no pose found in {}'.format(data_path)
+            raise RuntimeError(err)
+
+        transfo = api.Transfo(
+            referential_camera, referential_world, transfo,
+            type_name='affine_quat',
+            func_signature=['quat', 'vec3', '_time'],
+            parameters=parameters,
+        )
+        transfotree = api.Transfotree([transfo], transfotree)
+        objs.add(transfotree)
+        return transfo
+
+
+def read_chunks(path, chunk_size):
+    """
+    Read an ori-export file by chunks of about ``chunk_size`` bytes through a memory map,
+    skipping empty and comment lines. Yield the image names of each chunk and its
+    ``(n, 6)`` array of omega, phi, kappa, x, y, z values.
+    """
+    with path.open('rb') as f:
+        if path.stat().st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = 0
+            line_number = 1
+            while start < len(data):
+                end = data.find(b'\n', min(start + chunk_size, len(data)) - 1)
+                end = len(data) if end == -1 else end + 1
+                lines = data[start:end].splitlines()
+                names, values = parse_lines(lines, path, line_number)
+                if len(names):
+                    yield names, values
+                line_number += len(lines)
+                start = end
+
+
+def parse_lines(lines, path, line_number):
+    # the lines with their numbers in the file, the chunk starting at line_number
+    numbered = [(i, line) for i, line in enumerate(lines, line_number)
+                if line.strip() and not line.lstrip().startswith(b'#')]
+    lines = [line for _, line in numbered]
+    tokens = np.array(b' '.join(lines).split())
+    if len(tokens) != 7 * len(lines):
+        bad, line = next((i, line) for i, line in numbered if len(line.split()) != 7)
+        err = 'Error: expected 7 fields in "{}" near line {:d}: "{}"'.format(
+            path, bad, line.decode(errors='replace'))
+        raise RuntimeError(err)
+    tokens = tokens.reshape(-1, 7)
+    try:
+        values = tokens[:, 1:].astype(float)
+    except ValueError:
+        bad = numbered[0][0] if numbered else line_number
+        err = 'Error: "{}" includes non-parseable numbers near line {:d}'.format(path, bad)
+        raise RuntimeError(err)
+    return [name.decode() for name in tokens[:, 0]], values
+
+
+def read_timestamps(path):
+    with path.open('rb') as f:
+        tokens = np.array(f.read().split())
+    if len(tokens) % 2:
+        err = 'Error: expected an image name and a time per line in "{}"'.format(path)
+        raise RuntimeError(err)
+    tokens = tokens.reshape(-1, 2)
+    names = [name.decode() for name in tokens[:, 0]]
+    return dict(zip(names, tokens[:, 1].astype(float).tolist()))
+
+
+def pose_times(names, times, start_time, time_step, offset):
+    if times is None:
+        return [start_time + datetime.timedelta(seconds=(offset + i) * time_step)
+                for i in range(len(names))]
+    try:
+        return [datetime.datetime.fromtimestamp(times[name], pytz.UTC) for name in names]
+    except KeyError as e:
+        err = 'Error: no timestamp for image "{}"'.format(e.args[0])
+        raise RuntimeError(err)
+
+
+def datasource_image(session, referential, name, time, base_uri):
+    image_path = pathlib.Path(name)
+    if base_uri:
+        image_path = base_uri / image_path
+    time = api.isoformat(time)
+    return api.Datasource(
+        session, referential,
+        type='image', uri='file:{}'.format(image_path),
+        capture_start=time, capture_end=time)
@@ -1,13 +1,20 @@
 import os
+import re
 import logging
 import datetime
 import pytz
 import pathlib
 
+import numpy as np
+
 from cliff.command import Command
 
 from . import api
+from . import phases
+from . import poses
+from . import rotation
 from . import xmlutil
+from .foreignpc import CSV_DRIVER, check_driver, create_foreignpc_table, create_foreignpc_view
 
 
 class ImportOrimatis(Command):
@@ -65,6 +72,46 @@ class ImportOrimatis(Command):
             '--image-file-ext', '-e',
             help='file extension to use in image URIs (optional, '
                  'default is none, e.g. ".tif")')
+        parser.add_argument(
+            '--quaternion', '-q', action='store_true',
+            help='convert mat3d rotations to affine_quat transfos (optional, '
+                 'default is to keep affine_mat4x3 transfos)')
+        parser.add_argument(
+            '--quaternion-tolerance',
+            type=float, default=1e-4,
+            help='largest orthonormality error allowed when converting mat3d rotations '
+                 'to quaternions (optional, default is 1e-4)')
+        parser.add_argument(
+            '--simplify-poses',
+            type=float, metavar='TOL',
+            help='drop the extrinsic poses that can be interpolated from their neighbours '
+                 'within TOL position units (optional, default is to keep all poses)')
+        parser.add_argument(
+            '--simplify-angle',
+            type=float, default=0.01, metavar='DEG',
+            help='rotation tolerance in degrees used with --simplify-poses '
+                 '(optional, default is 0.01)')
+        parser.add_argument(
+            '--append', action='store_true',
+            help='append the new poses to existing extrinsic transfos and extend their '
+                 'validity instead of failing on a parameters mismatch (optional)')
+        parser.add_argument(
+            '--parameters-dir',
+            type=pathlib.Path,
+            help='write the extrinsic pose series to CSV files in this directory and '
+                 'reference them from the transfos with foreign tables of the fdwli3ds.Csv '
+                 'driver, which the database must provide, instead of inlining them '
+                 '(optional, default is to inline them)')
+        parser.add_argument(
+            '--database-schema',
+            default='li3ds',
+            help='name of database schema into which foreign tables are created '
+                 '(optional, default is "li3ds")')
+        parser.add_argument(
+            '--server-name',
+            default='poses',
+            help='name of the foreign server to create for the pose series '
+                 '(optional, default is "poses")')
         parser.add_argument(
             'filenames', nargs='+',
             help='the orimatis file names, may be Unix style patterns '
@@ -75,7 +122,7 @@ class ImportOrimatis(Command):
         """
         Create or update a camera sensor.
         """
-        server = api.ApiServer(parsed_args, self.log)
+        server = api.api_server(parsed_args, self.log)
         objs = api.ApiObjs(server)
 
         args = {
@@ -114,15 +161,42 @@ class ImportOrimatis(Command):
         else:
             orimatis_dir_path = pathlib.Path('.')
 
+        extrinsics = {}
         for filename in parsed_args.filenames:
-            for orimatis_abs_path in orimatis_dir_path.rglob(filename):
+            orimatis_paths = phases.iterate(phases.DISCOVERY, orimatis_dir_path.rglob(filename))
+            for orimatis_abs_path in objs.inputs(orimatis_paths):
                 orimatis_rel_path = orimatis_abs_path.relative_to(orimatis_dir_path)
                 self.log.info('Importing {}'.format(orimatis_abs_path))
-                self.handle_orimatis(
-                    objs, args, orimatis_abs_path, orimatis_rel_path, base_image_path,
-                    parsed_args.image_file_ext)
+                with objs.input(orimatis_abs_path):
+                    with phases.phase(phases.GRAPH):
+                        extrinsic = self.handle_orimatis(
+                            objs, args, orimatis_abs_path, orimatis_rel_path, base_image_path,
+                            parsed_args.image_file_ext)
+                    if extrinsic:
+                        extrinsics[id(extrinsic)] = extrinsic
+
+        if parsed_args.quaternion:
+            extrinsics = {id(extrinsic): extrinsic for extrinsic in matr_to_quat(
+                objs, extrinsics.values(), parsed_args.quaternion_tolerance, self.log)}
+
+        if parsed_args.simplify_poses is not None:
+            poses.simplify_transfos(extrinsics.values(), parsed_args.simplify_poses,
+                                    parsed_args.simplify_angle, self.log)
+
+        if parsed_args.append:
+            for extrinsic in extrinsics.values():
+                extrinsic.append = True
+
+        if parsed_args.parameters_dir:
+            check_driver(server, CSV_DRIVER, self.log)
+            views = api.ApiObjs(server)
+            views.add(*store_parameters(
+                extrinsics.values(), parsed_args.parameters_dir,
+                parsed_args.database_schema, parsed_args.server_name, self.log))
+            views.get_or_create()
 
         objs.get_or_create()
+        server.finish()
         self.log.info('Success!\n')
 
     @staticmethod
@@ -204,12 +278,12 @@ class ImportOrimatis(Command):
         api.update_obj(args, metadata, config, 'config')
 
         # get or create sensor
-        sensor = sensor_camera(sensor, node, metadata)
+        sensor = objs.intern(sensor_camera(sensor, node, metadata))
 
         # get or create world, euclidean and rawImage referentials
-        ref_w = referential_world(sensor, referential, metadata)
-        ref_e = referential_eucli(sensor, referential)
-        ref_i = referential_image(sensor, referential)
+        ref_w = objs.intern(referential_world(sensor, referential, metadata))
+        ref_e = objs.intern(referential_eucli(sensor, referential))
+        ref_i = objs.intern(referential_image(sensor, referential))
 
         # get or create matr transform
         matr = transfo_matr(ref_w, ref_e, transfo_ext, acquisition, root)
@@ -218,7 +292,7 @@ class ImportOrimatis(Command):
             if o:
                 # we already have that matr transform so just update its
                 # parameters list
-                o.obj['parameters'].append(matr.obj['parameters'][0])
+                objs.extend(o, 'parameters', matr.obj['parameters'])
                 matr = o
 
         # get or create quat transform
@@ -228,12 +302,12 @@ class ImportOrimatis(Command):
             if o:
                 # we already have that quat transform so just update its
                 # parameters list
-                o.obj['parameters'].append(quat.obj['parameters'][0])
+                objs.extend(o, 'parameters', quat.obj['parameters'])
                 quat = o
 
         # get or create pinh, dist or sphe transforms
         if sensor_node:
-            ref_u = referential_undis(sensor, referential)
+            ref_u = objs.intern(referential_undis(sensor, referential))
             pinh = transfo_pinh(ref_e, ref_u, transfo_int, root)
             dist = transfo_dist(ref_u, ref_i, transfo_int, root)
             transfos = [quat or matr, pinh, dist]
@@ -242,9 +316,9 @@ class ImportOrimatis(Command):
             transfos = [quat or matr, sphe]
 
         transfotree = api.Transfotree(transfos, transfotree)
-        project = api.Project(project)
-        platform = api.Platform(platform)
-        session = api.Session(project, platform, session)
+        project = objs.intern(api.Project(project))
+        platform = objs.intern(api.Platform(platform))
+        session = objs.intern(api.Session(project, platform, session))
         datasource = datasource_image(
             session, ref_i, datasource, metadata,
             base_image_path, orimatis_rel_path.parent, image_file_ext)
@@ -252,6 +326,8 @@ class ImportOrimatis(Command):
 
         objs.add(datasource, config)
 
+        return quat or matr
+
 
 def get_acquisition_datetime(root):
 
@@ -407,7 +483,8 @@ def transfo_quat(source, target, transfo, acquisition, root):
     if node.find('rotation/quaternion') is None:
         return api.noobj
 
-    quat = xmlutil.child_floats(node, 'rotation/quaternion/[x,y,z,w]')
+    # (w, x, y, z) like the quaternions of matr_to_quat and import-sbet
+    quat = xmlutil.child_floats(node, 'rotation/quaternion/[w,x,y,z]')
     return api.Transfo(
         source, target, transfo,
         name='{name}#quaternion'.format(**transfo),
@@ -425,17 +502,9 @@ def transfo_matr(source, target, transfo, acquisition, root):
     if node.find('rotation/mat3d') is None:
         return api.noobj
 
-    l1 = xmlutil.child_floats(node, 'rotation/mat3d/l1/pt3d/[x,y,z]')
-    l2 = xmlutil.child_floats(node, 'rotation/mat3d/l2/pt3d/[x,y,z]')
-    l3 = xmlutil.child_floats(node, 'rotation/mat3d/l3/pt3d/[x,y,z]')
-
-    matrix = []
-    matrix.extend(l1)
-    matrix.append(p[0])
-    matrix.extend(l2)
-    matrix.append(p[1])
-    matrix.extend(l3)
-    matrix.append(p[2])
+    r = [xmlutil.child_floats(node, 'rotation/mat3d/{}/pt3d/[x,y,z]'.format(row))
+         for row in ('l1', 'l2', 'l3')]
+    matrix = rotation.affine(r, p).ravel().tolist()
 
     return api.Transfo(
         source, target, transfo,
@@ -445,3 +514,136 @@ def transfo_matr(source, target, transfo, acquisition, root):
         parameters=[{'mat4x3': matrix, '_time': acquisition}],
         reverse=reverse,
     )
+
+
+def matr_to_quat(objs, transfos, tolerance, log):
+    """
+    Convert affine_mat4x3 transfos to affine_quat transfos, in place and in batch, and
+    return the transfos. The parameters of a transfo whose quaternion transfo exists
+    are merged into it, and the transfotrees refer to that one instead.
+    Raise an error if a rotation is not orthonormal within the given tolerance. Log a
+    warning for the merged poses that differ from the pose of the quaternion transfo at
+    the same time by more than the tolerance (in radians and position units).
+    """
+    transfos = [t for t in transfos if t]
+    matrs = [t for t in transfos
+             if t.objs['transfo_type'].obj.get('name') == 'affine_mat4x3']
+    parameters = [p for t in matrs for p in t.obj['parameters']]
+    if not parameters:
+        return transfos
+
+    matrices = rotation.mat4x3([p['mat4x3'] for p in parameters])
+    errors = rotation.orthonormality_error(matrices[..., :3])
+    log.info('Converting {:d} mat3d rotations to quaternions: orthonormality error '
+             'max {:.3g}, mean {:.3g} (tolerance {:.3g})'
+             .format(len(parameters), errors.max(), errors.mean(), tolerance))
+    if errors.max() > tolerance:
+        i = int(errors.argmax())
+        err = 'Error: mat3d rotation at {} is not orthonormal ' \
+              '(error {:.3g} exceeds tolerance {:.3g}, {:d} rotations out of tolerance)' \
+              .format(parameters[i].get('_time'), errors[i], tolerance,
+                      int((errors > tolerance).sum()))
+        raise RuntimeError(err)
+
+    quats = rotation.quat_from_matrix(matrices[..., :3]).tolist()
+    vec3s = matrices[..., 3].tolist()
+    for parameter, quat, vec3 in zip(parameters, quats, vec3s):
+        del parameter['mat4x3']
+        parameter['quat'] = quat
+        parameter['vec3'] = vec3
+
+    transfo_type = api.TransfoType(
+        name='affine_quat',
+        func_signature=['quat', 'vec3', '_time'],
+    )
+    # quaternion transfos, by id of the converted transfos merged into them
+    merged = {}
+    for transfo in matrs:
+        name = transfo.obj['name']
+        if name.endswith('#mat3d'):
+            name = name[:-len('#mat3d')] + '#quaternion'
+        quat = objs.lookup(api.Transfo(
+            transfo.objs['source'], transfo.objs['target'], name=name,
+            transfo_type=transfo_type))
+        if quat:
+            # the parameters of the quaternion transfo prevail at the same time
+            times = {p.get('_time'): p for p in quat.obj['parameters']}
+            for parameter in transfo.obj['parameters']:
+                existing = times.get(parameter.get('_time'))
+                if existing is None:
+                    quat.obj['parameters'].append(parameter)
+                else:
+                    check_pose(quat, existing, parameter, tolerance, log)
+            merged[id(transfo)] = quat
+            continue
+        transfo.obj['name'] = name
+        transfo.objs['transfo_type'] = transfo_type
+
+    if merged:
+        replace_transfos(objs, merged)
+    return list({id(t): t for t in (merged.get(id(t), t) for t in transfos)}.values())
+
+
+def check_pose(transfo, pose, converted, tolerance, log):
+    """
+    Log a warning if a converted pose and the pose of the quaternion transfo at the same
+    time differ by more than the tolerance, the pose of the quaternion transfo is kept.
+    """
+    positions, quats = poses.read_poses([pose, converted])
+    quats /= np.linalg.norm(quats, axis=-1, keepdims=True)
+    angle = poses.angle(quats[0], quats[1])
+    distance = np.linalg.norm(positions[0] - positions[1])
+    if angle > tolerance or distance > tolerance:
+        log.warning('Conflicting poses at {} in {}: the mat3d pose is {:.3g} rad and '
+                    '{:.3g} position units away, keeping the quaternion pose'.format(
+                        pose.get('_time'), transfo.obj['name'], angle, distance))
+
+
+def replace_transfos(objs, transfos):
+    """
+    Make the objects refer to ``transfos[id(transfo)]`` instead of transfo.
+    """
+    seen = set()
+    stack = list(objs.objs)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        for key, array in obj.arrays.items():
+            obj.arrays[key] = [transfos.get(id(o), o) for o in array]
+            stack.extend(array)
+        stack.extend(dep for dep in obj.objs.values() if dep)
+
+
+def store_parameters(transfos, directory, schema, server_name, log):
+    """
+    Move the parameters of pose series transfos out of line: write each series to a CSV
+    file and make the transfo reference the points column of a foreign view on it.
+    Return the foreign views to create.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    foreignpc_server = api.ForeignpcServer(name=server_name, driver=CSV_DRIVER, options={})
+    views = []
+    for transfo in transfos:
+        parameters = transfo.obj.get('parameters')
+        if not parameters or not all('_time' in p for p in parameters):
+            continue
+        table = re.sub(r'\W+', '_', transfo.obj['name']).strip('_').lower()
+        path = (directory / table).with_suffix('.csv').resolve()
+        template, start, end = poses.write_csv(parameters, path)
+        log.info('Wrote {:d} poses of {} to {}'.format(
+            len(parameters), transfo.obj['name'], path))
+
+        foreignpc_table = {'schema': schema, 'table': table, 'filepath': str(path)}
+        foreignpc_table = create_foreignpc_table(foreignpc_table, foreignpc_server, CSV_DRIVER)
+        foreignpc_view = {'schema': schema, 'view': table + '_view', 'sbet': False}
+        views.append(create_foreignpc_view(foreignpc_view, foreignpc_table))
+
+        transfo.obj['parameters'] = [template]
+        transfo.obj['parameters_column'] = '{}.{}_view.points'.format(schema, table)
+        transfo.obj.setdefault('validity_start', api.isoformat(
+            datetime.datetime.fromtimestamp(start, pytz.UTC)))
+        transfo.obj.setdefault('validity_end', api.isoformat(
+            datetime.datetime.fromtimestamp(end, pytz.UTC)))
+    return views
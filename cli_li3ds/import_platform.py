@@ -2,11 +2,11 @@ import math
 import logging
 import configparser
 
-from pyquaternion import Quaternion
-
 from cliff.command import Command
 
 from . import api
+from . import phases
+from . import rotation
 
 
 class ImportPlatform(Command):
@@ -28,12 +28,14 @@ class ImportPlatform(Command):
         return parser
 
     def take_action(self, parsed_args):
-        server = api.ApiServer(parsed_args, self.log)
+        server = api.api_server(parsed_args, self.log)
         objs = api.ApiObjs(server)
 
         self.log.info('Importing platform configuration sample')
 
-        lidar_transform_params = self.read_lidar_rigid_transform_params(parsed_args.filename)
+        with phases.phase(phases.PARSING):
+            lidar_transform_params = self.read_lidar_rigid_transform_params(
+                parsed_args.filename)
 
         lidar = api.Sensor({
             'name': 'lidar',
@@ -108,6 +110,7 @@ class ImportPlatform(Command):
 
         objs.add(transfotree_cam2ins, pconfig)
         objs.get_or_create()
+        server.finish()
         self.log.info('Success!\n')
 
     @staticmethod
@@ -136,12 +139,11 @@ class ImportPlatform(Command):
         qx = - sh * cr * sp + ch * sr * cp
         qy = + sh * sr * cp + ch * cr * sp
         qz = + ch * sr * sp + sh * cr * cp
-        q_boresight = Quaternion(qw, qx, qy, qz)
+        q_boresight = [qw, qx, qy, qz]
 
         # rotate by π/2 around y and π around z (lidar to ins)
-        q_z = Quaternion(axis=(0, 0, 1), radians=math.pi)
-        q_y = Quaternion(axis=(0, 1, 0), radians=math.pi/2)
+        q_z, q_y = rotation.quat_from_axis_angle([(0, 0, 1), (0, 1, 0)], [math.pi, math.pi/2])
 
-        q = q_z * q_y * q_boresight
+        q = rotation.quat_multiply(q_z, rotation.quat_multiply(q_y, q_boresight))
 
-        return {'vec3': [easting, northing, elevation], 'quat': [q[0], q[1], q[2], q[3]]}
+        return {'vec3': [easting, northing, elevation], 'quat': q.tolist()}
@@ -7,6 +7,7 @@ import pytz
 from cliff.command import Command
 
 from . import api
+from . import phases
 from .foreignpc import create_foreignpc_table, create_foreignpc_view, create_datasource
 
 
@@ -58,7 +59,7 @@ class ImportSbet(Command):
         return parser
 
     def take_action(self, parsed_args):
-        server = api.ApiServer(parsed_args, self.log)
+        server = api.api_server(parsed_args, self.log)
         objs = api.ApiObjs(server)
 
         args = {
@@ -90,19 +91,22 @@ class ImportSbet(Command):
             },
         }
 
-        for data_path in self.matching_filenames(parsed_args):
+        for data_path in objs.inputs(self.matching_filenames(parsed_args)):
             self.log.info('Importing {}'.format(
                 data_path.relative_to(parsed_args.chdir)))
-            name, session_time = self.parse_path(data_path)
-            self.handle_sbet(objs, args, data_path, name, session_time)
+            with objs.input(data_path):
+                name, session_time = self.parse_path(data_path)
+                with phases.phase(phases.GRAPH):
+                    self.handle_sbet(objs, args, data_path, name, session_time)
 
         objs.get_or_create()
+        server.finish()
         self.log.info('Success!\n')
 
     @staticmethod
     def matching_filenames(parsed_args):
         for filename in parsed_args.filename:
-            for data_path in parsed_args.chdir.rglob(filename):
+            for data_path in phases.iterate(phases.DISCOVERY, parsed_args.chdir.rglob(filename)):
                 if parsed_args.filename_pattern:
                     match = re.match(parsed_args.filename_pattern, data_path.name)
                 else:
@@ -170,17 +174,17 @@ class ImportSbet(Command):
         api.update_obj(args, metadata, transfo, 'transfo')
         api.update_obj(args, metadata, transfotree, 'transfotree')
 
-        foreignpc_server = api.ForeignpcServer(foreignpc_server)
+        foreignpc_server = objs.intern(api.ForeignpcServer(foreignpc_server))
         foreignpc_table = create_foreignpc_table(foreignpc_table, foreignpc_server, cls.driver)
         foreignpc_view = create_foreignpc_view(foreignpc_view, foreignpc_table)
         objs.add(foreignpc_view)
 
-        sensor = api.Sensor(sensor)
-        project = api.Project(project)
-        platform = api.Platform(platform)
-        session = api.Session(project, platform, session)
-        referential_ins = api.Referential(sensor, referential_ins)
-        referential_world = api.Referential(sensor, referential_world)
+        sensor = objs.intern(api.Sensor(sensor))
+        project = objs.intern(api.Project(project))
+        platform = objs.intern(api.Platform(platform))
+        session = objs.intern(api.Session(project, platform, session))
+        referential_ins = objs.intern(api.Referential(sensor, referential_ins))
+        referential_world = objs.intern(api.Referential(sensor, referential_world))
 
         datasource = create_datasource(datasource, session, referential_ins, name, 'trajectory')
         objs.add(datasource)
@@ -0,0 +1,95 @@
+"""
+Journal of the objects published by an import, so that an interrupted import can be
+resumed without looking up again the objects it already published.
+
+The journal is a JSON lines file: a header with the API URL, then the collection, key
+values and id of each published object. Lines are written in batches, an interrupted
+import loses at most the last batch, whose objects are looked up again when resuming.
+"""
+import os
+import json
+import time
+import threading
+
+
+JOURNAL_VERSION = 1
+
+
+class Journal:
+
+    def __init__(self, path, api_url, resume_path=None, batch=1000, interval=5.):
+        self.api_url = api_url
+        self.batch = batch
+        self.interval = interval
+        self.published = {}
+        self.pending = []
+        self.flushed = time.monotonic()
+        self.lock = threading.Lock()
+        if resume_path:
+            self.read(resume_path)
+        new = not os.path.exists(path) or not os.path.getsize(path)
+        self.file = open(path, 'a')
+        if new:
+            self.file.write(json.dumps({'journal': JOURNAL_VERSION, 'api_url': api_url}) + '\n')
+            self.file.flush()
+
+    @classmethod
+    def from_args(cls, args, api_url):
+        path = getattr(args, 'journal', None)
+        resume_path = getattr(args, 'resume', None)
+        if not path and not resume_path:
+            return None
+        if not api_url:
+            err = 'Error: --journal and --resume need an api url'
+            raise RuntimeError(err)
+        return cls(path or resume_path, api_url, resume_path)
+
+    def read(self, path):
+        with open(path) as f:
+            header = json.loads(f.readline() or '{}')
+            if header.get('journal') != JOURNAL_VERSION:
+                err = 'Error: {} is not a version {:d} journal'.format(path, JOURNAL_VERSION)
+                raise RuntimeError(err)
+            if header['api_url'] != self.api_url:
+                err = 'Error: {} is the journal of another api ({})'.format(
+                    path, header['api_url'])
+                raise RuntimeError(err)
+            published = {}
+            for line in f:
+                try:
+                    typ, key, id_ = json.loads(line)
+                except ValueError:
+                    # the last line of an interrupted import may be truncated
+                    continue
+                published[typ, key] = id_
+        # the steps of a run may resume from the journal another step records to
+        with self.lock:
+            self.published.update(published)
+
+    @staticmethod
+    def key(apiobj):
+        typ = apiobj.type_.format(**apiobj.parent.obj)
+        return typ, json.dumps([apiobj.obj.get(k) for k in apiobj.key], default=str)
+
+    def record(self, key, id_):
+        with self.lock:
+            self.published[key] = id_
+            self.pending.append(json.dumps([key[0], key[1], id_]) + '\n')
+            if (len(self.pending) >= self.batch or
+                    time.monotonic() - self.flushed > self.interval):
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        self.file.writelines(self.pending)
+        self.file.flush()
+        self.pending = []
+        self.flushed = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            self.file.close()
@@ -0,0 +1,185 @@
+"""
+Incremental decoding of the JSON arrays of large API responses, so that a lookup can stop
+at the first matching object without downloading or decoding the rest, and of the JSON
+bundles of import-json, one section at a time.
+"""
+import re
+import sys
+import json
+import codecs
+
+
+WHITESPACE = ' \t\n\r'
+
+# what may end a value: out of strings (skipping the strings held in a chunk), within
+# strings, after a number
+STRUCTURE = re.compile(r'"(?:[^"\\]|\\.)*"|[][{}"]')
+STRING_END = re.compile(r'["\\]')
+SCALAR_END = re.compile(r'[ \t\n\r,\]}]')
+
+
+def _object(pairs):
+    # share the keys of the decoded objects, like json.load does within a document
+    return {sys.intern(key): value for key, value in pairs}
+
+
+_decoder = json.JSONDecoder(object_pairs_hook=_object)
+
+
+class _Reader:
+    """
+    The text of chunks of bytes, decoded as needed, with the position of the next value.
+    """
+
+    def __init__(self, chunks, encoding='utf-8'):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        '''
+        Append the next chunk to the buffer, return False if there is none.
+        '''
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + self.decoder.decode(chunk)
+        self.pos = 0
+        return True
+
+    def peek(self):
+        '''
+        Return the next character that is not whitespace, '' at the end of the chunks.
+        '''
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, chars, what):
+        char = self.peek()
+        if not char:
+            raise ValueError('Truncated JSON {}'.format(what))
+        if char not in chars:
+            raise ValueError('Expecting {} at "{}"'.format(
+                ' or '.join('"{}"'.format(c) for c in chars), self.buffer[self.pos:][:20]))
+        self.pos += 1
+        return char
+
+    def value(self, what):
+        '''
+        Return the next value. Its end is found by scanning its brackets and strings as
+        chunks come, so that it is decoded once however many chunks it spans.
+        '''
+        self.peek()
+        scalar = self.pos < len(self.buffer) and self.buffer[self.pos] not in '[{"'
+        # the text of the previous chunks, and the scan state of the value
+        pieces = []
+        start = pos = self.pos
+        depth = 0
+        in_string = False
+        end = None
+        while end is None:
+            buffer = self.buffer
+            if scalar:
+                match = SCALAR_END.search(buffer, pos)
+                if match:
+                    end = match.start()
+                pos = len(buffer)
+            while end is None and pos < len(buffer):
+                match = (STRING_END if in_string else STRUCTURE).search(buffer, pos)
+                if not match:
+                    pos = len(buffer)
+                    break
+                pos = match.end()
+                char = match.group()
+                if char == '\\':
+                    # skip the escaped character, maybe the first of the next chunk
+                    pos += 1
+                    continue
+                if len(char) > 1:
+                    # a whole string
+                    pass
+                elif char == '"':
+                    in_string = not in_string
+                elif char in '[{':
+                    depth += 1
+                else:
+                    depth -= 1
+                if not depth and not in_string:
+                    end = pos
+            if end is None:
+                pieces.append(buffer[start:])
+                self.pos = len(buffer)
+                if self.fill():
+                    start = 0
+                    pos -= len(buffer)
+                elif scalar:
+                    # a number at the end of the chunks
+                    start = end = self.pos
+                else:
+                    raise ValueError('Truncated JSON {}'.format(what))
+        self.pos = end
+        if pieces:
+            pieces.append(self.buffer[start:end])
+            text = ''.join(pieces)
+            item, stop = _decoder.raw_decode(text)
+            stop -= len(text) - end
+        else:
+            item, stop = _decoder.raw_decode(self.buffer, start)
+        if stop != end:
+            raise ValueError('Invalid JSON {} at "{}"'.format(
+                what, self.buffer[max(stop, 0):][:20]))
+        return item
+
+    def items(self):
+        '''
+        Yield the items of the array whose '[' was read.
+        '''
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value('array')
+            if self.expect(',]', 'array') == ']':
+                return
+
+
+def iter_array(chunks):
+    '''
+    Yield the items of the JSON array sent in ``chunks`` of bytes, each one as soon as it
+    is complete. Raise ValueError if the chunks are not a JSON array.
+    '''
+    reader = _Reader(chunks)
+    reader.expect('[', 'array')
+    yield from reader.items()
+
+
+def iter_object(chunks, encoding='utf-8'):
+    '''
+    Yield the ``(name, items)`` members of the JSON object of arrays sent in ``chunks``
+    of bytes, where ``items`` yields the items of the array as they are decoded. The
+    items of a member are skipped if they are not consumed before the next member.
+    '''
+    reader = _Reader(chunks, encoding)
+    reader.expect('{', 'object')
+    if reader.peek() == '}':
+        return
+    while True:
+        name = reader.value('object')
+        if not isinstance(name, str):
+            raise ValueError('Expecting a member name, got {!r}'.format(name))
+        reader.expect(':', 'object')
+        reader.expect('[', 'array')
+        items = reader.items()
+        yield name, items
+        for _ in items:
+            pass
+        if reader.expect(',}', 'object') == '}':
+            return
@@ -1,17 +1,144 @@
 import sys
+import importlib
 from cliff.app import App
 from cliff.commandmanager import CommandManager
 
 
+# the li3ds entry points of setup.py, so that finding a command does not import every
+# command module and their dependencies
+COMMANDS = {
+    'import-extcalib': 'cli_li3ds.import_extcalib:ImportExtCalib',
+    'import-autocal': 'cli_li3ds.import_autocal:ImportAutocal',
+    'import-ori': 'cli_li3ds.import_ori:ImportOri',
+    'import-ori-export': 'cli_li3ds.import_ori_export:ImportOriExport',
+    'import-orimatis': 'cli_li3ds.import_orimatis:ImportOrimatis',
+    'import-image': 'cli_li3ds.import_image:ImportImage',
+    'import-sbet': 'cli_li3ds.import_sbet:ImportSbet',
+    'import-ept': 'cli_li3ds.import_ept:ImportEpt',
+    'import-platform': 'cli_li3ds.import_platform:ImportPlatform',
+    'import-json': 'cli_li3ds.import_json:ImportJson',
+    'export-json': 'cli_li3ds.export_json:ExportJson',
+    'run': 'cli_li3ds.run:Run',
+    'apply': 'cli_li3ds.apply:Apply',
+}
+
+
+class LazyEntryPoint:
+    """
+    An entry point whose module is only imported when the command is loaded.
+    """
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+    def load(self, *args, **kwargs):
+        module_name, _, attr = self.value.partition(':')
+        return getattr(importlib.import_module(module_name), attr)
+
+
+def iter_entry_points(group):
+    try:
+        import importlib.metadata
+    except ImportError:
+        # before python 3.8, like cliff
+        import pkg_resources
+        return pkg_resources.iter_entry_points(group)
+    entry_points = importlib.metadata.entry_points()
+    if hasattr(entry_points, 'select'):
+        return entry_points.select(group=group)
+    return entry_points.get(group, ())
+
+
+class LazyCommandManager(CommandManager):
+    """
+    Command manager registering the li3ds commands from ``COMMANDS``. The entry points of
+    the namespace, that other distributions may extend, are only scanned when listing the
+    commands or when a command is not in ``COMMANDS``.
+    """
+
+    def load_commands(self, namespace):
+        self.group_list.append(namespace)
+        self.plugins_loaded = False
+        for name, value in COMMANDS.items():
+            self.commands[name] = LazyEntryPoint(name, value)
+
+    def load_plugins(self):
+        if self.plugins_loaded:
+            return
+        self.plugins_loaded = True
+        for entry_point in iter_entry_points(self.namespace):
+            name = entry_point.name.strip()
+            if self.convert_underscores:
+                name = name.replace('_', ' ')
+            self.commands.setdefault(name, entry_point)
+
+    def find_command(self, argv):
+        try:
+            return super().find_command(argv)
+        except ValueError:
+            if self.plugins_loaded:
+                raise
+            self.load_plugins()
+            return super().find_command(argv)
+
+    def __iter__(self):
+        self.load_plugins()
+        return super().__iter__()
+
+
 class Li3ds(App):
 
     def __init__(self):
         super().__init__(
             description='The li3ds command line',
             version='0.1',
-            command_manager=CommandManager('li3ds'),
+            command_manager=LazyCommandManager('li3ds'),
             deferred_help=True
         )
+        self.profile = None
+        self.tracer = None
+
+    def build_option_parser(self, description, version, argparse_kwargs=None):
+        parser = super().build_option_parser(description, version, argparse_kwargs)
+        parser.add_argument(
+            '--profile', metavar='PREFIX',
+            help='profile the command and its threads with cProfile and write '
+                 'PREFIX.pstats (optional)')
+        parser.add_argument(
+            '--profile-sampler', action='store_true',
+            help='with --profile, sample the stacks of every thread with py-spy instead, '
+                 'and write PREFIX.collapsed for flame graphs (optional, py-spy must be '
+                 'installed)')
+        parser.add_argument(
+            '--profile-memory', action='store_true',
+            help='report the peak traced memory and top allocation sites of each import '
+                 'phase (optional)')
+        parser.add_argument(
+            '--trace', metavar='FILE',
+            help='write the phases, API requests and templating spans of the command to '
+                 'FILE in the Chrome trace event format (optional)')
+        return parser
+
+    def prepare_to_run_command(self, cmd):
+        if self.options.profile or self.options.profile_memory:
+            from .profiling import Profile
+            self.profile = Profile(self.options.profile, self.options.profile_memory,
+                                   self.LOG, self.options.profile_sampler)
+            self.profile.start()
+        if self.options.trace:
+            from .tracing import Tracer
+            self.tracer = Tracer()
+            self.tracer.start(cmd.cmd_name or type(cmd).__name__)
+
+    def clean_up(self, cmd, result, err):
+        if self.tracer:
+            self.tracer.stop(cmd.cmd_name or type(cmd).__name__)
+            self.tracer.write(self.options.trace)
+            self.tracer = None
+        if self.profile:
+            self.profile.stop()
+            self.profile = None
 
 
 def main(argv=sys.argv[1:]):
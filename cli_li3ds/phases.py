@@ -0,0 +1,64 @@
+"""
+Import phases (discovery, parsing, graph, publish) and finer spans reported to the
+profilers and tracers.
+
+Commands mark their phases with ``with phase('parsing'):`` blocks, and finer operations
+with spans of another category, e.g. ``with phase('request', 'http', verb='GET'):``.
+Listeners registered with ``add_listener`` have their ``enter(phase)`` and ``exit(phase)``
+methods called around each block, which costs one empty loop when there is no listener.
+"""
+
+DISCOVERY = 'discovery'
+PARSING = 'parsing'
+GRAPH = 'graph'
+PUBLISH = 'publish'
+
+PHASES = (DISCOVERY, PARSING, GRAPH, PUBLISH)
+
+listeners = []
+
+
+def add_listener(listener):
+    listeners.append(listener)
+
+
+def remove_listener(listener):
+    listeners.remove(listener)
+
+
+class phase:
+    '''
+    A phase or span. ``args`` describe it and may be completed within the block, e.g.
+    with a response status.
+    '''
+    __slots__ = ('name', 'category', 'args')
+
+    def __init__(self, name, category='phase', **args):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        for listener in listeners:
+            listener.enter(self)
+        return self
+
+    def __exit__(self, *exc):
+        for listener in reversed(listeners):
+            listener.exit(self)
+        return False
+
+
+def iterate(name, iterable):
+    """
+    Yield the items of ``iterable``, running each ``next`` call in the ``name`` phase,
+    e.g. ``for path in iterate(DISCOVERY, directory.rglob(pattern))``.
+    """
+    iterator = iter(iterable)
+    while True:
+        with phase(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
@@ -0,0 +1,223 @@
+"""
+Plans of imports: the objects of an import graph that already exist on the server, that
+are new, that would get new parameters appended or whose values mismatch, written by
+``--plan FILE`` and executed by ``li3ds apply FILE``.
+
+New objects are numbered, and the objects depending on them refer to them with
+``{"$ref": number}`` instead of an id, to be replaced by the id of the created object.
+"""
+import json
+import threading
+
+
+PLAN_VERSION = 1
+
+ACTIONS = ('exists', 'new', 'append', 'mismatch')
+
+
+def is_ref(value):
+    return isinstance(value, dict) and '$ref' in value
+
+
+def mismatches(obj, got, ignore=('description',)):
+    return [{'key': key, 'planned': obj[key], 'existing': got[key]}
+            for key in sorted(set(obj).intersection(got).difference(ignore))
+            if obj[key] != got[key]]
+
+
+class Planner:
+    """
+    Resolve the existence of the objects of import graphs with one request per
+    collection, instead of one lookup per object.
+    """
+
+    def __init__(self, api):
+        self.api = api
+        self.entries = []
+        # entry number by ApiObj, and of new objects by collection and key
+        self.refs = {}
+        self.new = {}
+        # objects by collection, and their indexes by key
+        self.collections = {}
+        self.indexes = {}
+        self.lock = threading.Lock()
+
+    def collection(self, session, typ, parent):
+        name = typ.format(**parent)
+        if name not in self.collections:
+            self.collections[name] = self.api.get_objects(session, typ, parent) or []
+        return self.collections[name]
+
+    def find(self, session, typ, parent, dict_):
+        name = typ.format(**parent)
+        keys = tuple(sorted(dict_))
+        index = self.indexes.get((name, keys))
+        if index is None:
+            index = self.indexes[name, keys] = {}
+            for o in self.collection(session, typ, parent):
+                if all(k in o for k in keys):
+                    index.setdefault(json.dumps([o[k] for k in keys], default=str), o)
+        return index.get(json.dumps([dict_[k] for k in keys], default=str))
+
+    def reference(self, session, apiobj):
+        '''
+        Return the id of apiobj if it exists, a reference to its entry if it is new.
+        '''
+        entry = self.entries[self.add(session, apiobj)]
+        if entry['action'] == 'new':
+            return {'$ref': entry['ref']}
+        return entry['id']
+
+    def add(self, session, apiobj):
+        '''
+        Plan apiobj and the objects it depends on, return the number of its entry.
+        '''
+        if id(apiobj) in self.refs:
+            return self.refs[id(apiobj)]
+
+        typ = apiobj.type_
+        if apiobj.published:
+            entry = {'type': typ, 'action': 'exists', 'id': apiobj.obj['id']}
+            return self.append(apiobj, entry)
+
+        apiobj.prepare()
+        obj = dict(apiobj.obj)
+        for key, dep in apiobj.objs.items():
+            if dep:
+                obj[key] = self.reference(session, dep)
+        for key, array in apiobj.arrays.items():
+            refs = [self.reference(session, o) for o in array if o]
+            # ids are sorted like in ApiObj.get_or_create, references once resolved
+            obj[key] = refs if any(is_ref(r) for r in refs) else sorted(refs)
+        parent = {}
+        if apiobj.parent:
+            parent = {'id': self.reference(session, apiobj.parent)}
+
+        entry = {'type': typ, 'key': list(apiobj.key), 'arrays': sorted(apiobj.arrays)}
+        unresolved = is_ref(parent.get('id')) or any(
+            is_ref(obj.get(k)) or (isinstance(obj.get(k), list) and any(map(is_ref, obj[k])))
+            for k in apiobj.key)
+        got = None
+        if 'id' in obj:
+            got = self.find(session, typ, parent, {'id': obj['id']})
+            if not got:
+                err = 'Error: {} with id {:d} not in db'.format(typ, obj['id'])
+                raise RuntimeError(err)
+        elif not all(k in obj for k in apiobj.key):
+            err = 'Error: {} objects should specify either their (id) or ({}) {}' \
+                  .format(typ, ','.join(apiobj.key), obj)
+            raise RuntimeError(err)
+        elif not unresolved:
+            got = self.find(session, typ, parent, {k: obj[k] for k in apiobj.key})
+
+        if got:
+            entry['id'] = got['id']
+            entry['action'] = 'exists'
+            entry['lookup'] = {k: obj[k] for k in apiobj.key if k in obj}
+            if apiobj.append and not obj.get('parameters_column'):
+                try:
+                    update = self.api.append_update(typ, obj, got)
+                except RuntimeError:
+                    update = None
+                    entry['action'] = 'mismatch'
+                    entry['mismatches'] = mismatches(obj, got, (
+                        'description', 'parameters', 'validity_start', 'validity_end'))
+                if update:
+                    entry['action'] = 'append'
+                    entry['update'] = update
+                    entry['parent'] = parent
+            elif mismatches(obj, got):
+                entry['action'] = 'mismatch'
+                entry['mismatches'] = mismatches(obj, got)
+            return self.append(apiobj, entry)
+
+        # an object planned twice, by distinct but equal ApiObj instances
+        new_key = json.dumps([typ, parent, [obj[k] for k in apiobj.key]], default=str)
+        if new_key in self.new:
+            self.refs[id(apiobj)] = self.new[new_key]
+            return self.new[new_key]
+        entry.update({'action': 'new', 'obj': obj, 'parent': parent})
+        self.new[new_key] = self.append(apiobj, entry)
+        return self.new[new_key]
+
+    def append(self, apiobj, entry):
+        entry['ref'] = len(self.entries)
+        self.entries.append(entry)
+        self.refs[id(apiobj)] = entry['ref']
+        return entry['ref']
+
+    def summary(self):
+        summary = {}
+        for entry in self.entries:
+            counts = summary.setdefault(entry['type'], dict.fromkeys(ACTIONS, 0))
+            counts[entry['action']] += 1
+        return summary
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump({
+                'version': PLAN_VERSION,
+                'api_url': self.api.api_url,
+                'summary': self.summary(),
+                'objects': self.entries,
+            }, f, indent=1, default=str)
+
+    def log_summary(self, log):
+        for typ, counts in sorted(self.summary().items()):
+            log.info('{}: {}'.format(typ, ', '.join(
+                '{:d} {}'.format(counts[action], action) for action in ACTIONS)))
+        count = sum(1 for entry in self.entries if entry['action'] == 'mismatch')
+        if count:
+            log.warning('{:d} objects mismatch existing ones, see the plan'.format(count))
+
+
+def read(path):
+    with open(path) as f:
+        plan = json.load(f)
+    if plan.get('version') != PLAN_VERSION:
+        err = 'Error: {} is not a version {:d} plan'.format(path, PLAN_VERSION)
+        raise RuntimeError(err)
+    return plan
+
+
+def levels(entries):
+    '''
+    Return the lists of new entries that can be created concurrently, in dependency
+    order.
+    '''
+    depth = {}
+
+    def refs(value):
+        if is_ref(value):
+            yield value['$ref']
+        elif isinstance(value, dict):
+            for v in value.values():
+                yield from refs(v)
+        elif isinstance(value, list):
+            for v in value:
+                yield from refs(v)
+
+    levels = []
+    for entry in entries:
+        if entry['action'] != 'new':
+            continue
+        # entries are planned after the ones they depend on
+        depth[entry['ref']] = 1 + max(
+            (depth[ref] for ref in refs([entry['obj'], entry['parent']])), default=-1)
+        if depth[entry['ref']] == len(levels):
+            levels.append([])
+        levels[depth[entry['ref']]].append(entry)
+    return levels
+
+
+def resolve(value, ids):
+    '''
+    Replace the references of value by the ids of the created objects.
+    '''
+    if is_ref(value):
+        return ids[value['$ref']]
+    if isinstance(value, dict):
+        return {k: resolve(v, ids) for k, v in value.items()}
+    if isinstance(value, list):
+        return [resolve(v, ids) for v in value]
+    return value
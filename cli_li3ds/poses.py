@@ -0,0 +1,177 @@
+"""
+Utilities for extrinsic pose series, i.e. transfos whose ``parameters`` hold one
+``affine_mat4x3`` or ``affine_quat`` pose per ``_time`` sample.
+"""
+import math
+import datetime
+
+import dateutil.parser
+import numpy as np
+
+from . import rotation
+
+
+def timestamps(parameters):
+    """
+    Return the ``_time`` values of transfo parameters as POSIX timestamps.
+    """
+    times = []
+    for parameter in parameters:
+        time = parameter['_time']
+        if isinstance(time, str):
+            time = dateutil.parser.parse(time)
+        if isinstance(time, datetime.datetime):
+            time = time.timestamp()
+        times.append(float(time))
+    return np.array(times)
+
+
+def read_poses(parameters):
+    """
+    Return the positions and rotation quaternions of ``affine_mat4x3`` or ``affine_quat``
+    transfo parameters, as ``(n, 3)`` and ``(n, 4)`` arrays.
+    """
+    if all('mat4x3' in p for p in parameters):
+        matrices = rotation.mat4x3([p['mat4x3'] for p in parameters])
+        return matrices[..., 3], rotation.quat_from_matrix(matrices[..., :3])
+    if all('quat' in p and 'vec3' in p for p in parameters):
+        return (np.array([p['vec3'] for p in parameters], dtype=float),
+                np.array([p['quat'] for p in parameters], dtype=float))
+    return None, None
+
+
+def slerp(q0, q1, u):
+    """
+    Spherical linear interpolation from the ``q0`` quaternion to the ``q1`` quaternion.
+
+    :param u: ``(n,)`` interpolation factors.
+    """
+    q0 = q0 / np.linalg.norm(q0)
+    q1 = q1 / np.linalg.norm(q1)
+    dot = np.dot(q0, q1)
+    if dot < 0:
+        q1, dot = -q1, -dot
+    theta = math.acos(min(dot, 1.))
+    if theta < 1e-9:
+        return np.outer(1 - u, q0) + np.outer(u, q1)
+    s = math.sin(theta)
+    return (np.outer(np.sin((1 - u) * theta), q0) + np.outer(np.sin(u * theta), q1)) / s
+
+
+def angle(q0, q1):
+    """
+    Return the rotation angles (in radians) between two stacks of unit quaternions.
+    """
+    dot = np.abs(np.einsum('...i,...i->...', q0, q1))
+    return 2 * np.arccos(np.minimum(dot, 1.))
+
+
+def simplify(times, positions, quats, tolerance, angle_tolerance):
+    """
+    Select a subset of the poses such that every dropped pose is recovered, within the
+    given tolerances, by interpolating the kept poses around it (linear interpolation of
+    positions, spherical linear interpolation of rotations, both against time).
+
+    Poses must be sorted by time. Return a boolean mask of the poses to keep.
+
+    :param tolerance: the translation tolerance, in position units.
+    :param angle_tolerance: the rotation tolerance, in radians.
+    """
+    n = len(times)
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    quats = quats / np.linalg.norm(quats, axis=-1, keepdims=True)
+
+    # Douglas-Peucker: split each segment at its worst pose until the interpolation
+    # error of every pose in between is within tolerance
+    segments = [(0, n - 1)]
+    while segments:
+        i, j = segments.pop()
+        if j - i < 2:
+            continue
+        k = np.arange(i + 1, j)
+        duration = times[j] - times[i]
+        u = (times[k] - times[i]) / duration if duration > 0 else np.full(len(k), 0.5)
+        error = np.linalg.norm(
+            positions[i] + np.outer(u, positions[j] - positions[i]) - positions[k], axis=-1)
+        error /= tolerance if tolerance > 0 else np.finfo(float).tiny
+        angle_error = angle(slerp(quats[i], quats[j], u), quats[k])
+        angle_error /= angle_tolerance if angle_tolerance > 0 else np.finfo(float).tiny
+        error = np.maximum(error, angle_error)
+        worst = int(error.argmax())
+        if error[worst] > 1:
+            m = i + 1 + worst
+            keep[m] = True
+            segments.extend(((i, m), (m, j)))
+    return keep
+
+
+def simplify_transfo(transfo, tolerance, angle_tolerance):
+    """
+    Drop the poses of a pose series transfo that can be interpolated from their
+    neighbours, see ``simplify``. Return the number of poses before and after.
+    """
+    parameters = transfo.obj.get('parameters')
+    if not parameters or transfo.obj.get('parameters_column'):
+        return 0, 0
+    if len(parameters) < 3 or not all('_time' in p for p in parameters):
+        return len(parameters), len(parameters)
+    positions, quats = read_poses(parameters)
+    if positions is None:
+        return len(parameters), len(parameters)
+
+    times = timestamps(parameters)
+    order = np.argsort(times, kind='mergesort')
+    keep = simplify(times[order], positions[order], quats[order],
+                    tolerance, angle_tolerance)
+    transfo.obj['parameters'] = [parameters[i] for i in order[keep]]
+    return len(parameters), int(keep.sum())
+
+
+def simplify_transfos(transfos, tolerance, angle_tolerance, log):
+    """
+    Simplify pose series transfos and log the compression ratios.
+
+    :param angle_tolerance: the rotation tolerance, in degrees.
+    """
+    total_before, total_after = 0, 0
+    for transfo in transfos:
+        before, after = simplify_transfo(
+            transfo, tolerance, math.radians(angle_tolerance))
+        if not before:
+            continue
+        log.info('Simplified {}: {:d} -> {:d} poses (ratio {:.1f}:1)'.format(
+            transfo.obj.get('name'), before, after, before / after))
+        total_before += before
+        total_after += after
+    if total_after:
+        log.info('Simplified poses: {:d} -> {:d} (ratio {:.1f}:1)'.format(
+            total_before, total_after, total_before / total_after))
+
+
+def write_csv(parameters, path):
+    """
+    Write pose series parameters to a CSV file, one row per pose sorted by time, with
+    ``_time`` stored as POSIX timestamps in a ``time`` column.
+
+    Return the parameters template mapping each parameter to its CSV column names, as
+    used with ``parameters_column``, and the first and last timestamps.
+    """
+    times = timestamps(parameters)
+    keys = [k for k in parameters[0] if k != '_time']
+    columns = [times[:, np.newaxis]]
+    names = ['time']
+    template = {'_time': 'time'}
+    for key in keys:
+        values = np.array([p[key] for p in parameters], dtype=float).reshape(len(times), -1)
+        if isinstance(parameters[0][key], list):
+            template[key] = ['{}_{:d}'.format(key, i) for i in range(values.shape[1])]
+            names.extend(template[key])
+        else:
+            template[key] = key
+            names.append(key)
+        columns.append(values)
+    rows = np.hstack(columns)[np.argsort(times, kind='mergesort')]
+    np.savetxt(str(path), rows, fmt='%.17g', delimiter=',', header=','.join(names),
+               comments='')
+    return template, times.min(), times.max()
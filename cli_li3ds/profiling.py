@@ -0,0 +1,212 @@
+"""
+Profilers behind the global ``--profile``, ``--profile-sampler`` and ``--profile-memory``
+options.
+
+This module is only imported when profiling is requested.
+"""
+import os
+import sys
+import pstats
+import shutil
+import signal
+import cProfile
+import threading
+import subprocess
+import tracemalloc
+import collections
+
+from . import phases
+
+
+class ThreadProfiler:
+    """
+    Profile with cProfile the thread starting the profiler and the threads started until
+    it stops, e.g. the workers of run, import-json, export-json and apply. Before Python
+    3.12 cProfile only profiles the thread enabling it, so each thread gets its own
+    profiler, and their statistics are merged.
+    """
+
+    def __init__(self):
+        self.profilers = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        threading.setprofile(self.profile_thread)
+        self.profile_thread()
+
+    def profile_thread(self, *args):
+        # the first profile function of the new threads, replaced by their profiler
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+: the profiler of the first thread profiles every thread
+            sys.setprofile(None)
+            return
+        with self.lock:
+            self.profilers.append(profiler)
+
+    def stop(self):
+        threading.setprofile(None)
+        self.profilers[0].disable()
+
+    def dump_stats(self, path):
+        with self.lock:
+            stats = pstats.Stats(*self.profilers)
+        stats.dump_stats(path)
+
+
+class PySpy:
+    """
+    Sample the stacks of every thread with py-spy, waiting threads included so the time
+    spent on the network shows up, and write them in the collapsed stack format of
+    flamegraph.pl and speedscope. py-spy attaches to the process, which needs the
+    permission to trace it (e.g. root, or kernel.yama.ptrace_scope set to 0).
+    """
+
+    def __init__(self, path, rate=1000):
+        self.path = path
+        self.rate = rate
+        self.process = None
+
+    def start(self):
+        executable = shutil.which('py-spy')
+        if not executable:
+            err = 'Error: --profile-sampler needs py-spy (pip install py-spy)'
+            raise RuntimeError(err)
+        self.process = subprocess.Popen(
+            [executable, 'record', '--pid', str(os.getpid()), '--idle', '--format', 'raw',
+             '--rate', str(self.rate), '--output', self.path],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+        # wait for py-spy to attach before running the command
+        output = []
+        for line in self.process.stdout:
+            if 'Sampling process' in line:
+                return
+            output.append(line)
+        self.process.wait()
+        err = 'Error: py-spy failed to sample the process: {}'.format(''.join(output).strip())
+        raise RuntimeError(err)
+
+    def stop(self):
+        self.process.send_signal(signal.SIGINT)
+        self.process.communicate()
+
+
+class MemoryProfiler:
+    """
+    Trace allocations with tracemalloc and report, per import phase, the peak traced
+    memory and the source lines that allocated the memory the phase kept.
+
+    Snapshots are only taken when the traced memory grew by ``growth`` since the
+    previous one, so their number stays logarithmic in the memory used. The memory is
+    attributed to the phases of the thread that checks it.
+    """
+
+    def __init__(self, top=5, growth=1.1, min_growth=1 << 20):
+        self.top = top
+        self.growth = growth
+        self.min_growth = min_growth
+        # the phase stack of each thread
+        self.local = threading.local()
+        self.peaks = collections.Counter()
+        self.sites = collections.defaultdict(collections.Counter)
+        self.snapshot = None
+        self.snapshot_size = 0
+
+    def start(self):
+        tracemalloc.start()
+        self.snapshot = self.take_snapshot()
+        phases.add_listener(self)
+
+    def stop(self):
+        self.checkpoint()
+        phases.remove_listener(self)
+        tracemalloc.stop()
+
+    def take_snapshot(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        ))
+        self.snapshot_size = tracemalloc.get_traced_memory()[0]
+        return snapshot
+
+    @property
+    def stack(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def enter(self, phase):
+        if phase.name in phases.PHASES:
+            self.checkpoint()
+            self.stack.append(phase.name)
+
+    def exit(self, phase):
+        if phase.name in phases.PHASES:
+            self.checkpoint()
+            self.stack.pop()
+
+    def checkpoint(self):
+        current, peak = tracemalloc.get_traced_memory()
+        stack = self.stack
+        names = set(stack) or {'other'}
+        for name in names:
+            self.peaks[name] = max(self.peaks[name], peak)
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        if current > max(self.snapshot_size * self.growth,
+                         self.snapshot_size + self.min_growth):
+            snapshot = self.take_snapshot()
+            name = stack[-1] if stack else 'other'
+            for diff in snapshot.compare_to(self.snapshot, 'lineno'):
+                if diff.size_diff > 0:
+                    self.sites[name][str(diff.traceback[0])] += diff.size_diff
+            self.snapshot = snapshot
+
+    def report(self, log):
+        log.info('Peak traced memory per phase:')
+        for name, peak in sorted(self.peaks.items(), key=lambda p: -p[1]):
+            log.info('  {}: {:.1f} MiB'.format(name, peak / (1 << 20)))
+            for site, size in self.sites[name].most_common(self.top):
+                log.info('    {:.1f} MiB kept by {}'.format(size / (1 << 20), site))
+
+
+class Profile:
+    """
+    Run the profilers requested on the command line between ``start`` and ``stop``.
+
+    With a ``prefix``, the threads are profiled with cProfile and their statistics written
+    to ``{prefix}.pstats``, or with ``sampler`` their stacks are sampled with py-spy and
+    written to ``{prefix}.collapsed``.
+    """
+
+    def __init__(self, prefix, memory, log, sampler=False):
+        self.prefix = prefix
+        self.log = log
+        self.profiler = None
+        if prefix and sampler:
+            self.profiler = PySpy('{}.collapsed'.format(prefix))
+        elif prefix:
+            self.profiler = ThreadProfiler()
+        self.memory = MemoryProfiler() if memory else None
+
+    def start(self):
+        if self.memory:
+            self.memory.start()
+        if self.profiler:
+            self.profiler.start()
+
+    def stop(self):
+        if isinstance(self.profiler, ThreadProfiler):
+            self.profiler.stop()
+            self.profiler.dump_stats('{}.pstats'.format(self.prefix))
+            self.log.info('Wrote {}.pstats'.format(self.prefix))
+        elif self.profiler:
+            self.profiler.stop()
+            self.log.info('Wrote {}'.format(self.profiler.path))
+        if self.memory:
+            self.memory.stop()
+            self.memory.report(self.log)
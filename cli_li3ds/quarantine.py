@@ -0,0 +1,56 @@
+"""
+Quarantine of the input files and objects that failed to import with ``--keep-going``,
+and retry of the quarantined input files with ``--retry-quarantine``.
+"""
+import json
+import threading
+
+
+# the options of the quarantine, see api.add_arguments
+ARGS = ('keep_going', 'quarantine', 'retry_quarantine')
+
+
+class Quarantine:
+
+    def __init__(self, keep_going=False, path=None, retry_path=None):
+        self.keep_going = keep_going
+        self.path = path
+        self.entries = []
+        self.lock = threading.Lock()
+        # the input files to import again, None to import them all
+        self.retry_inputs = None
+        if retry_path:
+            with open(retry_path) as f:
+                entries = json.load(f)['entries']
+            self.retry_inputs = {entry['input'] for entry in entries if entry.get('input')}
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(*(getattr(args, name, None) for name in ARGS))
+
+    def retried(self, path):
+        return self.retry_inputs is None or str(path) in self.retry_inputs
+
+    def add(self, log, error, **entry):
+        '''
+        Record an error, and what failed: the input file, import phase and object.
+        '''
+        entry['reason'] = str(error) or type(error).__name__
+        log.error('Quarantined {}: {}'.format(
+            entry.get('input') or '{} {}'.format(entry.get('type'), entry.get('key')),
+            entry['reason']))
+        with self.lock:
+            self.entries.append(entry)
+
+    def write(self, log):
+        '''
+        Write the entries, the ones of every step of a run sharing the quarantine.
+        '''
+        with self.lock:
+            if self.path and (self.entries or self.retry_inputs is not None):
+                with open(self.path, 'w') as f:
+                    json.dump({'entries': self.entries}, f, indent=2, default=str)
+            count = len(self.entries)
+        if count:
+            log.warning('{:d} input files or objects quarantined{}'.format(
+                count, ', see {}'.format(self.path) if self.path else ''))
@@ -0,0 +1,157 @@
+"""
+Retry policy of the API requests: exponential backoff with full jitter, Retry-After,
+timeouts, and a circuit breaker shared by the workers of a server.
+"""
+import time
+import random
+import threading
+import collections
+import email.utils
+
+
+RETRY_STATUSES = (429, 502, 503, 504)
+
+# verbs of the requests creating or changing objects, that are not sent again once the
+# server may have processed them, so that objects are not created or changed twice
+NON_IDEMPOTENT_VERBS = ('POST', 'PATCH')
+
+# statuses telling that the request was not processed, the only ones non-idempotent
+# requests are retried on
+NOT_PROCESSED_STATUSES = (429, 503)
+
+
+class RetryableStatus(Exception):
+    """
+    An API response whose status code is worth retrying the request for.
+    """
+
+    def __init__(self, response):
+        super().__init__('HTTP {:d}'.format(response.status_code))
+        self.response = response
+
+
+def retry_after(response):
+    """
+    Return the delay in seconds asked by the Retry-After header of ``response``, if any.
+    """
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    date = email.utils.parsedate_to_datetime(value)
+    return max(0., date.timestamp() - time.time())
+
+
+def not_sent(error):
+    """
+    Return whether ``error`` is a requests connection error raised before the request was
+    sent, when the connection could not be opened.
+    """
+    import requests
+    import urllib3
+    if not isinstance(error, requests.exceptions.ConnectionError) or not error.args:
+        return False
+    # urllib3 raises MaxRetryError with the error as its reason
+    reason = error.args[0]
+    reason = getattr(reason, 'reason', reason)
+    return isinstance(reason, urllib3.exceptions.ConnectTimeoutError)
+
+
+class CircuitBreaker:
+    """
+    Pause the requests of every worker for ``pause`` seconds when at least ``threshold``
+    of the last ``window`` requests failed.
+    """
+
+    def __init__(self, threshold=0.5, window=20, pause=5.):
+        self.threshold = threshold
+        self.pause = pause
+        self.outcomes = collections.deque(maxlen=window)
+        self.open_until = 0.
+        self.trips = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        delay = self.open_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def record(self, success, log):
+        if not self.pause:
+            return
+        with self.lock:
+            self.outcomes.append(success)
+            if len(self.outcomes) < self.outcomes.maxlen:
+                return
+            error_rate = self.outcomes.count(False) / len(self.outcomes)
+            if error_rate >= self.threshold:
+                self.trips += 1
+                self.open_until = time.monotonic() + self.pause
+                self.outcomes.clear()
+                log.warning('{:.0%} of the last {:d} requests failed, pausing requests for '
+                            '{:.1f} s'.format(error_rate, self.outcomes.maxlen, self.pause))
+
+
+class RetryPolicy:
+
+    def __init__(self, attempts=10, backoff=0.1, max_backoff=30., connect_timeout=10.,
+                 read_timeout=60., statuses=RETRY_STATUSES, breaker=None):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # requests takes None for no timeout
+        self.timeout = (connect_timeout or None, read_timeout or None)
+        self.statuses = statuses
+        self.breaker = breaker or CircuitBreaker()
+
+    @classmethod
+    def from_args(cls, args):
+        defaults = cls()
+        return cls(
+            attempts=getattr(args, 'retries', None) or defaults.attempts,
+            backoff=getattr(args, 'backoff', None) or defaults.backoff,
+            max_backoff=getattr(args, 'max_backoff', None) or defaults.max_backoff,
+            connect_timeout=getattr(args, 'connect_timeout', defaults.timeout[0]),
+            read_timeout=getattr(args, 'read_timeout', defaults.timeout[1]),
+            statuses=getattr(args, 'retry_status', None) or defaults.statuses,
+            breaker=CircuitBreaker(
+                threshold=getattr(args, 'breaker_threshold', None) or 0.5,
+                pause=getattr(args, 'breaker_pause', 5.)))
+
+    def retryable(self, verb, status):
+        if verb in NON_IDEMPOTENT_VERBS:
+            return status in self.statuses and status in NOT_PROCESSED_STATUSES
+        return status in self.statuses
+
+    def reason(self, error, verb='GET'):
+        """
+        Return why ``error`` is worth retrying the ``verb`` request for, or None. A
+        non-idempotent request is only retried if it was not sent, on a connect timeout or
+        a connection that could not be opened: the server may have processed it otherwise.
+        """
+        if isinstance(error, RetryableStatus):
+            return str(error)
+        # requests is only imported when needed, it is slow to import
+        import requests
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return 'timeout'
+        if verb in NON_IDEMPOTENT_VERBS:
+            return 'connection error' if not_sent(error) else None
+        if isinstance(error, requests.exceptions.ConnectionError):
+            return 'connection error'
+        if isinstance(error, requests.exceptions.Timeout):
+            return 'timeout'
+        if isinstance(error, requests.exceptions.ChunkedEncodingError):
+            return 'connection error'
+        return None
+
+    def delay(self, attempt, error):
+        """
+        Return the delay before the next attempt: a random delay up to the exponential
+        backoff ("full jitter"), or the delay asked by the server if longer.
+        """
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+        if isinstance(error, RetryableStatus):
+            delay = max(delay, retry_after(error.response) or 0.)
+        return delay
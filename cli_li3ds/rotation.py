@@ -0,0 +1,149 @@
+"""
+Vectorized rotation utilities.
+
+All functions work on stacked arrays: rotation matrices are ``(..., 3, 3)`` arrays, affine
+transforms are ``(..., 3, 4)`` arrays (the row-major layout of the li3ds ``mat4x3``
+parameter) and quaternions are ``(..., 4)`` arrays in ``(w, x, y, z)`` order.
+"""
+import numpy as np
+
+
+def affine(rotations, translations):
+    """
+    Assemble ``(..., 3, 4)`` affine transforms from rotations and translations.
+
+    :param rotations: ``(..., 3, 3)`` rotation matrices.
+    :param translations: ``(..., 3)`` translation vectors.
+    """
+    rotations = np.asarray(rotations, dtype=float)
+    translations = np.asarray(translations, dtype=float)
+    return np.concatenate((rotations, translations[..., np.newaxis]), axis=-1)
+
+
+def mat4x3(matrices):
+    """
+    Reshape flat ``mat4x3`` parameters (12 values each) into ``(..., 3, 4)`` arrays.
+    """
+    matrices = np.asarray(matrices, dtype=float)
+    return matrices.reshape(matrices.shape[:-1] + (3, 4))
+
+
+def invert_affine(matrices):
+    """
+    Invert rigid affine transforms, assuming their linear part is a rotation.
+
+    :param matrices: ``(..., 3, 4)`` affine transforms.
+    """
+    matrices = np.asarray(matrices, dtype=float)
+    rotations = np.swapaxes(matrices[..., :3], -1, -2)
+    translations = -np.einsum('...ij,...j->...i', rotations, matrices[..., 3])
+    return affine(rotations, translations)
+
+
+def quat_from_matrix(rotations):
+    """
+    Convert rotation matrices to unit quaternions with a non-negative ``w``.
+
+    Uses Shepperd's method: for each matrix the largest of the four quaternion components
+    is computed first to avoid cancellations.
+
+    :param rotations: ``(..., 3, 3)`` rotation matrices.
+    """
+    m = np.asarray(rotations, dtype=float)
+    m00, m01, m02 = m[..., 0, 0], m[..., 0, 1], m[..., 0, 2]
+    m10, m11, m12 = m[..., 1, 0], m[..., 1, 1], m[..., 1, 2]
+    m20, m21, m22 = m[..., 2, 0], m[..., 2, 1], m[..., 2, 2]
+
+    # candidate quaternions, each one accurate when its own pivot component is large
+    candidates = np.stack((
+        np.stack((1 + m00 + m11 + m22, m21 - m12, m02 - m20, m10 - m01), axis=-1),
+        np.stack((m21 - m12, 1 + m00 - m11 - m22, m01 + m10, m02 + m20), axis=-1),
+        np.stack((m02 - m20, m01 + m10, 1 - m00 + m11 - m22, m12 + m21), axis=-1),
+        np.stack((m10 - m01, m02 + m20, m12 + m21, 1 - m00 - m11 + m22), axis=-1),
+    ), axis=-2)
+    pivots = np.stack((m00 + m11 + m22, m00, m11, m22), axis=-1)
+    best = np.argmax(pivots, axis=-1)[..., np.newaxis, np.newaxis]
+    quats = np.take_along_axis(candidates, best, axis=-2)[..., 0, :]
+    quats /= np.linalg.norm(quats, axis=-1, keepdims=True)
+    return np.where(quats[..., :1] < 0, -quats, quats)
+
+
+def matrix_from_quat(quats):
+    """
+    Convert quaternions to rotation matrices. Quaternions are normalized first.
+
+    :param quats: ``(..., 4)`` quaternions.
+    """
+    q = np.asarray(quats, dtype=float)
+    q = q / np.linalg.norm(q, axis=-1, keepdims=True)
+    w, x, y, z = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    return np.stack((
+        np.stack((1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)), axis=-1),
+        np.stack((2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)), axis=-1),
+        np.stack((2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)), axis=-1),
+    ), axis=-2)
+
+
+def quat_multiply(q1, q2):
+    """
+    Compose quaternions (Hamilton product): the result rotates by ``q2`` then by ``q1``.
+
+    :param q1: ``(..., 4)`` quaternions.
+    :param q2: ``(..., 4)`` quaternions, broadcastable against ``q1``.
+    """
+    q1 = np.asarray(q1, dtype=float)
+    q2 = np.asarray(q2, dtype=float)
+    w1, x1, y1, z1 = q1[..., 0], q1[..., 1], q1[..., 2], q1[..., 3]
+    w2, x2, y2, z2 = q2[..., 0], q2[..., 1], q2[..., 2], q2[..., 3]
+    return np.stack((
+        w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+        w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+        w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+        w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2,
+    ), axis=-1)
+
+
+def quat_from_axis_angle(axes, radians):
+    """
+    Build quaternions from rotation axes and angles.
+
+    :param axes: ``(..., 3)`` rotation axes, normalized internally.
+    :param radians: ``(...)`` rotation angles.
+    """
+    axes = np.asarray(axes, dtype=float)
+    axes = axes / np.linalg.norm(axes, axis=-1, keepdims=True)
+    half = 0.5 * np.asarray(radians, dtype=float)
+    return np.concatenate(
+        (np.cos(half)[..., np.newaxis], np.sin(half)[..., np.newaxis] * axes), axis=-1)
+
+
+def orthonormality_error(rotations):
+    """
+    Measure how far matrices are from being rotations: the largest absolute deviation of
+    ``R.Rt`` from the identity and of ``det(R)`` from 1.
+
+    :param rotations: ``(..., 3, 3)`` matrices.
+    """
+    m = np.asarray(rotations, dtype=float)
+    gram = np.einsum('...ij,...kj->...ik', m, m) - np.eye(3)
+    error = np.abs(gram).max(axis=(-2, -1))
+    return np.maximum(error, np.abs(np.linalg.det(m) - 1))
+
+
+def matrix_from_opk(omega, phi, kappa):
+    """
+    Build rotation matrices from photogrammetric omega, phi, kappa angles (in radians),
+    as ``Rx(omega).Ry(phi).Rz(kappa)``.
+
+    :param omega: ``(...)`` rotation angles around the x axis.
+    :param phi: ``(...)`` rotation angles around the y axis.
+    :param kappa: ``(...)`` rotation angles around the z axis.
+    """
+    co, so = np.cos(omega), np.sin(omega)
+    cp, sp = np.cos(phi), np.sin(phi)
+    ck, sk = np.cos(kappa), np.sin(kappa)
+    return np.stack((
+        np.stack((cp * ck, -cp * sk, sp), axis=-1),
+        np.stack((co * sk + so * sp * ck, co * ck - so * sp * sk, -so * cp), axis=-1),
+        np.stack((so * sk - co * sp * ck, so * ck + co * sp * sk, co * cp), axis=-1),
+    ), axis=-2)
@@ -0,0 +1,226 @@
+import shlex
+import time
+import json
+import logging
+import pathlib
+import concurrent.futures
+
+from cliff.command import Command
+
+from . import api
+from . import stats
+
+
+STEP_KEYS = ('name', 'command', 'args', 'depends')
+
+
+class StepLog(logging.LoggerAdapter):
+    """
+    Prefix the messages of a step with its name.
+    """
+
+    def process(self, msg, kwargs):
+        return '[{}] {}'.format(self.extra['step'], msg), kwargs
+
+
+class Run(Command):
+    """ run the import steps of a mission manifest in one process
+    """
+
+    log = logging.getLogger(__name__)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+    def get_parser(self, prog_name):
+        self.log.debug(prog_name)
+        parser = super().get_parser(prog_name)
+        api.add_arguments(parser)
+        parser.add_argument(
+            '--jobs', '-j', type=int, default=4,
+            help='number of steps run in parallel (optional, default is 4)')
+        parser.add_argument(
+            'manifest', nargs=1,
+            help='the mission manifest, a JSON or YAML (.yaml, .yml) file')
+        return parser
+
+    def take_action(self, parsed_args):
+        """
+        Run the steps of the manifest, sharing one API server, connection pool and
+        lookup cache. A step starts once the steps it depends on succeeded.
+        """
+        steps = self.read_manifest(parsed_args.manifest[0])
+        # parse every step beforehand, to report argument errors before importing
+        for step in steps:
+            step['cmd'], step['parsed_args'] = self.get_step_command(step)
+
+        server = api.ApiServer(parsed_args, self.log)
+        server.share(parsed_args.jobs)
+        try:
+            results = self.run_steps(steps, server, parsed_args.jobs)
+        finally:
+            server.close()
+        # the quarantine shared by the steps
+        server.quarantine.write(self.log)
+
+        total = stats.Stats()
+        for step in steps:
+            result = results[step['name']]
+            if 'stats' in result:
+                total.update(result.pop('stats'))
+                self.log.info(
+                    '{name}: {status} in {elapsed:.2f} s, {summary[requests]:d} requests, '
+                    '{summary[objects]:d} objects, {cache_hits:d} cache hits'.format(
+                        name=step['name'], cache_hits=sum(
+                            t['cache_hits'] for t in result['summary']['by_type'].values()),
+                        **result))
+            else:
+                self.log.info('{}: {}'.format(step['name'], result['status']))
+
+        if parsed_args.stats:
+            with open(parsed_args.stats, 'w') as f:
+                json.dump({'steps': results, 'total': total.summary()}, f, indent=2)
+        if parsed_args.stats_prometheus:
+            total.write_prometheus(parsed_args.stats_prometheus)
+
+        failed = [name for name, result in results.items() if result['status'] != 'ok']
+        if failed:
+            err = 'Error: steps {} failed or were skipped'.format(', '.join(sorted(failed)))
+            raise RuntimeError(err)
+        self.log.info('Success!\n')
+
+    @staticmethod
+    def read_manifest(filename):
+        """
+        Read and check the manifest, return its steps.
+        """
+        path = pathlib.Path(filename)
+        with path.open() as f:
+            if path.suffix in ('.yaml', '.yml'):
+                try:
+                    import yaml
+                except ImportError:
+                    err = 'Error: PyYAML is required to read {}'.format(filename)
+                    raise RuntimeError(err)
+                manifest = yaml.safe_load(f)
+            else:
+                manifest = json.load(f)
+
+        if not isinstance(manifest, dict) or not isinstance(manifest.get('steps'), list):
+            err = 'Error: {} should have a list of steps'.format(filename)
+            raise RuntimeError(err)
+
+        steps = []
+        for step in manifest['steps']:
+            if not isinstance(step, dict) or 'command' not in step:
+                err = 'Error: step {} should have a command'.format(step)
+                raise RuntimeError(err)
+            for key in step:
+                if key not in STEP_KEYS:
+                    err = 'Error: {} is invalid in step {}'.format(key, step)
+                    raise RuntimeError(err)
+            args = step.get('args', [])
+            steps.append({
+                'name': step.get('name', step['command']),
+                'command': step['command'],
+                'args': shlex.split(args) if isinstance(args, str) else list(args),
+                'depends': list(step.get('depends', [])),
+            })
+
+        names = [step['name'] for step in steps]
+        for name in set(names):
+            if names.count(name) > 1:
+                err = 'Error: several steps are named {}, give them unique names'
+                raise RuntimeError(err.format(name))
+        for step in steps:
+            for name in step['depends']:
+                if name not in names:
+                    err = 'Error: step {} depends on unknown step {}'
+                    raise RuntimeError(err.format(step['name'], name))
+
+        # check that the dependencies have no cycle
+        depends = {step['name']: step['depends'] for step in steps}
+        done = set()
+
+        def visit(name, path):
+            if name in path:
+                err = 'Error: steps {} depend on each other'
+                raise RuntimeError(err.format(' -> '.join(path + [name])))
+            if name not in done:
+                for dependency in depends[name]:
+                    visit(dependency, path + [name])
+                done.add(name)
+
+        for name in names:
+            visit(name, [])
+        return steps
+
+    def get_step_command(self, step):
+        """
+        Return the command object and parsed arguments of a step.
+        """
+        try:
+            cmd_factory, cmd_name, args = self.app.command_manager.find_command(
+                [step['command']] + step['args'])
+        except ValueError:
+            err = 'Error: unknown command {} in step {}'
+            raise RuntimeError(err.format(step['command'], step['name']))
+        if cmd_factory is Run:
+            err = 'Error: step {} cannot run another manifest'.format(step['name'])
+            raise RuntimeError(err)
+        cmd = cmd_factory(self.app, self.app_args, cmd_name=cmd_name)
+        cmd.log = StepLog(cmd.log, {'step': step['name']})
+        parser = cmd.get_parser('{} {}'.format(self.app.NAME, cmd_name))
+        try:
+            parsed_args = parser.parse_args(args)
+        except SystemExit:
+            err = 'Error: invalid arguments in step {}'.format(step['name'])
+            raise RuntimeError(err)
+        return cmd, parsed_args
+
+    def run_steps(self, steps, server, jobs):
+        """
+        Run the steps in ``jobs`` threads, return the result of each step by name.
+        """
+        results = {}
+        pending = list(steps)
+        running = {}
+        with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+            while pending or running:
+                ready = [step for step in pending
+                         if all(name in results for name in step['depends'])]
+                for step in ready:
+                    pending.remove(step)
+                    if any(results[name]['status'] != 'ok' for name in step['depends']):
+                        self.log.error('{}: skipped, a step it depends on failed'.format(
+                            step['name']))
+                        results[step['name']] = {'status': 'skipped'}
+                    else:
+                        running[executor.submit(self.run_step, step, server)] = step
+                if not running:
+                    # only skipped steps were ready
+                    continue
+                finished, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    results[running.pop(future)['name']] = future.result()
+        return results
+
+    @staticmethod
+    def run_step(step, server):
+        cmd, parsed_args = step['cmd'], step['parsed_args']
+        view = server.view(parsed_args, cmd.log)
+        parsed_args.api_server = view
+        start = time.perf_counter()
+        try:
+            cmd.take_action(parsed_args)
+            status = 'ok'
+        except Exception as e:
+            cmd.log.exception(e)
+            status = 'failed'
+        return {
+            'status': status,
+            'elapsed': time.perf_counter() - start,
+            'summary': view.stats.summary(),
+            'stats': view.stats,
+        }
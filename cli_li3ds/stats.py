@@ -0,0 +1,181 @@
+"""
+Request-level statistics of an import: latency, status code and retries of the API
+requests per verb and object type, and the objects created or found per type.
+"""
+import os
+import json
+import math
+import time
+import collections
+
+
+# the codes logged by ApiServer.get_or_create
+CODES = {
+    '+': 'created',
+    '?': 'found',
+    '=': 'found_by_id',
+    '>': 'appended',
+    '~': 'resumed',
+}
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def quantile(values, q):
+    """
+    Return the ``q`` quantile of sorted ``values`` (nearest-rank method).
+    """
+    if not values:
+        return None
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+def latency_summary(latencies):
+    latencies = sorted(latencies)
+    summary = {'p{:g}'.format(q * 100): quantile(latencies, q) for q in QUANTILES}
+    summary['mean'] = sum(latencies) / len(latencies) if latencies else None
+    summary['max'] = latencies[-1] if latencies else None
+    return summary
+
+
+class Stats:
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.latencies = collections.defaultdict(list)
+        self.statuses = collections.defaultdict(collections.Counter)
+        self.retries = collections.Counter()
+        self.retry_reasons = collections.Counter()
+        self.codes = collections.defaultdict(collections.Counter)
+        self.cache_hits = collections.Counter()
+
+    def request(self, verb, type_, status, latency, retry=False):
+        '''
+        Record an API request, status is None if the connection failed.
+        '''
+        self.latencies[verb, type_].append(latency)
+        self.statuses[verb, type_][status] += 1
+        if retry:
+            self.retries[verb, type_] += 1
+
+    def retry(self, reason):
+        '''
+        Record a failed request attempt, with the reason it is retried for.
+        '''
+        self.retry_reasons[reason] += 1
+
+    def code(self, type_, code):
+        self.codes[type_][code] += 1
+
+    def cache_hit(self, type_):
+        '''
+        Record an object already published in this run, and therefore not requested.
+        '''
+        self.cache_hits[type_] += 1
+
+    def update(self, other):
+        '''
+        Add the requests and objects recorded by ``other``, e.g. by a step of li3ds run.
+        '''
+        self.start = min(self.start, other.start)
+        for key, latencies in other.latencies.items():
+            self.latencies[key].extend(latencies)
+        for key, statuses in other.statuses.items():
+            self.statuses[key].update(statuses)
+        self.retries.update(other.retries)
+        self.retry_reasons.update(other.retry_reasons)
+        for type_, codes in other.codes.items():
+            self.codes[type_].update(codes)
+        self.cache_hits.update(other.cache_hits)
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.start
+        requests = sum(len(latencies) for latencies in self.latencies.values())
+        objects = sum(sum(codes.values()) for codes in self.codes.values())
+        by_request = []
+        for (verb, type_), latencies in sorted(self.latencies.items()):
+            by_request.append({
+                'verb': verb,
+                'type': type_,
+                'count': len(latencies),
+                'retries': self.retries[verb, type_],
+                'status': {str(status or 'error'): count
+                           for status, count in self.statuses[verb, type_].items()},
+                'time': sum(latencies),
+                'latency': latency_summary(latencies),
+            })
+        by_type = {}
+        for type_ in sorted(set(self.codes) | set(self.cache_hits)):
+            by_type[type_] = {name: self.codes[type_][code] for code, name in CODES.items()}
+            by_type[type_]['cache_hits'] = self.cache_hits[type_]
+        return {
+            'elapsed': elapsed,
+            'requests': requests,
+            'requests_per_second': requests / elapsed if elapsed else None,
+            'retries': sum(self.retries.values()),
+            'retry_reasons': dict(self.retry_reasons),
+            'objects': objects,
+            'objects_per_second': objects / elapsed if elapsed else None,
+            'latency': latency_summary(
+                [latency for latencies in self.latencies.values() for latency in latencies]),
+            'by_request': by_request,
+            'by_type': by_type,
+        }
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def write_prometheus(self, path):
+        '''
+        Write the statistics in the Prometheus text format, for the node exporter
+        textfile collector. The file is replaced atomically.
+        '''
+        lines = [
+            '# HELP li3ds_requests_total API requests by verb, object type and status.',
+            '# TYPE li3ds_requests_total counter',
+        ]
+        for (verb, type_), statuses in sorted(self.statuses.items()):
+            for status, count in sorted(statuses.items(), key=lambda s: str(s[0])):
+                lines.append('li3ds_requests_total{{verb="{}",type="{}",status="{}"}} {:d}'
+                             .format(verb, type_, status or 'error', count))
+        lines += [
+            '# HELP li3ds_request_retries_total API requests retried after an error.',
+            '# TYPE li3ds_request_retries_total counter',
+        ]
+        for (verb, type_), count in sorted(self.retries.items()):
+            lines.append('li3ds_request_retries_total{{verb="{}",type="{}"}} {:d}'
+                         .format(verb, type_, count))
+        lines += [
+            '# HELP li3ds_request_duration_seconds API request latency.',
+            '# TYPE li3ds_request_duration_seconds summary',
+        ]
+        for (verb, type_), latencies in sorted(self.latencies.items()):
+            labels = 'verb="{}",type="{}"'.format(verb, type_)
+            latencies = sorted(latencies)
+            for q in QUANTILES:
+                lines.append('li3ds_request_duration_seconds{{{},quantile="{:g}"}} {:.6f}'
+                             .format(labels, q, quantile(latencies, q)))
+            lines.append('li3ds_request_duration_seconds_sum{{{}}} {:.6f}'
+                         .format(labels, sum(latencies)))
+            lines.append('li3ds_request_duration_seconds_count{{{}}} {:d}'
+                         .format(labels, len(latencies)))
+        lines += [
+            '# HELP li3ds_objects_total Objects by type and get-or-create result.',
+            '# TYPE li3ds_objects_total counter',
+        ]
+        for type_, codes in sorted(self.codes.items()):
+            for code, count in sorted(codes.items()):
+                lines.append('li3ds_objects_total{{type="{}",result="{}"}} {:d}'
+                             .format(type_, CODES.get(code, code), count))
+        lines += [
+            '# HELP li3ds_cache_hits_total Objects already published in this run.',
+            '# TYPE li3ds_cache_hits_total counter',
+        ]
+        for type_, count in sorted(self.cache_hits.items()):
+            lines.append('li3ds_cache_hits_total{{type="{}"}} {:d}'.format(type_, count))
+
+        tmp_path = '{}.tmp'.format(path)
+        with open(tmp_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, path)
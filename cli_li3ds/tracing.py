@@ -0,0 +1,65 @@
+"""
+Record the phases and spans of a command as Chrome trace events, viewable in
+chrome://tracing or https://ui.perfetto.dev.
+
+This module is only imported when ``--trace`` is given.
+"""
+import os
+import json
+import time
+import threading
+
+from . import phases
+
+
+class Tracer:
+
+    def __init__(self):
+        self.events = []
+        self.threads = {}
+        self.pid = os.getpid()
+        self.start_time = None
+
+    def timestamp(self):
+        # microseconds since the start of the trace
+        return (time.perf_counter() - self.start_time) * 1e6
+
+    def event(self, phase_type, name, category, args):
+        thread = threading.current_thread()
+        self.threads.setdefault(thread.ident, thread.name)
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': phase_type,
+            'ts': self.timestamp(),
+            'pid': self.pid,
+            'tid': thread.ident,
+        }
+        if args:
+            event['args'] = dict(args)
+        # list.append is atomic, so threads can share the event list
+        self.events.append(event)
+
+    def enter(self, phase):
+        self.event('B', phase.name, phase.category, phase.args)
+
+    def exit(self, phase):
+        self.event('E', phase.name, phase.category, phase.args)
+
+    def start(self, name):
+        self.start_time = time.perf_counter()
+        phases.add_listener(self)
+        self.event('B', name, 'command', None)
+
+    def stop(self, name):
+        self.event('E', name, 'command', None)
+        phases.remove_listener(self)
+
+    def write(self, path):
+        metadata = [{
+            'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': ident,
+            'args': {'name': name},
+        } for ident, name in self.threads.items()]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': metadata + self.events, 'displayTimeUnit': 'ms'}, f,
+                      default=str)
@@ -1,9 +1,12 @@
-import xml.etree.ElementTree
 import datetime
 
+from . import phases
+
 
 def root(filename, name):
-    tree = xml.etree.ElementTree.parse(filename)
+    import xml.etree.ElementTree
+    with phases.phase(phases.PARSING):
+        tree = xml.etree.ElementTree.parse(filename)
     root_node = tree.getroot()
     if root_node.tag != name:
         err = 'Error: root tag differs from "{}" in XML file "{}"' \
@@ -0,0 +1,52 @@
+import logging
+import argparse
+
+import pytest
+
+from cli_li3ds import api
+
+# pytest adds the repository root to sys.path for this file, the tests can import the
+# benchmarks package
+from benchmarks.stubserver import StubServer
+
+
+@pytest.fixture
+def stub():
+    '''
+    A local stub of the li3ds API.
+    '''
+    with StubServer() as stub:
+        yield stub
+
+
+@pytest.fixture
+def make_server(request):
+    '''
+    A factory of API servers, whose keyword arguments override the command line options.
+    The servers use the stub unless given an ``api_url``, None for the staging mode.
+    '''
+    def make_server(**options):
+        if 'api_url' not in options:
+            options['api_url'] = request.getfixturevalue('stub').url
+        args = dict({'api_key': 'key', 'no_proxy': True, 'indent': None}, **options)
+        return api.ApiServer(argparse.Namespace(**args), logging.getLogger(request.node.name))
+
+    return make_server
+
+
+@pytest.fixture
+def make_transfo():
+    '''
+    A factory of transfos, between the ``source`` and ``target`` referentials of a
+    ``sensor`` unless given.
+    '''
+    def make_transfo(parameters=(), source=None, target=None, name='transfo',
+                     type_name='affine_quat', func_signature=('quat', 'vec3')):
+        if source is None or target is None:
+            sensor = api.Sensor(name='sensor')
+            source = api.Referential(name='source', sensor=sensor)
+            target = api.Referential(name='target', sensor=sensor)
+        return api.Transfo(name=name, source=source, target=target, type_name=type_name,
+                           func_signature=list(func_signature), parameters=list(parameters))
+
+    return make_transfo
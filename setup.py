@@ -10,7 +10,7 @@ requirements = (
     'cliff==2.6.0',
     'requests==2.13.0',
     'pytz==2017.2',
-    'pyquaternion==0.9.0',
+    'numpy==1.15.0',
     'python-dateutil==2.6.0'
 )
 
@@ -21,6 +21,10 @@ dev_requirements = (
 doc_requirements = (
 )
 
+yaml_requirements = (
+    'PyYAML',
+)
+
 prod_requirements = (
 )
 
@@ -62,7 +66,8 @@ setup(
     extras_require={
         'dev': dev_requirements,
         'prod': prod_requirements,
-        'doc': doc_requirements
+        'doc': doc_requirements,
+        'yaml': yaml_requirements
     },
     entry_points={
         'console_scripts': [
@@ -72,12 +77,16 @@ setup(
             'import-extcalib = cli_li3ds.import_extcalib:ImportExtCalib',
             'import-autocal = cli_li3ds.import_autocal:ImportAutocal',
             'import-ori = cli_li3ds.import_ori:ImportOri',
+            'import-ori-export = cli_li3ds.import_ori_export:ImportOriExport',
             'import-orimatis = cli_li3ds.import_orimatis:ImportOrimatis',
             'import-image = cli_li3ds.import_image:ImportImage',
             'import-sbet= cli_li3ds.import_sbet:ImportSbet',
             'import-ept = cli_li3ds.import_ept:ImportEpt',
             'import-platform = cli_li3ds.import_platform:ImportPlatform',
             'import-json = cli_li3ds.import_json:ImportJson',
+            'export-json = cli_li3ds.export_json:ExportJson',
+            'run = cli_li3ds.run:Run',
+            'apply = cli_li3ds.apply:Apply',
         ]
     }
 )
@@ -41,4 +41,6 @@ li3ds import-ori      $li3dsARGS $@ data/OriFrancesco.xml
 li3ds import-ori      $li3dsARGS $@ data/TestOri-1.xml
 li3ds import-ori      $li3dsARGS $@ data/TestOri-2.xml
 
+li3ds import-ori-export $li3dsARGS $@ -c blocA --start-time 2016-12-05T10:00:00 -f data 'blocA_ori-export_*.txt'
+
 li3ds import-json     $li3dsARGS $@ data/2017_17FA7506_C_6.json --uri 'file://{uri}.JP2'
@@ -19,12 +19,8 @@ def apiobj(scope='module'):
 
 
 @pytest.fixture
-def transfo(scope='module'):
-    sensor = api.Sensor(name='sensor')
-    source = api.Referential(name='source', sensor=sensor)
-    target = api.Referential(name='target', sensor=sensor)
-    return api.Transfo(name='transfo', source=source, target=target,
-                       type_name='transfo_type', func_signature=[], parameters=[])
+def transfo(make_transfo, scope='module'):
+    return make_transfo(type_name='transfo_type', func_signature=[])
 
 
 def test_apiobj(apiobj):
@@ -52,22 +48,20 @@ def test_eq_simple():
     assert sensor1 == sensor2
 
 
-def test_eq_complex():
+def test_eq_complex(make_transfo):
 
     # create transfo tree 1
     sen1 = api.Sensor(name='sen')
     src1 = api.Referential(name='src', sensor=sen1)
     tgt1 = api.Referential(name='dst', sensor=sen1)
-    tra1 = api.Transfo(name='tra', source=src1, target=tgt1,
-                       type_name='transfo_type', func_signature=[], parameters=[])
+    tra1 = make_transfo([], src1, tgt1, 'tra', 'transfo_type', [])
     ttr1 = api.Transfotree(transfos=[tra1], name='ttr')
 
     # create transfo tree 2
     sen2 = api.Sensor(name='sen')
     src2 = api.Referential(name='src', sensor=sen2)
     tgt2 = api.Referential(name='dst', sensor=sen2)
-    tra2 = api.Transfo(name='tra', source=src2, target=tgt2,
-                       type_name='transfo_type', func_signature=[], parameters=[])
+    tra2 = make_transfo([], src2, tgt2, 'tra', 'transfo_type', [])
     ttr2 = api.Transfotree(transfos=[tra2], name='ttr')
 
     assert ttr1 == ttr2
@@ -90,3 +84,66 @@ def test_lookup_deeper(transfo):
     assert res is not None
     assert res.type_ == 'sensor'
     assert res.obj['name'] == 'sensor'
+
+
+def test_append_parameters(make_server, make_transfo):
+    server = make_server(api_url=None)
+    sensor = api.Sensor(name='sensor')
+    source = api.Referential(name='source', sensor=sensor)
+    target = api.Referential(name='target', sensor=sensor)
+
+    def transfo(times):
+        return make_transfo([{'quat': [1, 0, 0, 0], 'vec3': [t, 0, 0],
+                              '_time': '2017-01-0{}T00:00:00+00:00'.format(t)}
+                             for t in times], source, target)
+
+    objs = api.ApiObjs(server)
+    objs.add(transfo([1, 2]))
+    objs.get_or_create()
+
+    with pytest.raises(RuntimeError):
+        objs = api.ApiObjs(server)
+        objs.add(transfo([2, 3]))
+        objs.get_or_create()
+
+    appended = transfo([2, 3])
+    appended.append = True
+    objs = api.ApiObjs(server)
+    objs.add(appended)
+    objs.get_or_create()
+
+    staged, = server.staging['transfo']
+    assert [p['vec3'][0] for p in staged['parameters']] == [1, 2, 3]
+    assert staged['validity_start'] == '2017-01-01T00:00:00+00:00'
+    assert staged['validity_end'] == '2017-01-03T00:00:00+00:00'
+
+
+def test_update_obj():
+    args = {'sensor': {'prefix': 'p_', 'id': None}}
+    metadata = {'basename': 'file', 'num': 3, 'time': None}
+    sensor = {'name': '{num:02d}', 'serial': '{time}', 'type': 'camera', 'brand': '{{x}}'}
+    api.update_obj(args, metadata, sensor, 'sensor')
+    # values referring to None metadata are left out
+    assert sensor == {'name': '03', 'type': 'camera', 'brand': '{x}',
+                      'description': 'Imported from "file"', 'prefix': 'p_'}
+
+    with pytest.raises(KeyError):
+        api.update_obj(args, metadata, {'name': '{missing}'}, 'sensor')
+
+
+def test_compile_template():
+    template = api.compile_template(None, {'uri': '{path}'}, 'datasource')
+    assert api.compile_template(None, {'uri': '{path}'}, 'datasource') is template
+    assert [template.apply(row) for row in ({'path': 'a'}, {'path': None})] == [{'uri': 'a'}, {}]
+
+
+def test_intern(make_server):
+    objs = api.ApiObjs(make_server(api_url=None))
+    sensor = objs.intern(api.Sensor(name='camera', type='camera', description='file 1'))
+    assert objs.intern(api.Sensor(name='camera', description='file 2')) is sensor
+    referential = objs.intern(api.Referential(api.Sensor(name='camera'), name='image'))
+    assert objs.intern(api.Referential(sensor, name='image')) is referential
+    assert objs.intern(api.Referential(api.Sensor(name='other'), name='image')) is not referential
+
+    with pytest.raises(RuntimeError):
+        objs.intern(api.Sensor(name='camera', type='lidar'))
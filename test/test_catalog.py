@@ -0,0 +1,44 @@
+import pytest
+
+from cli_li3ds import api
+
+
+def transfos(make_transfo, sensor, count, func_signature):
+    source = api.Referential(sensor, name='source')
+    return [make_transfo([], source, api.Referential(sensor, name='target{:d}'.format(i)),
+                         func_signature=func_signature)
+            for i in range(count)]
+
+
+def test_transfo_types(stub, make_server, make_transfo):
+    server = make_server()
+    sensor = api.Sensor(name='camera', type='camera')
+    objs = api.ApiObjs(server)
+    objs.add(*transfos(make_transfo, sensor, 3, ['quat', 'vec3']))
+    objs.get_or_create()
+    assert len(stub.collections['transfos/types']) == 1
+    # the sensor, 4 referentials, the catalog and 3 transfos
+    assert stub.counts['GET'] == 1 + 4 + 1 + 3
+    types = [obj.objs['transfo_type'] for obj in objs.objs]
+    assert all(t.obj is types[0].obj for t in types)
+
+    # a new run fetches the catalog once
+    stub.counts.clear()
+    objs = api.ApiObjs(make_server())
+    objs.add(*transfos(make_transfo, sensor, 3, ['quat', 'vec3']))
+    objs.get_or_create()
+    # 4 referentials, the catalog and 3 transfos, the sensor is published already
+    assert stub.counts['GET'] == 4 + 1 + 3
+    assert stub.counts['POST'] == 0
+
+
+def test_transfo_type_mismatch(make_server, make_transfo):
+    sensor = api.Sensor(name='camera', type='camera')
+    objs = api.ApiObjs(make_server())
+    objs.add(*transfos(make_transfo, sensor, 1, ['quat', 'vec3']))
+    objs.get_or_create()
+
+    objs = api.ApiObjs(make_server())
+    objs.add(*transfos(make_transfo, sensor, 1, ['mat3x4']))
+    with pytest.raises(RuntimeError):
+        objs.get_or_create()
@@ -0,0 +1,88 @@
+import json
+import concurrent.futures
+
+from cli_li3ds import api
+from cli_li3ds import export_json
+
+
+def make_snapshot():
+    snapshot = {typ: [] for typ in export_json.COLLECTIONS}
+    snapshot['sensor'] = [{'id': 1, 'name': 'camera'}]
+    snapshot['referential'] = [{'id': i, 'name': 'ref{:d}'.format(i), 'sensor': 1}
+                               for i in (1, 2, 3)]
+    snapshot['transfos/type'] = [{'id': 1, 'name': 'affine'},
+                                 {'id': 2, 'name': 'affine_inverse'}]
+    snapshot['transfo'] = [
+        {'id': 1, 'name': 't', 'source': 1, 'target': 2, 'transfo_type': 1},
+        {'id': 2, 'name': 't_inverse', 'source': 2, 'target': 1, 'transfo_type': 2},
+    ]
+    snapshot['transfotree'] = [{'id': 1, 'name': 'tree', 'transfos': [2]}]
+    snapshot['platform'] = [{'id': 1, 'name': 'platform'}, {'id': 2, 'name': 'other'}]
+    snapshot[export_json.CONFIG] = [
+        {'id': 1, 'name': 'config', 'platform': 1, 'transfo_trees': [1]},
+        {'id': 2, 'name': 'other', 'platform': 2, 'transfo_trees': []},
+    ]
+    snapshot['project'] = [{'id': 1, 'name': 'p1'}, {'id': 2, 'name': 'p2'}]
+    snapshot['session'] = [{'id': 1, 'name': 's1', 'project': 1, 'platform': 1},
+                           {'id': 2, 'name': 's2', 'project': 2, 'platform': 2}]
+    snapshot['datasource'] = [{'id': 1, 'uri': 'a', 'session': 1, 'referential': 3},
+                              {'id': 2, 'uri': 'b', 'session': 2, 'referential': 3}]
+    return snapshot
+
+
+def ids(snapshot):
+    return {typ: [o['id'] for o in objs] for typ, objs in snapshot.items()}
+
+
+def test_select_project():
+    selected = ids(export_json.select(make_snapshot(), projects=['p1']))
+    assert selected == {
+        'sensor': [1], 'referential': [1, 2, 3], 'transfos/type': [2], 'transfo': [2],
+        'transfotree': [1], 'platform': [1], export_json.CONFIG: [1], 'project': [1],
+        'session': [1], 'datasource': [1],
+    }
+    selected = ids(export_json.select(make_snapshot(), sessions=['s2']))
+    assert selected['project'] == [2] and selected['transfo'] == []
+
+
+def test_skip_inverses():
+    snapshot = export_json.skip_inverses(make_snapshot())
+    assert ids(snapshot)['transfo'] == [1]
+    assert ids(snapshot)['transfos/type'] == [1]
+    assert snapshot['transfotree'][0]['transfos'] == [1]
+
+    # an inverse type used by an exported transfo is kept
+    snapshot = make_snapshot()
+    snapshot['transfo'][0]['transfo_type'] = 2
+    assert ids(export_json.skip_inverses(snapshot))['transfos/type'] == [1, 2]
+
+
+def test_export(stub, make_server, tmpdir):
+    server = make_server()
+    sensor = api.Sensor(name='camera', type='camera')
+    platform = api.Platform(name='platform')
+    objs = api.ApiObjs(server)
+    objs.add(api.Referential(sensor, name='ref'), api.Config(platform, [], name='config'))
+    objs.get_or_create()
+
+    objs.add(api.Datasource(api.Session(api.Project(name='project'), platform, name='s'),
+                            objs.objs[0], uri='a'))
+    objs.get_or_create()
+
+    stub.counts.clear()
+    server.share(2)
+    directory = str(tmpdir.mkdir('parts'))
+    with server.session() as session, concurrent.futures.ThreadPoolExecutor(2) as executor:
+        index = export_json.fetch(server, session, executor, directory, export_json.INDEXED)
+    assert stub.counts['GET'] == len(export_json.COLLECTIONS)
+    # the datasources are not kept in memory
+    assert sorted(index) == sorted(export_json.INDEXED)
+
+    path = str(tmpdir.join('snapshot.json'))
+    counts = export_json.write(path, directory, index, export_json.skip_inverses(index))
+    with open(path) as f:
+        written = json.load(f)
+    assert list(written) == list(export_json.COLLECTIONS)
+    assert written['referential'] == [{'id': 1, 'name': 'ref', 'sensor': 1}]
+    assert written[export_json.CONFIG][0]['platform'] == 1
+    assert counts['datasource'] == 1 and written['datasource'][0]['uri'] == 'a'
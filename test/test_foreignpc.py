@@ -0,0 +1,22 @@
+import logging
+
+import pytest
+
+from cli_li3ds import foreignpc
+
+
+def test_check_driver(stub, make_server):
+    server = make_server()
+    log = logging.getLogger(__name__)
+    stub.collections['foreignpc/drivers'] = [{'name': 'fdwli3ds.Sbet'}]
+    with pytest.raises(RuntimeError, match='does not provide the fdwli3ds.Csv driver'):
+        foreignpc.check_driver(server, foreignpc.CSV_DRIVER, log)
+    stub.collections['foreignpc/drivers'].append({'name': foreignpc.CSV_DRIVER})
+    foreignpc.check_driver(server, foreignpc.CSV_DRIVER, log)
+
+
+def test_drivers_not_listed(make_server, monkeypatch, caplog):
+    server = make_server()
+    monkeypatch.setattr(server, 'get', lambda session, typ, url: (404, None, None))
+    foreignpc.check_driver(server, foreignpc.CSV_DRIVER, logging.getLogger(__name__))
+    assert 'must be installed' in caplog.text
@@ -0,0 +1,66 @@
+from cli_li3ds import api
+
+
+def test_not_modified(stub, make_server):
+    server = make_server()
+    with server.session() as session:
+        server.create_object(session, 'sensor', {'name': 'camera'}, {})
+        objs = server.get_objects(session, 'sensor', {})
+        objs[0]['name'] = 'changed'
+        # a copy of the cached body, without the changes of the caller
+        assert server.get_objects(session, 'sensor', {})[0]['name'] == 'camera'
+        assert stub.not_modified == 1
+        assert server.get_object_by_dict(session, 'sensor', {'name': 'camera'}, {})
+        # the collection changed, the new one is downloaded
+        server.create_object(session, 'sensor', {'name': 'lidar'}, {})
+        assert len(server.get_objects(session, 'sensor', {})) == 2
+    assert stub.not_modified == 1
+    statuses = server.stats.statuses['GET', 'sensor']
+    assert statuses == {200: 3, 304: 1}
+
+
+def test_http_cache_size(stub, make_server, monkeypatch):
+    monkeypatch.setattr(api, 'HTTP_CACHE_SIZE', 2)
+    server = make_server()
+    with server.session() as session:
+        for typ in ('sensor', 'platform', 'sensor', 'project'):
+            server.get_objects(session, typ, {})
+        # lookups are not cached
+        server.get_object_by_name(session, 'sensor', 'camera', {})
+    assert [url.split('/')[-2] for url in server.http_cache] == ['sensors', 'projects']
+    assert stub.not_modified == 1
+
+
+def test_no_http_cache(stub, make_server):
+    server = make_server(no_http_cache=True)
+    with server.session() as session:
+        server.get_objects(session, 'sensor', {})
+        server.get_objects(session, 'sensor', {})
+    assert stub.not_modified == 0
+    assert server.stats.statuses['GET', 'sensor'] == {200: 2}
+
+
+def test_pagination(stub, make_server):
+    stub.page_size = 2
+    server = make_server()
+    with server.session() as session:
+        for name in ('a', 'b', 'c', 'd', 'e'):
+            server.create_object(session, 'sensor', {'name': name, 'type': 'camera'}, {})
+        assert [o['name'] for o in server.get_objects(session, 'sensor', {})] == list('abcde')
+        found = server.get_object_by_dict(session, 'sensor', {'type': 'camera'}, {})
+        assert found['name'] == 'a'
+        assert server.get_object_by_name(session, 'sensor', 'e', {})['id'] == 5
+        assert server.get_object_by_name(session, 'sensor', 'f', {}) is None
+
+
+def test_streamed_lookup(stub, make_server, monkeypatch):
+    monkeypatch.setattr(api, 'STREAM_SIZE', 0)
+    server = make_server()
+    with server.session() as session:
+        for name in ('a', 'b'):
+            server.create_object(session, 'sensor', {'name': name, 'type': 'camera'}, {})
+        assert server.get_object_by_dict(session, 'sensor', {'type': 'camera'}, {})['id'] == 1
+        # streamed responses are not cached
+        server.get_object_by_dict(session, 'sensor', {'type': 'camera'}, {})
+        assert stub.not_modified == 0
+        assert server.get_object_by_name(session, 'sensor', 'b', {})['id'] == 2
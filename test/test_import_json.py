@@ -0,0 +1,95 @@
+import json
+import pathlib
+
+from cli_li3ds import api
+from cli_li3ds import main
+from cli_li3ds.import_json import ImportJson, iter_sections, read_sections
+
+
+def import_bundle(make_server, path):
+    objs = api.ApiObjs(make_server(api_url=None))
+    ImportJson.handle_bundle(objs, iter_sections(path), '{uri}')
+    return objs
+
+
+def test_sections_out_of_order(tmpdir, make_server):
+    bundle = {
+        'session': [{'id': 3, 'name': 'session', 'project': 2, 'platform': 1}],
+        'referential': [{'id': 5, 'name': 'ref', 'sensor': 4}],
+        'datasource': [{'id': 6, 'uri': 'a', 'session': 3, 'referential': 5}],
+        'sensor': [{'id': 4, 'name': 'camera', 'type': 'camera'}],
+        'platform': [{'id': 1, 'name': 'platform'}],
+        'project': [{'id': 2, 'name': 'project'}],
+        'other': [{'id': 1}],
+    }
+    path = tmpdir.join('bundle.json')
+    path.write(json.dumps(bundle))
+    objs = import_bundle(make_server, pathlib.Path(str(path)))
+    # mapped in dependency order, missing sections are empty
+    assert [obj.type_ for obj in objs.objs] == [
+        'sensor', 'referential', 'platform', 'project', 'session', 'datasource']
+    datasource = objs.objs[-1]
+    assert datasource.objs['session'] is objs.objs[4]
+    assert datasource.objs['referential'] is objs.objs[1]
+
+
+def test_merge_bundles(tmpdir, caplog, make_server):
+    def write_bundle(name, description):
+        path = tmpdir.join(name)
+        path.write(json.dumps({
+            'sensor': [{'id': 1, 'name': 'camera', 'type': 'camera',
+                        'description': description}],
+            'referential': [{'id': 2, 'name': name, 'sensor': 1}],
+        }))
+        return pathlib.Path(str(path))
+
+    paths = [write_bundle('day1', 'camera'), write_bundle('day2', 'camera'),
+             write_bundle('day3', 'other')]
+    command = ImportJson(None, None)
+    objs = api.ApiObjs(make_server(api_url=None))
+    registry = {}
+    for path in paths:
+        command.merge_bundle(objs, registry, import_bundle(make_server, path).objs, path)
+
+    sensor = objs.objs[0]
+    assert [obj.type_ for obj in objs.objs] == ['sensor'] + ['referential'] * 3
+    assert all(obj.objs['sensor'] is sensor for obj in objs.objs[1:])
+    assert 'Conflicting sensor [camera] in {}'.format(paths[2]) in caplog.text
+
+
+def test_large_transfo(tmpdir, monkeypatch, make_server):
+    parameters = [{'vec3': [i, 0.5, -1e3], '_time': 'caméra'} for i in range(1000)]
+    bundle = {
+        'sensor': [{'id': 1, 'name': 'camera', 'type': 'camera'}],
+        'referential': [{'id': 2, 'name': 'a', 'sensor': 1}, {'id': 3, 'name': 'b', 'sensor': 1}],
+        'transfos/type': [{'id': 4, 'name': 'affine', 'func_signature': ['vec3', '_time']}],
+        'transfo': [{'id': 5, 'name': 't', 'source': 2, 'target': 3, 'transfo_type': 4,
+                     'parameters': parameters}],
+    }
+    path = tmpdir.join('bundle.json')
+    path.write_binary(json.dumps(bundle, ensure_ascii=False).encode('iso-8859-1'))
+    # the transfo spans hundreds of chunks
+    monkeypatch.setattr('cli_li3ds.import_json.CHUNK_SIZE', 128)
+    objs = import_bundle(make_server, pathlib.Path(str(path)))
+    transfo = next(obj for obj in objs.objs if obj.type_ == 'transfo')
+    assert transfo.obj['parameters'] == parameters
+
+
+def test_import_bundles(tmpdir, stub):
+    for day in ('day1', 'day2', 'day3'):
+        tmpdir.join(day + '.json').write(json.dumps({
+            'referential': [{'id': 2, 'name': day, 'sensor': 1}],
+            'sensor': [{'id': 1, 'name': 'camera', 'type': 'camera'}],
+        }))
+    assert read_sections(pathlib.Path(str(tmpdir.join('day1.json')))) == [
+        ('referential', [{'id': 2, 'name': 'day1', 'sensor': 1}]),
+        ('sensor', [{'id': 1, 'name': 'camera', 'type': 'camera'}])]
+
+    # the bundles are decoded by worker processes, and merged by this one
+    command = ImportJson(main.Li3ds(), None)
+    command.take_action(command.get_parser('li3ds import-json').parse_args(
+        ['-u', stub.url, '-k', 'key', '--no-proxy', '--jobs', '2', '--json-dir', str(tmpdir),
+         'day*.json']))
+    assert [obj['name'] for obj in stub.collections['sensors']] == ['camera']
+    assert sorted(obj['name'] for obj in stub.collections['referentials']) == [
+        'day1', 'day2', 'day3']
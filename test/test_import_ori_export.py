@@ -0,0 +1,53 @@
+import pathlib
+
+import pytest
+
+from cli_li3ds import api
+from cli_li3ds import import_ori_export
+
+
+def test_read_chunks(tmpdir):
+    path = tmpdir.join('blocA_ori-export_023.txt')
+    path.write('#F=N W P K X Y Z\n'
+               'img1.tif 1 2 3 4 5 6\n'
+               '\n'
+               'img2.tif -1 -2 -3 -4 -5 -6\n'
+               'img3.tif 0 0 0 1e3 2e3 3e3')
+    chunks = list(import_ori_export.read_chunks(pathlib.Path(str(path)), 8))
+    names = [name for chunk_names, _ in chunks for name in chunk_names]
+    assert names == ['img1.tif', 'img2.tif', 'img3.tif']
+    assert chunks[-1][1].tolist() == [[0, 0, 0, 1000, 2000, 3000]]
+
+
+@pytest.mark.parametrize('header, line', [('', 2), ('#F=N W P K X Y Z\n\n', 4)])
+def test_read_chunks_bad_line(tmpdir, header, line):
+    path = tmpdir.join('blocA_ori-export_023.txt')
+    path.write(header +
+               'img1.tif 1 2 3 4 5 6\n'
+               'img2.tif 1 2 3 4 5\n')
+    with pytest.raises(RuntimeError) as excinfo:
+        list(import_ori_export.read_chunks(pathlib.Path(str(path)), 1024))
+    assert 'near line {:d}:'.format(line) in str(excinfo.value)
+
+
+def test_datasources_published_by_chunk(stub, tmpdir, monkeypatch):
+    tmpdir.join('blocA_ori-export_023.txt').write(''.join(
+        'img{:d}.tif 0 0 0 {:d} 0 0\n'.format(i, i) for i in range(10)))
+    command = import_ori_export.ImportOriExport(None, None)
+    parsed_args = command.get_parser('li3ds import-ori-export').parse_args([
+        '-u', stub.url, '-k', 'key', '--no-proxy', '-c', 'project', '-f', str(tmpdir),
+        '--start-time', '2016-01-01', '--chunk-size', '64', '*.txt'])
+    # the numbers of objects published at once
+    published = []
+    get_or_create = api.ApiObjs.get_or_create
+
+    def counted(objs):
+        published.append(len(objs.objs))
+        return get_or_create(objs)
+
+    monkeypatch.setattr(api.ApiObjs, 'get_or_create', counted)
+    command.take_action(parsed_args)
+    # the datasources of each chunk, then the transfotree
+    assert published == [4, 4, 2, 1]
+    assert len(stub.collections['datasources']) == 10
+    assert len(stub.collections['transfos'][0]['parameters']) == 10
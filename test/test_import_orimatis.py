@@ -0,0 +1,63 @@
+import logging
+import pathlib
+
+from cli_li3ds import api
+from cli_li3ds.import_orimatis import ImportOrimatis, matr_to_quat
+
+
+def test_matr_to_quat(make_server, make_transfo):
+    sensor = api.Sensor(name='camera')
+    source = api.Referential(sensor, name='world')
+    target = api.Referential(sensor, name='camera')
+    quat = make_transfo([{'quat': [1, 0, 0, 0], 'vec3': [1, 2, 3], '_time': 't1'}],
+                        source, target, 'camera#quaternion',
+                        func_signature=['quat', 'vec3', '_time'])
+    matr = make_transfo([{'mat4x3': [1, 0, 0, 4, 0, 1, 0, 5, 0, 0, 1, 6], '_time': t}
+                         for t in ('t1', 't2')],
+                        source, target, 'camera#mat3d', 'affine_mat4x3', ['mat4x3', '_time'])
+    objs = api.ApiObjs(make_server(api_url=None))
+    tree1 = api.Transfotree([quat], name='tree1')
+    tree2 = api.Transfotree([matr], name='tree2')
+    objs.add(tree1, tree2)
+
+    transfos = matr_to_quat(objs, [quat, api.noobj, matr], 1e-4, logging.getLogger(__name__))
+    assert transfos == [quat]
+    assert tree2.arrays['transfos'][0] is quat
+    # the parameters of the quaternion transfo prevail
+    assert [(p['_time'], p['vec3']) for p in quat.obj['parameters']] == [
+        ('t1', [1, 2, 3]), ('t2', [4.0, 5.0, 6.0])]
+
+
+def test_matr_to_quat_conflict(make_server, make_transfo, caplog):
+    sensor = api.Sensor(name='camera')
+    source = api.Referential(sensor, name='world')
+    target = api.Referential(sensor, name='camera')
+    quat = make_transfo([{'quat': [1, 0, 0, 0], 'vec3': [4, 5, 6], '_time': t}
+                         for t in ('t1', 't2')],
+                        source, target, 'camera#quaternion',
+                        func_signature=['quat', 'vec3', '_time'])
+    # a rotation of 90 degrees around z at t1, the same pose at t2
+    matr = make_transfo([{'mat4x3': [0, -1, 0, 4, 1, 0, 0, 5, 0, 0, 1, 6], '_time': 't1'},
+                         {'mat4x3': [1, 0, 0, 4, 0, 1, 0, 5, 0, 0, 1, 6], '_time': 't2'}],
+                        source, target, 'camera#mat3d', 'affine_mat4x3', ['mat4x3', '_time'])
+    objs = api.ApiObjs(make_server(api_url=None))
+    objs.add(api.Transfotree([quat], name='tree1'), api.Transfotree([matr], name='tree2'))
+    with caplog.at_level(logging.WARNING):
+        matr_to_quat(objs, [quat, matr], 1e-4, logging.getLogger(__name__))
+    warnings = [r.getMessage() for r in caplog.records if r.levelno == logging.WARNING]
+    assert len(warnings) == 1 and 'Conflicting poses at t1' in warnings[0]
+    assert [p['quat'] for p in quat.obj['parameters']] == [[1, 0, 0, 0], [1, 0, 0, 0]]
+
+
+def test_quaternion_order(make_server):
+    objs = api.ApiObjs(make_server(api_url=None))
+    args = {key: {} for key in ('sensor', 'transfo_ext', 'transfo_int', 'transfotree',
+                                'config')}
+    path = pathlib.Path('data/conic.ori.xml')
+    transfo = ImportOrimatis.handle_orimatis(objs, args, path, path, None, None)
+    parameters = transfo.obj['parameters']
+    transfos = matr_to_quat(objs, [transfo], 1e-4, logging.getLogger(__name__))
+    assert transfos == [transfo] and len(parameters) == 1
+    # the native quaternion is in (w, x, y, z) order, like the converted ones
+    assert parameters[0]['quat'] == [0.709160001179, -0.699434043618, -0.071664115454,
+                                     0.052422574762]
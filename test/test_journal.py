@@ -0,0 +1,61 @@
+import pytest
+
+from cli_li3ds import api
+
+
+def publish(server):
+    sensor = api.Sensor(name='camera', type='camera')
+    objs = api.ApiObjs(server)
+    objs.add(*[api.Referential(sensor, name='ref{:d}'.format(i)) for i in range(3)])
+    objs.get_or_create()
+    return objs
+
+
+def test_resume(stub, make_server, tmpdir):
+    path = str(tmpdir.join('journal.jsonl'))
+    publish(make_server(journal=path))
+    stub.counts.clear()
+
+    server = make_server(resume=path)
+    objs = publish(server)
+    assert stub.requests == 0
+    assert [obj.obj['id'] for obj in objs.objs] == [1, 2, 3]
+    assert server.stats.codes['referential'] == {'~': 3}
+
+
+def test_resume_interrupted(stub, make_server, tmpdir):
+    path = tmpdir.join('journal.jsonl')
+    publish(make_server(journal=str(path)))
+    # the last object and a truncated line are lost
+    lines = path.read().splitlines()
+    path.write('\n'.join(lines[:-1] + [lines[-1][:5]]) + '\n')
+    stub.counts.clear()
+
+    server = make_server(resume=str(path))
+    publish(server)
+    assert dict(stub.counts) == {'GET': 1}
+    assert server.stats.codes['referential'] == {'~': 2, '?': 1}
+
+
+def test_resume_other_api(make_server, tmpdir):
+    path = tmpdir.join('journal.jsonl')
+    path.write('{"journal": 1, "api_url": "http://other"}\n')
+    with pytest.raises(RuntimeError):
+        make_server(resume=str(path))
+
+
+def test_views_share_journal(make_server, tmpdir):
+    path = str(tmpdir.join('journal.jsonl'))
+    server = make_server(journal=path)
+
+    class StepArgs:
+        journal = None
+
+    assert server.view(StepArgs, server.log).journal is server.journal
+    StepArgs.journal = path
+    assert server.view(StepArgs, server.log).journal is server.journal
+    publish(server.view(StepArgs, server.log))
+    server.close()
+    assert server.journal.file.closed
+    with open(path) as f:
+        assert len(f.readlines()) == 5
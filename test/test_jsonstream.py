@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from cli_li3ds import jsonstream
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('items', [
+    [],
+    [{'id': 1, 'name': 'caméra'}, {'id': 2, 'parameters': [{'_time': None}]}],
+    [12345, -0.5e-3, 'a, "b"]', True, None, [[], {}]],
+])
+def test_iter_array(items):
+    data = json.dumps(items, ensure_ascii=False, indent=1).encode()
+    for size in range(1, len(data) + 1):
+        assert list(jsonstream.iter_array(chunked(data, size))) == items
+
+
+def test_iter_array_stops_early():
+    def chunks():
+        yield b'[{"id": 1}, {"id": 2}'
+        raise AssertionError('read past the first item')
+
+    assert next(jsonstream.iter_array(chunks())) == {'id': 1}
+
+
+@pytest.mark.parametrize('data', [b'{"id": 1}', b'[1 2]', b'[1, 2'])
+def test_iter_array_errors(data):
+    with pytest.raises(ValueError):
+        list(jsonstream.iter_array([data]))
+
+
+def test_iter_object():
+    content = {'sensor': [{'id': 1, 'name': 'caméra'}], 'empty': [], 'transfo': [1.5, 'a']}
+    data = json.dumps(content, ensure_ascii=False, indent=1).encode('iso-8859-1')
+    for size in range(1, len(data) + 1):
+        members = jsonstream.iter_object(chunked(data, size), 'iso-8859-1')
+        assert {name: list(items) for name, items in members} == content
+
+
+def test_iter_object_skips_items():
+    data = b'{"a": [1, [2, 3]], "b": [4]}'
+    assert [name for name, _ in jsonstream.iter_object([data])] == ['a', 'b']
+
+
+@pytest.mark.parametrize('data', [b'[]', b'{"a": 1}', b'{"a": [1]', b'{"a": [1] "b": []}'])
+def test_iter_object_errors(data):
+    with pytest.raises(ValueError):
+        for _, items in jsonstream.iter_object([data]):
+            list(items)
+
+
+def test_large_item_decoded_once(monkeypatch):
+    calls = []
+
+    class Decoder:
+        def raw_decode(self, s, idx=0):
+            calls.append(len(s))
+            return decoder.raw_decode(s, idx)
+
+    decoder = jsonstream._decoder
+    monkeypatch.setattr(jsonstream, '_decoder', Decoder())
+    items = [{'parameters': [{'vec3': [i, 0.5, -1e3], '_time': 'a\\"b{['} for i in range(1000)]},
+             'c', 3.25]
+    data = json.dumps(items).encode()
+    assert list(jsonstream.iter_array(chunked(data, 100))) == items
+    assert len(calls) == 3
@@ -0,0 +1,47 @@
+import os
+import re
+import sys
+import subprocess
+
+from cli_li3ds import main
+
+
+SETUP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'setup.py')
+
+
+def test_commands_match_entry_points():
+    with open(SETUP) as f:
+        entry_points = dict(re.findall(r"'([\w-]+)\s*=\s*(cli_li3ds\.\w+:[A-Z]\w*)'", f.read()))
+    assert main.COMMANDS == entry_points
+
+
+def test_find_command():
+    manager = main.LazyCommandManager('li3ds')
+    command, name, args = manager.find_command(['import-ept', 'x'])
+    assert command.__name__ == 'ImportEpt'
+    assert name == 'import-ept'
+    assert args == ['x']
+
+
+def test_heavy_modules_not_imported():
+    code = ('import sys; import cli_li3ds.main, cli_li3ds.api; '
+            'print(" ".join(m for m in ("requests", "numpy", "dateutil") if m in sys.modules))')
+    output = subprocess.check_output([sys.executable, '-c', code])
+    assert output.decode().strip() == ''
+
+
+def test_iter_entry_points_fallback(monkeypatch):
+    class EntryPoint:
+        name = 'import_x'
+
+    class PkgResources:
+        @staticmethod
+        def iter_entry_points(group):
+            return [EntryPoint] if group == 'li3ds' else []
+
+    # importlib.metadata is missing before python 3.8
+    monkeypatch.setitem(sys.modules, 'importlib.metadata', None)
+    monkeypatch.setitem(sys.modules, 'pkg_resources', PkgResources)
+    manager = main.LazyCommandManager('li3ds', convert_underscores=True)
+    manager.load_plugins()
+    assert manager.commands['import x'] is EntryPoint
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from cli_li3ds import api
+from cli_li3ds import main
+from cli_li3ds import apply
+
+
+def plan_objects(make_server, path, camera_type='camera'):
+    server = make_server(plan=str(path))
+    camera = api.Referential(api.Sensor(name='camera', type=camera_type), name='camera')
+    lidar = api.Referential(api.Sensor(name='lidar', type='lidar'), name='lidar')
+    transfo = api.Transfo(
+        camera, lidar, name='camera2lidar', type_name='affine_mat4x3',
+        func_signature=['mat4x3'], parameters=[{'mat4x3': [0] * 12}])
+    objs = api.ApiObjs(server)
+    objs.add(api.Transfotree([transfo], name='tree', owner='li3ds'))
+    objs.get_or_create()
+    with path.open() as f:
+        return json.load(f)
+
+
+def apply_plan(stub, path):
+    cmd = apply.Apply(main.Li3ds(), None)
+    parsed_args = cmd.get_parser('li3ds apply').parse_args(
+        ['-u', stub.url, '-k', 'key', str(path)])
+    cmd.take_action(parsed_args)
+
+
+def test_plan_and_apply(stub, make_server, tmpdir):
+    stub.handle('POST', '/sensors/', {}, {'name': 'camera', 'type': 'camera'})
+    stub.counts.clear()
+    plan = plan_objects(make_server, tmpdir.join('plan.json'))
+    assert plan['summary']['sensor'] == {'exists': 1, 'new': 1, 'append': 0, 'mismatch': 0}
+    assert plan['summary']['transfo']['new'] == 1
+    # one request per collection, for the collections of objects that may exist
+    assert dict(stub.counts) == {'GET': 3}
+    assert not stub.collections['transfos']
+
+    apply_plan(stub, tmpdir.join('plan.json'))
+    tree, = stub.collections['transfotrees']
+    transfo, = stub.collections['transfos']
+    assert tree['transfos'] == [transfo['id']]
+    transfo_type, = stub.collections['transfos/types']
+    assert transfo['transfo_type'] == transfo_type['id']
+
+    plan = plan_objects(make_server, tmpdir.join('plan2.json'))
+    assert all(entry['action'] == 'exists' for entry in plan['objects'])
+
+
+def test_apply_refuses_mismatches(stub, make_server, tmpdir):
+    stub.handle('POST', '/sensors/', {}, {'name': 'camera', 'type': 'camera'})
+    plan = plan_objects(make_server, tmpdir.join('plan.json'), camera_type='lidar')
+    mismatch, = [entry for entry in plan['objects'] if entry['action'] == 'mismatch']
+    assert mismatch['mismatches'] == [{'key': 'type', 'planned': 'lidar', 'existing': 'camera'}]
+    with pytest.raises(RuntimeError):
+        apply_plan(stub, tmpdir.join('plan.json'))
+    assert not stub.collections['referentials']
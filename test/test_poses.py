@@ -0,0 +1,70 @@
+import datetime
+import logging
+
+import numpy as np
+
+from cli_li3ds import poses
+from cli_li3ds import rotation
+
+
+def test_simplify_straight_line():
+    times = np.arange(100, dtype=float)
+    positions = np.outer(times, [1., 2., 0.])
+    quats = np.tile([1., 0., 0., 0.], (100, 1))
+    keep = poses.simplify(times, positions, quats, 1e-6, 1e-6)
+    assert keep.tolist() == [True] + [False] * 98 + [True]
+
+
+def test_simplify_bounded_error():
+    rng = np.random.RandomState(1)
+    times = np.cumsum(rng.uniform(0.5, 1.5, 500))
+    positions = np.cumsum(rng.normal(size=(500, 3)), axis=0)
+    quats = rotation.quat_from_axis_angle(
+        np.tile([0., 0., 1.], (500, 1)), np.cumsum(rng.normal(scale=0.01, size=500)))
+    keep = poses.simplify(times, positions, quats, 0.5, 0.01)
+    assert 2 < keep.sum() < 500
+
+    # every dropped pose is within tolerance of its interpolation
+    kept = np.flatnonzero(keep)
+    for i, j in zip(kept[:-1], kept[1:]):
+        k = np.arange(i + 1, j)
+        u = (times[k] - times[i]) / (times[j] - times[i])
+        p = positions[i] + np.outer(u, positions[j] - positions[i])
+        assert np.all(np.linalg.norm(p - positions[k], axis=-1) <= 0.5)
+        q = poses.slerp(quats[i], quats[j], u)
+        assert np.all(poses.angle(q, quats[k]) <= 0.01 + 1e-12)
+
+
+def test_simplify_transfo(make_transfo):
+    start = datetime.datetime(2017, 5, 16, tzinfo=datetime.timezone.utc)
+    parameters = [{
+        'quat': [1, 0, 0, 0],
+        'vec3': [0, 0, min(i, 10)],
+        '_time': start + datetime.timedelta(seconds=i),
+    } for i in reversed(range(20))]
+    transfo = make_transfo(parameters)
+    assert poses.simplify_transfo(transfo, 0.01, 0.01) == (20, 3)
+    assert [p['vec3'][2] for p in transfo.obj['parameters']] == [0, 10, 10]
+
+
+def test_simplify_transfos_logs_ratio(make_transfo, caplog):
+    parameters = [{'mat4x3': [1, 0, 0, i, 0, 1, 0, 0, 0, 0, 1, 0], '_time': float(i)}
+                  for i in range(10)]
+    transfo = make_transfo(parameters)
+    with caplog.at_level(logging.INFO):
+        poses.simplify_transfos([transfo], 0.01, 0.01, logging.getLogger(__name__))
+    assert 'ratio 5.0:1' in caplog.text
+
+
+def test_write_csv(tmpdir):
+    parameters = [{'quat': [1, 0, 0, 0], 'vec3': [i, 0, 0], '_time': float(10 - i)}
+                  for i in range(3)]
+    path = tmpdir.join('poses.csv')
+    template, start, end = poses.write_csv(parameters, path)
+    assert template == {'_time': 'time',
+                        'quat': ['quat_0', 'quat_1', 'quat_2', 'quat_3'],
+                        'vec3': ['vec3_0', 'vec3_1', 'vec3_2']}
+    assert (start, end) == (8., 10.)
+    lines = path.readlines()
+    assert lines[0].strip() == 'time,quat_0,quat_1,quat_2,quat_3,vec3_0,vec3_1,vec3_2'
+    assert lines[1].strip() == '8,1,0,0,0,2,0,0'
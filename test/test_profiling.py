@@ -0,0 +1,95 @@
+import pstats
+import shutil
+import logging
+import threading
+
+import pytest
+
+from cli_li3ds import phases
+from cli_li3ds import profiling
+
+
+class Recorder:
+    def __init__(self):
+        self.events = []
+
+    def enter(self, phase):
+        self.events.append(('enter', phase.name))
+
+    def exit(self, phase):
+        self.events.append(('exit', phase.name))
+
+
+def test_phases_iterate():
+    recorder = Recorder()
+    phases.add_listener(recorder)
+    try:
+        with phases.phase(phases.GRAPH):
+            items = list(phases.iterate(phases.DISCOVERY, [1, 2]))
+    finally:
+        phases.remove_listener(recorder)
+    assert items == [1, 2]
+    assert recorder.events == [('enter', 'graph')] + [
+        ('enter', 'discovery'), ('exit', 'discovery')] * 3 + [('exit', 'graph')]
+
+
+def test_thread_profiler(tmpdir):
+    def work():
+        return sum(range(1000))
+
+    def worker():
+        return work()
+
+    profiler = profiling.ThreadProfiler()
+    profiler.start()
+    try:
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        work()
+    finally:
+        profiler.stop()
+    path = str(tmpdir.join('profile.pstats'))
+    profiler.dump_stats(path)
+    stats = pstats.Stats(path).stats
+    # the function of the worker thread is profiled as well
+    calls = {name: nc for (filename, lineno, name), (cc, nc, tt, ct, callers) in stats.items()
+             if filename == __file__}
+    assert calls == {'worker': 1, 'work': 2}
+
+
+def test_sampler_needs_py_spy(monkeypatch, tmpdir):
+    monkeypatch.setattr(shutil, 'which', lambda name: None)
+    profile = profiling.Profile(str(tmpdir.join('profile')), False,
+                                logging.getLogger(__name__), sampler=True)
+    with pytest.raises(RuntimeError, match='py-spy'):
+        profile.start()
+
+
+def test_memory_profiler(caplog):
+    memory = profiling.MemoryProfiler(min_growth=1 << 16)
+    memory.start()
+    try:
+        with phases.phase(phases.PARSING):
+            data = [bytearray(1 << 10) for _ in range(1 << 10)]
+    finally:
+        memory.stop()
+    assert memory.peaks['parsing'] >= len(data) << 10
+    assert sum(memory.sites['parsing'].values()) >= len(data) << 10
+    with caplog.at_level(logging.INFO):
+        memory.report(logging.getLogger(__name__))
+    assert 'parsing' in caplog.text
+
+
+def test_memory_profiler_threads():
+    memory = profiling.MemoryProfiler()
+    memory.start()
+    try:
+        with phases.phase(phases.PUBLISH):
+            thread = threading.Thread(target=lambda: memory.stack.append('parsing'))
+            thread.start()
+            thread.join()
+            # the phases of another thread are not the ones of this one
+            assert memory.stack == ['publish']
+    finally:
+        memory.stop()
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from cli_li3ds import api
+
+
+def add_files(objs, paths):
+    for path in objs.inputs(paths):
+        with objs.input(path):
+            sensor = api.Sensor(name=path, type='camera')
+            objs.add(sensor)
+            if path.startswith('bad'):
+                raise RuntimeError('Error: malformed {}'.format(path))
+            objs.add(api.Referential(sensor, name='ref'))
+
+
+def test_keep_going(tmpdir, make_server):
+    path = str(tmpdir.join('quarantine.json'))
+    objs = api.ApiObjs(make_server(api_url=None, keep_going=True, quarantine=path))
+    add_files(objs, ['a', 'bad1', 'b'])
+    # a sensor without a name fails to publish
+    objs.add(api.Sensor(type='camera'))
+    objs.get_or_create()
+    objs.api.finish()
+    assert [obj.obj['name'] for obj in objs.objs[:4]] == ['a', 'ref', 'b', 'ref']
+    assert all(obj.published for obj in objs.objs[:4])
+
+    with open(path) as f:
+        entries = json.load(f)['entries']
+    assert [(entry['phase'], entry.get('input')) for entry in entries] == [
+        ('graph', 'bad1'), ('publish', None)]
+    assert entries[0]['reason'] == 'Error: malformed bad1'
+    assert entries[1]['type'] == 'sensor'
+
+
+def test_stop_on_error(make_server):
+    objs = api.ApiObjs(make_server(api_url=None, keep_going=False))
+    with pytest.raises(RuntimeError):
+        add_files(objs, ['a', 'bad1', 'b'])
+
+
+def test_retry_quarantine(tmpdir, make_server):
+    path = str(tmpdir.join('quarantine.json'))
+    objs = api.ApiObjs(make_server(api_url=None, keep_going=True, quarantine=path))
+    add_files(objs, ['a', 'bad1', 'b', 'bad2'])
+    objs.get_or_create()
+    objs.api.finish()
+
+    objs = api.ApiObjs(make_server(api_url=None, keep_going=True, quarantine=path,
+                                   retry_quarantine=path))
+    add_files(objs, ['a', 'bad1', 'b', 'bad2'])
+    assert objs.objs == []
+    objs.get_or_create()
+    objs.api.finish()
+    with open(path) as f:
+        assert [entry['input'] for entry in json.load(f)['entries']] == ['bad1', 'bad2']
+
+
+def test_undo_extensions(make_server, make_transfo):
+    objs = api.ApiObjs(make_server(api_url=None, keep_going=True))
+    transfo = make_transfo([{'_time': 1}], func_signature=['_time'])
+    with objs.input('a'):
+        objs.add(transfo)
+    with objs.input('bad'):
+        objs.extend(transfo, 'parameters', [{'_time': 2}])
+        raise RuntimeError('Error: malformed bad')
+    with objs.input('b'):
+        objs.extend(transfo, 'parameters', [{'_time': 3}])
+    assert transfo.obj['parameters'] == [{'_time': 1}, {'_time': 3}]
+    assert [entry['input'] for entry in objs.api.quarantine.entries] == ['bad']
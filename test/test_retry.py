@@ -0,0 +1,150 @@
+import time
+import threading
+import logging
+
+import pytest
+import requests
+import urllib3
+
+from cli_li3ds import retry
+
+
+class Response:
+
+    def __init__(self, status_code, content=None, headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.links = {}
+
+    def json(self):
+        return self.content
+
+    def close(self):
+        pass
+
+
+class Session:
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def request(self, verb, url, **kwargs):
+        self.calls.append((verb, url, kwargs))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(time, 'sleep', sleeps.append)
+    return sleeps
+
+
+@pytest.fixture
+def server(make_server):
+    return make_server(api_url='http://li3ds', backoff=0.01)
+
+
+def test_retry(sleeps, server):
+    session = Session(
+        Response(503),
+        requests.exceptions.ConnectionError(),
+        requests.exceptions.ReadTimeout(),
+        Response(200, [{'id': 1}]))
+    assert server.get_objects(session, 'sensor', {}) == [{'id': 1}]
+    assert len(session.calls) == 4
+    assert session.calls[0][2]['timeout'] == (10., 60.)
+    assert server.stats.retry_reasons == {'HTTP 503': 1, 'connection error': 1, 'timeout': 1}
+    # full jitter, up to the exponential backoff
+    assert [delay <= 0.01 * 2 ** i for i, delay in enumerate(sleeps)] == [True] * 3
+
+
+def test_retry_after(sleeps, server):
+    session = Session(Response(429, headers={'Retry-After': '3'}), Response(200, []))
+    server.get_objects(session, 'sensor', {})
+    assert sleeps == [3.]
+
+
+def test_post_not_retried_on_bad_request(sleeps, server):
+    session = Session(Response(400))
+    with pytest.raises(RuntimeError):
+        server.create_object(session, 'sensor', {'name': 'sensor'}, {})
+    assert len(session.calls) == 1
+
+
+def test_bad_request_not_retried(sleeps, server):
+    session = Session(Response(400))
+    with pytest.raises(RuntimeError):
+        server.get_objects(session, 'sensor', {})
+    assert len(session.calls) == 1
+
+
+@pytest.mark.parametrize('error', [Response(502), requests.exceptions.ReadTimeout()])
+def test_update_not_retried_once_processed(sleeps, server, error):
+    session = Session(error)
+    with pytest.raises((RuntimeError, requests.exceptions.ReadTimeout)):
+        server.update_object(session, 'transfo', 1, {'parameters': []}, {})
+    assert len(session.calls) == 1
+
+
+def test_update_retried_when_not_processed(sleeps, server):
+    session = Session(
+        requests.exceptions.ConnectTimeout(), Response(503), Response(200, [{'id': 1}]))
+    assert server.update_object(session, 'transfo', 1, {'parameters': []}, {}) == {'id': 1}
+    assert len(session.calls) == 3
+
+
+def test_too_many_attempts(sleeps, make_server):
+    server = make_server(api_url='http://li3ds', backoff=0.01, retries=3)
+    session = Session(*[Response(502)] * 3)
+    with pytest.raises(RuntimeError):
+        server.get_objects(session, 'sensor', {})
+    assert len(session.calls) == 3
+
+
+def test_circuit_breaker():
+    breaker = retry.CircuitBreaker(threshold=0.5, window=4, pause=10.)
+    log = logging.getLogger(__name__)
+    for success in (True, False, True):
+        breaker.record(success, log)
+    assert breaker.trips == 0
+    breaker.record(False, log)
+    assert breaker.trips == 1
+    assert breaker.open_until > time.monotonic() + 9.
+
+
+def test_create_retried_only_when_not_sent(sleeps, server):
+    refused = urllib3.exceptions.MaxRetryError(
+        None, '/sensor', urllib3.exceptions.NewConnectionError(None, 'refused'))
+    session = Session(requests.exceptions.ConnectionError(refused),
+                      Response(201, [{'id': 1, 'name': 'sensor'}]))
+    assert server.create_object(session, 'sensor', {'name': 'sensor'}, {})['id'] == 1
+    assert len(session.calls) == 2
+
+    # reset once sent
+    reset = urllib3.exceptions.ProtocolError('Connection aborted.', ConnectionResetError())
+    session = Session(requests.exceptions.ConnectionError(reset))
+    with pytest.raises(requests.exceptions.ConnectionError):
+        server.create_object(session, 'sensor', {'name': 'sensor'}, {})
+    assert len(session.calls) == 1
+
+
+def test_retried_requests_by_thread(sleeps, server):
+
+    class Interleaved(Session):
+        def request(self, verb, url, **kwargs):
+            if self.calls:
+                # another thread sends a request between the attempts of this one
+                thread = threading.Thread(target=server.get_objects, args=(
+                    Session(Response(200, [])), 'referential', {}))
+                thread.start()
+                thread.join()
+            return super().request(verb, url, **kwargs)
+
+    server.get_objects(Interleaved(Response(503), Response(200, [])), 'sensor', {})
+    assert server.stats.retries == {('GET', 'sensor'): 1}
@@ -0,0 +1,70 @@
+import math
+
+import numpy as np
+import pytest
+
+from cli_li3ds import rotation
+
+
+@pytest.fixture
+def quats():
+    rng = np.random.RandomState(42)
+    q = rng.normal(size=(100, 4))
+    q /= np.linalg.norm(q, axis=-1, keepdims=True)
+    return np.where(q[:, :1] < 0, -q, q)
+
+
+def test_matrix_from_quat_is_rotation(quats):
+    m = rotation.matrix_from_quat(quats)
+    assert m.shape == (100, 3, 3)
+    eye = np.broadcast_to(np.eye(3), m.shape)
+    assert np.allclose(np.einsum('...ij,...kj->...ik', m, m), eye)
+    assert np.allclose(np.linalg.det(m), 1)
+
+
+def test_quat_roundtrip(quats):
+    q = rotation.quat_from_matrix(rotation.matrix_from_quat(quats))
+    assert np.allclose(q, quats)
+
+
+def test_quat_from_matrix_half_turns():
+    # trace is -1 for half turns, exercise the non-trace pivots
+    m = np.array([np.diag([1, -1, -1]), np.diag([-1, 1, -1]), np.diag([-1, -1, 1])])
+    q = rotation.quat_from_matrix(m)
+    assert np.allclose(np.abs(q), np.eye(4)[1:])
+
+
+def test_quat_multiply_composes_matrices(quats):
+    q = rotation.quat_multiply(quats[:50], quats[50:])
+    m = np.matmul(rotation.matrix_from_quat(quats[:50]), rotation.matrix_from_quat(quats[50:]))
+    assert np.allclose(rotation.matrix_from_quat(q), m)
+
+
+def test_quat_from_axis_angle():
+    q = rotation.quat_from_axis_angle([(0, 0, 2), (0, 1, 0)], [math.pi, math.pi/2])
+    s = math.sqrt(0.5)
+    assert np.allclose(q, [[0, 0, 0, 1], [s, 0, s, 0]])
+
+
+def test_invert_affine(quats):
+    rng = np.random.RandomState(0)
+    m = rotation.affine(rotation.matrix_from_quat(quats), rng.normal(size=(100, 3)))
+    inv = rotation.invert_affine(m)
+    points = rng.normal(size=(100, 3))
+    moved = np.einsum('...ij,...j->...i', m[..., :3], points) + m[..., 3]
+    back = np.einsum('...ij,...j->...i', inv[..., :3], moved) + inv[..., 3]
+    assert np.allclose(back, points)
+
+
+def test_mat4x3():
+    m = rotation.mat4x3([list(range(12))] * 2)
+    assert m.shape == (2, 3, 4)
+    assert m[1, 2, 3] == 11
+
+
+def test_orthonormality_error(quats):
+    m = rotation.matrix_from_quat(quats)
+    assert np.allclose(rotation.orthonormality_error(m), 0)
+    # scaling by 1 + e moves the determinant by about 3e
+    assert np.allclose(rotation.orthonormality_error(m * 1.001), 0.003, rtol=1e-2)
+    assert np.isclose(rotation.orthonormality_error(-np.eye(3)), 2)
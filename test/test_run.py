@@ -0,0 +1,115 @@
+import os
+import json
+
+import pytest
+
+from cli_li3ds import main
+from cli_li3ds import run
+
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+
+def write_manifest(tmpdir, steps):
+    path = tmpdir.join('mission.json')
+    path.write(json.dumps({'steps': steps}))
+    return str(path)
+
+
+def run_manifest(tmpdir, steps, args=()):
+    '''
+    Run the steps in staging mode, return the statistics written by the command.
+    '''
+    cmd = run.Run(main.Li3ds(), None)
+    stats_path = str(tmpdir.join('stats.json'))
+    parsed_args = cmd.get_parser('li3ds run').parse_args(
+        ['--stats', stats_path] + list(args) + [write_manifest(tmpdir, steps)])
+    try:
+        cmd.take_action(parsed_args)
+    except RuntimeError:
+        pass
+    with open(stats_path) as f:
+        return json.load(f)
+
+
+def test_run(tmpdir):
+    stats = run_manifest(tmpdir, [
+        {'name': 'calib', 'command': 'import-autocal',
+         'args': [os.path.join(DATA, 'Calib-1.xml')]},
+        {'name': 'ori', 'command': 'import-ori',
+         'args': [os.path.join(DATA, 'Orientation-1.xml')], 'depends': ['calib']},
+    ])
+    assert stats['steps']['calib']['status'] == 'ok'
+    assert stats['steps']['ori']['status'] == 'ok'
+    # the steps share the server, so ori finds the sensor created by calib
+    assert stats['steps']['ori']['summary']['by_type']['sensor']['created'] == 0
+    assert stats['total']['objects'] == sum(
+        step['summary']['objects'] for step in stats['steps'].values())
+
+
+def test_run_skips_dependents_of_failed_steps(tmpdir):
+    steps = run_manifest(tmpdir, [
+        {'name': 'missing', 'command': 'import-autocal', 'args': 'missing.xml'},
+        {'name': 'ori', 'command': 'import-ori',
+         'args': [os.path.join(DATA, 'Orientation-1.xml')], 'depends': ['missing']},
+    ])['steps']
+    assert steps['missing']['status'] == 'failed'
+    assert steps['ori']['status'] == 'skipped'
+
+
+def test_run_shares_quarantine(tmpdir):
+    path = str(tmpdir.join('quarantine.json'))
+    steps = run_manifest(tmpdir, [
+        {'name': 'calib', 'command': 'import-autocal', 'args': ['missing1.xml']},
+        {'name': 'ori', 'command': 'import-ori', 'args': ['missing2.xml']},
+    ], ['--keep-going', '--quarantine', path])['steps']
+    assert steps['calib']['status'] == steps['ori']['status'] == 'ok'
+    with open(path) as f:
+        entries = json.load(f)['entries']
+    assert sorted(entry['input'] for entry in entries) == ['missing1.xml', 'missing2.xml']
+
+
+def test_run_shares_plan(tmpdir):
+    path = str(tmpdir.join('plan.json'))
+    run_manifest(tmpdir, [
+        {'name': 'calib', 'command': 'import-autocal',
+         'args': [os.path.join(DATA, 'Calib-1.xml')]},
+        {'name': 'ori', 'command': 'import-ori',
+         'args': [os.path.join(DATA, 'Orientation-1.xml')], 'depends': ['calib']},
+    ], ['--plan', path])
+    with open(path) as f:
+        summary = json.load(f)['summary']
+    # one plan of both steps, ori refers to the sensor planned by calib
+    assert summary['sensor']['new'] == 1
+    assert summary['transfotree']['new'] == 2
+
+
+@pytest.mark.parametrize('steps', [
+    [{'name': 'a', 'command': 'import-ori', 'depends': ['b']}],
+    [{'name': 'a', 'command': 'import-ori', 'depends': ['b']},
+     {'name': 'b', 'command': 'import-ori', 'depends': ['a']}],
+    [{'command': 'import-ori'}, {'command': 'import-ori'}],
+    [{'command': 'import-ori', 'arguments': []}],
+])
+def test_read_manifest_errors(tmpdir, steps):
+    with pytest.raises(RuntimeError):
+        run.Run.read_manifest(write_manifest(tmpdir, steps))
+
+
+def test_run_concurrent_steps(tmpdir, stub):
+    steps = [{'name': 'calib{:d}'.format(i), 'command': 'import-autocal',
+              'args': [os.path.join(DATA, 'Calib-1.xml')]} for i in range(4)]
+    path = str(tmpdir.join('quarantine.json'))
+    stats = run_manifest(tmpdir, steps, [
+        '-u', stub.url, '-k', 'key', '--no-proxy', '--jobs', '4', '--keep-going',
+        '--quarantine', path])
+    assert [step['status'] for step in stats['steps'].values()] == ['ok'] * 4
+    # the steps running together look up or create each object once
+    for name, objs in stub.collections.items():
+        keys = [json.dumps(obj, sort_keys=True, default=str)
+                for obj in ({k: v for k, v in o.items() if k != 'id'} for o in objs)]
+        assert len(keys) == len(set(keys)), name
+    assert sum(step['summary']['by_type']['sensor']['created']
+               for step in stats['steps'].values()) == 1
+    assert stats['total']['retries'] == 0
+    assert not os.path.exists(path)
@@ -0,0 +1,56 @@
+import json
+
+from cli_li3ds import api
+from cli_li3ds import stats
+
+
+def test_quantile():
+    values = list(range(1, 101))
+    assert stats.quantile(values, 0.5) == 50
+    assert stats.quantile(values, 0.95) == 95
+    assert stats.quantile(values, 0.99) == 99
+    assert stats.quantile([3], 0.99) == 3
+    assert stats.quantile([], 0.5) is None
+
+
+def test_summary():
+    s = stats.Stats()
+    for latency in (0.1, 0.2, 0.3):
+        s.request('GET', 'sensor', 200, latency)
+    s.request('GET', 'sensor', None, 1.0)
+    s.request('GET', 'sensor', 200, 0.4, retry=True)
+    s.code('sensor', '?')
+    s.cache_hit('sensor')
+    summary = s.summary()
+    assert summary['requests'] == 5
+    assert summary['retries'] == 1
+    request, = summary['by_request']
+    assert request['status'] == {'200': 4, 'error': 1}
+    assert request['latency']['p50'] == 0.3
+    assert request['latency']['max'] == 1.0
+    assert summary['by_type']['sensor']['found'] == 1
+    assert summary['by_type']['sensor']['cache_hits'] == 1
+
+
+def test_staging_stats(tmpdir, make_server):
+    server = make_server(api_url=None, stats=str(tmpdir.join('stats.json')),
+                         stats_prometheus=str(tmpdir.join('stats.prom')))
+    sensor = api.Sensor(name='sensor')
+    objs = api.ApiObjs(server)
+    objs.add(api.Referential(sensor, name='source'))
+    objs.get_or_create()
+    objs.add(api.Referential(sensor, name='target'))
+    objs.get_or_create()
+    # written once, when the command is done
+    assert not tmpdir.join('stats.json').check()
+    server.finish()
+
+    with tmpdir.join('stats.json').open() as f:
+        summary = json.load(f)
+    assert summary['objects'] == 3
+    assert summary['by_type']['sensor'] == {
+        'created': 1, 'found': 0, 'found_by_id': 0, 'appended': 0, 'resumed': 0,
+        'cache_hits': 1}
+    prometheus = tmpdir.join('stats.prom').read()
+    assert 'li3ds_objects_total{type="referential",result="created"} 2' in prometheus
+    assert 'li3ds_cache_hits_total{type="sensor"} 1' in prometheus
@@ -0,0 +1,38 @@
+import json
+
+from cli_li3ds import api
+from cli_li3ds import tracing
+
+
+def test_trace_staging_import(tmpdir, make_server):
+    tracer = tracing.Tracer()
+    tracer.start('test')
+    try:
+        server = make_server(api_url=None)
+        sensor = {'name': '{sensor}'}
+        api.update_obj(None, {'basename': 'file', 'sensor': 'camera'}, sensor, 'sensor')
+        objs = api.ApiObjs(server)
+        objs.add(api.Referential(api.Sensor(sensor), name='image'))
+        objs.get_or_create()
+    finally:
+        tracer.stop('test')
+
+    path = str(tmpdir.join('trace.json'))
+    tracer.write(path)
+    with open(path) as f:
+        events = json.load(f)['traceEvents']
+
+    spans = [(e['ph'], e['name']) for e in events if e['ph'] in 'BE']
+    assert spans == [
+        ('B', 'test'),
+        ('B', 'update_obj'), ('E', 'update_obj'),
+        ('B', 'publish'),
+        ('B', 'get_or_create'), ('E', 'get_or_create'),
+        ('B', 'get_or_create'), ('E', 'get_or_create'),
+        ('E', 'publish'),
+        ('E', 'test'),
+    ]
+    codes = [e['args'] for e in events if e['ph'] == 'E' and e['name'] == 'get_or_create']
+    assert codes == [{'type': 'sensor', 'code': '+'}, {'type': 'referential', 'code': '+'}]
+    assert [e['ph'] for e in events].count('M') == 1
+    assert all(a['ts'] <= b['ts'] for a, b in zip(events[1:], events[2:]))